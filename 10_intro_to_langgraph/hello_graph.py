@@ -1,18 +1,40 @@
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Dict, List, Optional, Type
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from dotenv import load_dotenv
 from langgraph.graph import END, START, StateGraph
 from langsmith.wrappers import wrap_openai
-from openai import OpenAI
 from pydantic import BaseModel
 from typing_extensions import TypedDict
 
+from common.embeddings import EmbeddingService
+from common.graph_metrics import instrument_node
+from common.llm_cache import LLMCache
+from common.request_scheduler import create_openai_client
+from query_router import QueryRouter
+
 load_dotenv()
 
+# embeddings, LLM responses and router centroids are kept here between runs
+CACHE_DIR = Path(
+    os.getenv("GRAPH_CACHE_DIR", Path(__file__).resolve().parent / ".cache")
+)
+
 
 # State: defines the state in the graph
 class State(TypedDict):
     user_message: str
     ai_message: str
     is_coding_question: bool
+    speculative_solution: Optional[str]
 
 
 # Response: defines the response from the graph
@@ -30,12 +52,63 @@ class GenericQuestionSolverResponse(BaseModel):
     solution: str
 
 
-# create openai client
-client = wrap_openai(OpenAI())
+# models used by the nodes
+DETECTOR_MODEL = "gpt-4o-mini"
+CODING_MODEL = "gpt-4.1"
+GENERIC_MODEL = "gpt-4o-mini"
+
+# USD per 1M input tokens, used to decide which solvers are cheap enough to speculate on
+MODEL_INPUT_COSTS = {"gpt-4o-mini": 0.15, "gpt-4.1": 2.00}
+
+# run the solvers alongside the LLM detector and keep the one the router picks
+SPECULATIVE = os.getenv("SPECULATIVE", "false").lower() == "true"
+# solvers whose model costs more than this per 1M input tokens are never speculated
+SPECULATION_COST_CEILING = float(os.getenv("SPECULATION_COST_CEILING", "0.5"))
+
+# create openai client, its requests share the process-wide rate limits
+client = wrap_openai(create_openai_client())
+
+# embeddings of questions seen before come from the disk cache
+embedding_service = EmbeddingService(
+    client,
+    cache_path=str(CACHE_DIR / "embeddings.sqlite"),
+)
+
+# cache the LLM responses, near-duplicate questions are answered from the semantic tier
+llm_cache = LLMCache(
+    path=str(CACHE_DIR / "llm_cache.pkl"),
+    embed=embedding_service.embed,
+)
+
+
+# call openai api and parse the response, going through the cache
+def parse(model: str, messages: List[Dict[str, str]], response_format: Type[BaseModel]):
+    def call():
+        response = client.beta.chat.completions.parse(
+            model=model, messages=messages, response_format=response_format
+        )
+        return response.choices[0].message.parsed
+
+    return llm_cache.get_or_call(model, messages, response_format, call)
+
+
+# answer the clear cases locally, only unsure queries go to the LLM detector
+query_router = QueryRouter(
+    centroids_path=str(CACHE_DIR / "router_centroids.npz"),
+    embed=llm_cache.embed_text,
+)
 
 
 # identify the type of the user message
 def query_type_detector(state: State):
+    is_coding_question = query_router.classify(state["user_message"])
+    if is_coding_question is not None:
+        state["is_coding_question"] = is_coding_question
+        return state
+
+    # start the solvers while the LLM detector runs, so the answer is ready when it decides
+    speculations = start_speculation(state["user_message"]) if SPECULATIVE else {}
+
     # call openai api to identify the type of the user message
     system_prompt = """
         You are a helpful assistant that can identify the type of the user message.
@@ -44,8 +117,8 @@ def query_type_detector(state: State):
         Return the response in the specified JSON format.
     """
 
-    response = client.beta.chat.completions.parse(
-        model="gpt-4o-mini",
+    response = parse(
+        model=DETECTOR_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": state["user_message"]},
@@ -53,7 +126,9 @@ def query_type_detector(state: State):
         response_format=QueryTypeDetectionResponse,
     )
 
-    state["is_coding_question"] = response.choices[0].message.parsed.is_coding_question
+    state["is_coding_question"] = response.is_coding_question
+    if speculations:
+        state["speculative_solution"] = finish_speculation(speculations, router(state))
 
     return state
 
@@ -66,58 +141,130 @@ def router(state: State):
         return "generic_question_solver"
 
 
-# coding_question_solver: defines the coding question solver in the graph
-def coding_question_solver(state: State):
+# solve the coding question
+def solve_coding_question(user_message: str) -> str:
     # call openai api to solve the coding question
     system_prompt = """
         You are a helpful assistant that can solve the coding question.
         Return the response in the specified JSON format.
     """
 
-    response = client.beta.chat.completions.parse(
-        model="gpt-4.1",
+    response = parse(
+        model=CODING_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": state["user_message"]},
+            {"role": "user", "content": user_message},
         ],
         response_format=CodingQuestionSolverResponse,
     )
 
-    state["ai_message"] = response.choices[0].message.parsed.solution
-
-    return state
+    return response.solution
 
 
-# generic_question_solver: defines the generic question solver in the graph
-def generic_question_solver(state: State):
+# solve the generic question
+def solve_generic_question(user_message: str) -> str:
     # call openai api to solve the generic question
     system_prompt = """
         You are a helpful assistant that can solve the generic question.
         Return the response in the specified JSON format.
     """
 
-    response = client.beta.chat.completions.parse(
-        model="gpt-4o-mini",
+    response = parse(
+        model=GENERIC_MODEL,
         messages=[
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": state["user_message"]},
+            {"role": "user", "content": user_message},
         ],
         response_format=GenericQuestionSolverResponse,
     )
 
-    state["ai_message"] = response.choices[0].message.parsed.solution
+    return response.solution
+
+
+# coding_question_solver: defines the coding question solver in the graph
+def coding_question_solver(state: State):
+    solution = state.get("speculative_solution")
+    if solution is None:
+        solution = solve_coding_question(state["user_message"])
+
+    state["ai_message"] = solution
 
     return state
 
 
+# generic_question_solver: defines the generic question solver in the graph
+def generic_question_solver(state: State):
+    solution = state.get("speculative_solution")
+    if solution is None:
+        solution = solve_generic_question(state["user_message"])
+
+    state["ai_message"] = solution
+
+    return state
+
+
+# solver node name -> (model, solve function), the candidates for speculation
+SOLVERS = {
+    "coding_question_solver": (CODING_MODEL, solve_coding_question),
+    "generic_question_solver": (GENERIC_MODEL, solve_generic_question),
+}
+
+speculation_executor = ThreadPoolExecutor(
+    max_workers=len(SOLVERS), thread_name_prefix="speculation"
+)
+# the graph may run on several threads at once
+speculation_lock = threading.Lock()
+speculation_stats = {"started": 0, "used": 0, "cancelled": 0, "wasted": 0}
+
+
+# start every solver that is under the cost ceiling
+def start_speculation(user_message: str) -> Dict[str, Future]:
+    speculations = {}
+    for name, (model, solve) in SOLVERS.items():
+        if MODEL_INPUT_COSTS.get(model, float("inf")) <= SPECULATION_COST_CEILING:
+            # in the detector's context, so its calls keep the node and request_context
+            speculations[name] = speculation_executor.submit(
+                copy_context().run, solve, user_message
+            )
+            with speculation_lock:
+                speculation_stats["started"] += 1
+    return speculations
+
+
+# keep the branch the router picked and drop the others
+def finish_speculation(speculations: Dict[str, Future], winner: str) -> Optional[str]:
+    for name, future in speculations.items():
+        if name != winner:
+            # a call already in flight cannot be stopped, its result is simply ignored
+            outcome = "cancelled" if future.cancel() else "wasted"
+            with speculation_lock:
+                speculation_stats[outcome] += 1
+
+    future = speculations.get(winner)
+    if future is None:
+        # the winner was too expensive to speculate on, the solver node calls it as usual
+        return None
+    try:
+        solution = future.result()
+    except Exception:
+        # let the solver node retry on its own rather than failing the detector
+        return None
+    with speculation_lock:
+        speculation_stats["used"] += 1
+    return solution
+
+
 # create the graph
 graph = StateGraph(State)
 
-# add the nodes to the graph
-graph.add_node("query_type_detector", query_type_detector)
-graph.add_node("router", router)
-graph.add_node("coding_question_solver", coding_question_solver)
-graph.add_node("generic_question_solver", generic_question_solver)
+# add the nodes to the graph, timed when GRAPH_METRICS is on
+for name, node in [
+    ("query_type_detector", query_type_detector),
+    ("router", router),
+    ("coding_question_solver", coding_question_solver),
+    ("generic_question_solver", generic_question_solver),
+]:
+    graph.add_node(name, instrument_node("hello_graph", name, node))
 
 # add the edges to the graph
 graph.add_edge(START, "query_type_detector")
@@ -128,7 +275,12 @@ graph.add_edge("generic_question_solver", END)
 # compile the graph
 compiled_graph = graph.compile()
 
-while True:
-    user_message = input("> ")
-    result = compiled_graph.invoke({"user_message": user_message})
-    print(f"🤖: {result['ai_message']}")
+if __name__ == "__main__":
+    while True:
+        user_message = input("> ")
+        result = compiled_graph.invoke({"user_message": user_message})
+        print(f"🤖: {result['ai_message']}")
+        print(f"📦 cache: {llm_cache.stats()}")
+        print(f"🧭 router: {query_router.stats()}")
+        if SPECULATIVE:
+            print(f"🏁 speculation: {speculation_stats}")
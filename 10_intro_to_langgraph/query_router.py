@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Signals that a message is a coding question, with their weights
+CODING_PATTERNS = [
+    (re.compile(r"```"), 3),
+    (re.compile(r"\bTraceback \(most recent call last\)"), 3),
+    (
+        re.compile(
+            r"^\s*(def|class|import|from \S+ import|#include|public static)\b", re.M
+        ),
+        3,
+    ),
+    (re.compile(r"\b(SELECT|INSERT|UPDATE|DELETE)\b.+\b(FROM|INTO|SET|WHERE)\b"), 3),
+    (re.compile(r"\w+\([^)]*\)\s*[{;:]"), 2),
+    # a bare name is also a snake, a coffee or a gem, it only counts with a coding term
+    (
+        re.compile(
+            r"\b(python|javascript|typescript|java|golang|rust|c\+\+|c#|kotlin|swift|ruby|php|bash|sql|regex|html|css|react|django|flask|numpy|pandas)\b",
+            re.I,
+        ),
+        1,
+    ),
+    (
+        re.compile(
+            r"\b(code|coding|program|script|function|method|variable|array|list|dict|string|loop|algorithm|recursion|compile|compiler|debug|bug|error|stack ?trace|exception|syntax|install|library|package|api|endpoint|git|docker|kubernetes|leetcode|big[- ]o|unit test|refactor|segfault|null pointer)\b",
+            re.I,
+        ),
+        1,
+    ),
+]
+
+# Signals that a message is a generic question, with their weights
+GENERIC_PATTERNS = [
+    (
+        re.compile(
+            r"\b(weather|recipe|cook|movie|song|book|travel|vacation|holiday|health|diet|workout|history|capital of|president|population|translate|poem|joke|story|birthday|restaurant)\b",
+            re.I,
+        ),
+        2,
+    ),
+    (
+        re.compile(
+            r"^\s*(hi|hello|hey|thanks|thank you|good (morning|evening))\b", re.I
+        ),
+        2,
+    ),
+    (re.compile(r"\b(who (is|was)|when (is|was|did)|where (is|was))\b", re.I), 1),
+]
+
+# Minimum score, with no opposing signal, for the rules to answer on their own
+RULE_CONFIDENCE = 2
+
+# Minimum cosine margin between the two centroids for the centroid model to answer
+CENTROID_MARGIN = 0.05
+
+
+def score(message: str, patterns: List[Tuple[re.Pattern, int]]) -> int:
+    return sum(weight for pattern, weight in patterns if pattern.search(message))
+
+
+def classify_by_rules(message: str) -> Optional[bool]:
+    """Classify a message with keyword rules, or None when they are not confident."""
+    coding = score(message, CODING_PATTERNS)
+    generic = score(message, GENERIC_PATTERNS)
+    if coding >= RULE_CONFIDENCE and generic == 0:
+        return True
+    if generic >= RULE_CONFIDENCE and coding == 0:
+        return False
+    return None
+
+
+class QueryRouter:
+    """Local fast path in front of the LLM query type detector.
+
+    Keyword rules answer the clear cases in microseconds. When a centroid model
+    file exists and an embedder is given, messages the rules are unsure about
+    are compared against the coding and generic centroids. Anything still
+    ambiguous returns None so the caller falls back to the LLM.
+
+    Args:
+        centroids_path: The .npz file holding the coding and generic centroids
+        embed: Optional embedder returning the normalized embedding of a text
+    """
+
+    def __init__(
+        self,
+        centroids_path: Optional[str] = None,
+        embed: Optional[Callable[[str], np.ndarray]] = None,
+    ):
+        self.embed = embed
+        self.centroids = None
+        if centroids_path and os.path.exists(centroids_path):
+            data = np.load(centroids_path)
+            self.centroids = (data["coding"], data["generic"])
+        self.counts: Dict[str, int] = {"rules": 0, "centroids": 0, "llm": 0}
+
+    def classify(self, message: str) -> Optional[bool]:
+        """Return whether the message is a coding question, or None if unsure."""
+        is_coding = classify_by_rules(message)
+        if is_coding is not None:
+            self.counts["rules"] += 1
+            return is_coding
+
+        if self.centroids is not None and self.embed is not None:
+            embedding = self.embed(message)
+            coding, generic = self.centroids
+            margin = float(embedding @ coding - embedding @ generic)
+            if abs(margin) >= CENTROID_MARGIN:
+                self.counts["centroids"] += 1
+                return margin > 0
+
+        self.counts["llm"] += 1
+        return None
+
+    @property
+    def fast_path_rate(self) -> float:
+        total = sum(self.counts.values())
+        return (total - self.counts["llm"]) / total if total else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {**self.counts, "fast_path_rate": round(self.fast_path_rate, 3)}
+
+
+def fit_centroids(
+    examples: List[Tuple[str, bool]],
+    embed: Callable[[str], np.ndarray],
+    path: str,
+):
+    """Embed labelled examples and save the normalized centroid of each class."""
+    embeddings = {True: [], False: []}
+    for message, is_coding in examples:
+        embeddings[is_coding].append(np.asarray(embed(message), dtype=np.float32))
+
+    centroids = {}
+    for name, is_coding in [("coding", True), ("generic", False)]:
+        centroid = np.mean(embeddings[is_coding], axis=0)
+        centroids[name] = centroid / np.linalg.norm(centroid)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path, **centroids)
+
+
+# Small labelled set used to build the centroid model
+EXAMPLES = [
+    ("How do I reverse a linked list?", True),
+    ("Why does my loop never terminate?", True),
+    ("What is the difference between a process and a thread?", True),
+    ("How can I make this query faster?", True),
+    ("Explain how a hash map handles collisions", True),
+    ("My build fails with an undefined reference error", True),
+    ("How do I center a div?", True),
+    ("What does the yield keyword do?", True),
+    ("What is the meaning of life?", False),
+    ("Can you suggest a name for my dog?", False),
+    ("How far is the moon from the earth?", False),
+    ("What should I gift my mother?", False),
+    ("Explain the causes of the first world war", False),
+    ("How do I stay motivated while studying?", False),
+    ("What are some good places to visit in Japan?", False),
+    ("Why is the sky blue?", False),
+]
+
+
+if __name__ == "__main__":
+    # make the shared modules at the repository root importable
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    from common.embeddings import EmbeddingService
+
+    load_dotenv()
+    cache_dir = Path(__file__).resolve().parent / ".cache"
+    embedding_service = EmbeddingService(
+        OpenAI(), cache_path=str(cache_dir / "embeddings.sqlite")
+    )
+    # one batched request, the per-example lookups below are then cache hits
+    embedding_service.embed_many(message for message, _ in EXAMPLES)
+
+    path = cache_dir / "router_centroids.npz"
+    fit_centroids(EXAMPLES, embedding_service.embed, str(path))
+    print(f"centroids saved to {path}")
@@ -10,6 +10,7 @@ Rules:
 - Follow the output format strictly.
 - You must ensure that the steps plan, action, observe & output are executed one at a time.
 - When using tools, you MUST set the step to "action" and provide the tool_name and tool_input.
+- When several tool calls do not depend on each other, request them together in a single "action" step using tool_calls.
 - You must ensure that you are generating a unique tool_call_id for each tool call.
 - Carefully analyze the user query.
 
@@ -25,6 +26,13 @@ Input: What is the weather in Tokyo?
 {{ "step": "observe", "content": "The weather in Tokyo is sunny with a temperature of 12 degrees Celsius." }}
 {{ "step": "output", "content": "The weather in Tokyo is sunny with a temperature of 12 degrees Celsius. You can go out and enjoy the weather." }}
 
+Example for independent tool calls:
+Input: What is the weather in Tokyo and Paris?
+{{ "step": "plan", "content": "The user is asking about the weather in Tokyo and Paris, both can be fetched together." }}
+{{ "step": "action", "tool_calls": [{{ "tool_name": "get_weather", "tool_input": "Tokyo", "tool_call_id": "2345678901" }}, {{ "tool_name": "get_weather", "tool_input": "Paris", "tool_call_id": "3456789012" }}] }}
+{{ "step": "observe", "content": "It is sunny and 12 degrees Celsius in Tokyo, and cloudy and 8 degrees Celsius in Paris." }}
+{{ "step": "output", "content": "Tokyo is sunny at 12 degrees Celsius while Paris is cloudy at 8 degrees Celsius. Pack sunglasses and an umbrella!" }}
+
 Example:
 Input: write a python file in current directory to add two numbers
 {{ "step": "plan", "content": "The user is asking to create a python file to add two numbers." }}
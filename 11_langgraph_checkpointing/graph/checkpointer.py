@@ -0,0 +1,308 @@
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+
+# Marker stored in place of the messages channel when only a delta is written
+DELTA_KEY = "__messages_delta__"
+
+# MongoDBSaver and AsyncMongoDBSaver default to different collections, the CLI
+# and the server both pass these so either can resume the other's threads
+MONGODB_COLLECTIONS = {
+    "checkpoint_collection_name": "checkpoints",
+    "writes_collection_name": "checkpoint_writes",
+}
+
+
+def is_delta(value: Any) -> bool:
+    return isinstance(value, dict) and value.get(DELTA_KEY) is True
+
+
+def is_prefix(prefix: List, messages: List) -> bool:
+    """Check whether `messages` only appends to `prefix`."""
+    if len(prefix) > len(messages):
+        return False
+    return all(a is b or a == b for a, b in zip(prefix, messages))
+
+
+class DeltaCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer that stores only the per-step delta of the messages channel.
+
+    Wraps any checkpointer (MongoDBSaver, InMemorySaver, ...). When a step only
+    appends to the messages of its parent checkpoint, the messages channel is
+    stored as a marker holding the parent checkpoint id and the new messages.
+    A full snapshot is written every `snapshot_interval` steps, or whenever the
+    parent is unknown or its messages were rewritten, which bounds how many
+    checkpoints have to be read to rebuild the state.
+
+    Args:
+        saver: The checkpointer that actually stores the checkpoints
+        snapshot_interval: Maximum number of deltas between two full snapshots
+        channel: The name of the messages channel in the graph state
+        cache_size: Number of rebuilt message lists kept in memory
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        snapshot_interval: int = 20,
+        channel: str = "messages",
+        cache_size: int = 256,
+    ):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.snapshot_interval = snapshot_interval
+        self.channel = channel
+        self.cache_size = cache_size
+        # (thread_id, checkpoint_ns, checkpoint_id) -> (messages, depth since last snapshot)
+        self._cache: OrderedDict[Tuple[str, str, str], Tuple[List, int]] = OrderedDict()
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def _cache_get(self, key: Tuple[str, str, str]) -> Optional[Tuple[List, int]]:
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+        return entry
+
+    def _cache_put(self, key: Tuple[str, str, str], messages: List, depth: int):
+        self._cache[key] = (messages, depth)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _to_delta(self, config: RunnableConfig, checkpoint: Checkpoint) -> Checkpoint:
+        """Replace the messages channel of a checkpoint with a delta against its parent."""
+        messages = checkpoint["channel_values"].get(self.channel)
+        if messages is None or is_delta(messages):
+            return checkpoint
+
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        parent = self._cache_get((thread_id, checkpoint_ns, parent_id))
+
+        if (
+            parent is None
+            or parent[1] + 1 >= self.snapshot_interval
+            or not is_prefix(parent[0], messages)
+        ):
+            self._cache_put((thread_id, checkpoint_ns, checkpoint["id"]), messages, 0)
+            return checkpoint
+
+        parent_messages, parent_depth = parent
+        self._cache_put(
+            (thread_id, checkpoint_ns, checkpoint["id"]), messages, parent_depth + 1
+        )
+        delta = {
+            DELTA_KEY: True,
+            "parent": parent_id,
+            "offset": len(parent_messages),
+            "messages": messages[len(parent_messages) :],
+            "depth": parent_depth + 1,
+        }
+        return {
+            **checkpoint,
+            "channel_values": {**checkpoint["channel_values"], self.channel: delta},
+        }
+
+    def _parent_config(self, config: RunnableConfig, parent_id: str) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": parent_id,
+            }
+        }
+
+    def _apply_chain(
+        self,
+        key_prefix: Tuple[str, str],
+        chain: List[Tuple[str, Dict[str, Any]]],
+        base: List,
+    ) -> List:
+        """Apply the collected deltas, oldest first, on top of the base messages."""
+        messages = base
+        for checkpoint_id, delta in reversed(chain):
+            messages = messages[: delta["offset"]] + delta["messages"]
+            self._cache_put((*key_prefix, checkpoint_id), messages, delta["depth"])
+        return messages
+
+    def _with_messages(self, checkpoint_tuple: CheckpointTuple, messages: List):
+        checkpoint = checkpoint_tuple.checkpoint
+        return checkpoint_tuple._replace(
+            checkpoint={
+                **checkpoint,
+                "channel_values": {
+                    **checkpoint["channel_values"],
+                    self.channel: messages,
+                },
+            }
+        )
+
+    def _rebuild_steps(
+        self, checkpoint_tuple: Optional[CheckpointTuple]
+    ) -> Generator[
+        RunnableConfig, Optional[CheckpointTuple], Optional[CheckpointTuple]
+    ]:
+        """Rebuild the messages of a checkpoint, shared by the sync and async readers.
+
+        Yields the config of every parent checkpoint it has to read and expects
+        the parent's tuple to be sent back, so the caller decides how to fetch it.
+        """
+        if checkpoint_tuple is None:
+            return None
+
+        config = checkpoint_tuple.config
+        key_prefix = (
+            config["configurable"]["thread_id"],
+            config["configurable"].get("checkpoint_ns", ""),
+        )
+        checkpoint_id = checkpoint_tuple.checkpoint["id"]
+        value = checkpoint_tuple.checkpoint["channel_values"].get(self.channel)
+        if not is_delta(value):
+            if value is not None:
+                self._cache_put((*key_prefix, checkpoint_id), value, 0)
+            return checkpoint_tuple
+
+        chain = []
+        while is_delta(value):
+            chain.append((checkpoint_id, value))
+            cached = self._cache_get((*key_prefix, value["parent"]))
+            if cached is not None:
+                base = cached[0]
+                break
+            checkpoint_id = value["parent"]
+            parent = yield self._parent_config(config, checkpoint_id)
+            value = parent.checkpoint["channel_values"].get(self.channel)
+        else:
+            base = value or []
+            self._cache_put((*key_prefix, checkpoint_id), base, 0)
+
+        messages = self._apply_chain(key_prefix, chain, base)
+        return self._with_messages(checkpoint_tuple, messages)
+
+    def _rebuild(
+        self, checkpoint_tuple: Optional[CheckpointTuple]
+    ) -> Optional[CheckpointTuple]:
+        steps = self._rebuild_steps(checkpoint_tuple)
+        try:
+            parent_config = next(steps)
+            while True:
+                parent_config = steps.send(self.saver.get_tuple(parent_config))
+        except StopIteration as done:
+            return done.value
+
+    async def _arebuild(
+        self, checkpoint_tuple: Optional[CheckpointTuple]
+    ) -> Optional[CheckpointTuple]:
+        steps = self._rebuild_steps(checkpoint_tuple)
+        try:
+            parent_config = next(steps)
+            while True:
+                parent = await self.saver.aget_tuple(parent_config)
+                parent_config = steps.send(parent)
+        except StopIteration as done:
+            return done.value
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._rebuild(self.saver.get_tuple(config))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        for checkpoint_tuple in self.saver.list(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield self._rebuild(checkpoint_tuple)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(
+            config, self._to_delta(config, checkpoint), metadata, new_versions
+        )
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._cache.clear()
+        self.saver.delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._arebuild(await self.saver.aget_tuple(config))
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async for checkpoint_tuple in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield await self._arebuild(checkpoint_tuple)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.saver.aput(
+            config, self._to_delta(config, checkpoint), metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self._cache.clear()
+        await self.saver.adelete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        return self.saver.get_next_version(current, channel)
@@ -1,11 +1,25 @@
+from functools import partial
 from typing import Annotated, TypedDict
 from typing import Annotated, List, Optional
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.mongodb import MongoDBSaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from common.graph_metrics import instrument_node
+from common.lazy import once
+from common.request_scheduler import create_http_clients
 from models.schemas import OutputSchema
-from graph.nodes import chatbot, determine_flow, handle_tool_call
+from graph.nodes import (
+    achatbot,
+    ahandle_tool_call,
+    astream_chatbot,
+    chatbot,
+    determine_flow,
+    handle_tool_call,
+    stream_chatbot,
+    tools,
+)
 
 
 # Define the state type
@@ -16,23 +30,81 @@ class State(TypedDict):
     llm_output: Optional[OutputSchema] = None
 
 
+def create_llm_with_tools() -> BaseChatModel:
+    """Initialize the LLM, bind the tools and add structured output."""
+    # langchain.chat_models pulls in the whole OpenAI stack, only load it when needed
+    from langchain.chat_models import init_chat_model
+
+    # requests share the process-wide rate limits, which also handle the retries,
+    # and streamed responses report their usage like the others
+    llm = init_chat_model(
+        model_provider="openai",
+        model="gpt-4.1",
+        max_retries=0,
+        stream_usage=True,
+        **create_http_clients(),
+    )
+    # Bind tools first, then add structured output
+    return llm.bind_tools(tools, tool_choice="auto").with_structured_output(
+        OutputSchema
+    )
+
+
+@once
+def get_llm_with_tools() -> BaseChatModel:
+    """The LLM with tools and structured output, built once per process."""
+    return create_llm_with_tools()
+
+
 # Create the graph
 def create_graph(
-    llm_with_tools: BaseChatModel, checkpointer: MongoDBSaver
+    llm_with_tools: BaseChatModel,
+    checkpointer: BaseCheckpointSaver,
+    stream_output: bool = False,
 ) -> StateGraph:
     """Create and configure the graph.
 
     Args:
         llm_with_tools: The LLM instance with bound tools
+        checkpointer: The checkpointer used to persist the graph state
+        stream_output: Stream the content of output steps through the custom
+            stream mode as the model generates it
 
     Returns:
         A compiled graph instance
     """
     graph = StateGraph(State)
+    chatbot_node, achatbot_node = (
+        (stream_chatbot, astream_chatbot) if stream_output else (chatbot, achatbot)
+    )
 
-    # Add nodes
-    graph.add_node("chatbot", lambda state: chatbot(state, llm_with_tools))
-    graph.add_node("tools", handle_tool_call)
+    # Add nodes, each with a sync and an async variant so that the graph
+    # can be driven by both stream() and astream(). Both are timed when
+    # GRAPH_METRICS is on.
+    graph.add_node(
+        "chatbot",
+        RunnableLambda(
+            instrument_node(
+                "checkpointing",
+                "chatbot",
+                partial(chatbot_node, llm_with_tools=llm_with_tools),
+            ),
+            afunc=instrument_node(
+                "checkpointing",
+                "chatbot",
+                partial(achatbot_node, llm_with_tools=llm_with_tools),
+            ),
+            name="chatbot",
+        ),
+    )
+    graph.add_node(
+        "tools",
+        RunnableLambda(
+            instrument_node("checkpointing", "tools", handle_tool_call),
+            afunc=instrument_node("checkpointing", "tools", ahandle_tool_call),
+            name="tools",
+        ),
+    )
 
     # Define edges
     graph.add_edge(START, "chatbot")
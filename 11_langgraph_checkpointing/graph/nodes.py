@@ -1,19 +1,33 @@
-from typing import Dict, Any
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, Any, List
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableSequence
+from langgraph.config import get_stream_writer
 from langgraph.graph import END
 
-from models.schemas import OutputSchema
-from tools.weather import get_weather
+from graph.streaming import OutputStreamParser, chunk_text
+
+from models.schemas import OutputSchema, ToolCall
+from tools.weather import generate_tool_response, get_weather
 from tools.command import execute_command
 
 tools = [get_weather, execute_command]
+tools_by_name = {tool.name: tool for tool in tools}
 
+# Name of the single string parameter each tool expects
+tool_params = {"get_weather": "city", "execute_command": "command"}
+
+# Upper bound on the tool calls running at the same time across the process
+MAX_PARALLEL_TOOL_CALLS = 8
+tool_executor = ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_TOOL_CALLS, thread_name_prefix="tool"
+)
 
-def chatbot(state: Dict[str, Any], llm_with_tools):
-    """Chatbot node that processes messages and generates responses."""
-    messages = state["messages"]
-    response = llm_with_tools.invoke(messages)
 
+def chatbot_update(response) -> Dict[str, Any]:
+    """Turn the LLM response into the state update of the chatbot node."""
     if isinstance(response, OutputSchema):
         return {
             "messages": [AIMessage(content=response.content)],
@@ -23,6 +37,61 @@ def chatbot(state: Dict[str, Any], llm_with_tools):
     return {"messages": [response]}
 
 
+def chatbot(state: Dict[str, Any], llm_with_tools):
+    """Chatbot node that processes messages and generates responses."""
+    messages = state["messages"]
+    response = llm_with_tools.invoke(messages)
+    return chatbot_update(response)
+
+
+async def achatbot(state: Dict[str, Any], llm_with_tools):
+    """Async variant of the chatbot node."""
+    messages = state["messages"]
+    response = await llm_with_tools.ainvoke(messages)
+    return chatbot_update(response)
+
+
+def stream_chatbot(state: Dict[str, Any], llm_with_tools):
+    """Chatbot node that streams the content of output steps as it is generated.
+
+    The structured output LLM is a sequence of the chat model and its output
+    parser. The raw chat model is streamed, content deltas of an output step
+    are sent to the caller through the custom stream, and the accumulated
+    message is handed to the same parser so determine_flow still gets a
+    complete OutputSchema.
+    """
+    if not isinstance(llm_with_tools, RunnableSequence):
+        return chatbot(state, llm_with_tools)
+
+    writer = get_stream_writer()
+    output_parser = OutputStreamParser()
+    message = None
+    for chunk in llm_with_tools.first.stream(state["messages"]):
+        message = chunk if message is None else message + chunk
+        delta = output_parser.feed(chunk_text(chunk))
+        if delta:
+            writer({"content_delta": delta})
+
+    return chatbot_update(llm_with_tools.last.invoke(message))
+
+
+async def astream_chatbot(state: Dict[str, Any], llm_with_tools):
+    """Async variant of stream_chatbot."""
+    if not isinstance(llm_with_tools, RunnableSequence):
+        return await achatbot(state, llm_with_tools)
+
+    writer = get_stream_writer()
+    output_parser = OutputStreamParser()
+    message = None
+    async for chunk in llm_with_tools.first.astream(state["messages"]):
+        message = chunk if message is None else message + chunk
+        delta = output_parser.feed(chunk_text(chunk))
+        if delta:
+            writer({"content_delta": delta})
+
+    return chatbot_update(await llm_with_tools.last.ainvoke(message))
+
+
 def determine_flow(state: Dict[str, Any]) -> str:
     """Determine the next node in the flow based on the current state."""
     llm_output = state["llm_output"]
@@ -37,26 +106,135 @@ def determine_flow(state: Dict[str, Any]) -> str:
     return END
 
 
+def get_tool_calls(llm_output: OutputSchema) -> List[ToolCall]:
+    """Collect the tool calls requested by an action step."""
+    if llm_output.tool_calls:
+        return llm_output.tool_calls
+
+    if llm_output.tool_name:
+        return [
+            ToolCall(
+                tool_name=llm_output.tool_name,
+                tool_input=llm_output.tool_input or "",
+                tool_call_id=llm_output.tool_call_id,
+            )
+        ]
+    return []
+
+
+def invalid_tool_response(tool_call: ToolCall, error: str) -> Dict[str, Any]:
+    return generate_tool_response(
+        response=error,
+        tool_name=tool_call.tool_name,
+        tool_input=tool_call.tool_input,
+        tool_call_id=tool_call.tool_call_id,
+    )
+
+
+def run_tool_call(tool_call: ToolCall) -> Dict[str, Any]:
+    """Run a single tool call and return its tool response."""
+    tool = tools_by_name.get(tool_call.tool_name)
+    if tool is None:
+        return invalid_tool_response(
+            tool_call, f"{tool_call.tool_name} is not a valid tool."
+        )
+
+    param_name = tool_params[tool_call.tool_name]
+    try:
+        return tool.invoke(
+            {param_name: tool_call.tool_input, "tool_call_id": tool_call.tool_call_id}
+        )
+    except Exception as e:
+        return invalid_tool_response(
+            tool_call, f"The tool {tool_call.tool_name} failed with error: {e}"
+        )
+
+
+async def arun_tool_call(tool_call: ToolCall) -> Dict[str, Any]:
+    """Async variant of run_tool_call."""
+    tool = tools_by_name.get(tool_call.tool_name)
+    if tool is None:
+        return invalid_tool_response(
+            tool_call, f"{tool_call.tool_name} is not a valid tool."
+        )
+
+    param_name = tool_params[tool_call.tool_name]
+    try:
+        return await tool.ainvoke(
+            {param_name: tool_call.tool_input, "tool_call_id": tool_call.tool_call_id}
+        )
+    except Exception as e:
+        return invalid_tool_response(
+            tool_call, f"The tool {tool_call.tool_name} failed with error: {e}"
+        )
+
+
+def tool_results_update(
+    tool_calls: List[ToolCall], results: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Merge the responses of the tool calls into the state update of the tools node."""
+    if len(results) == 1:
+        return {
+            "messages": [results[0]["messages"][0]],
+            "llm_output": results[0]["llm_output"],
+        }
+
+    observations = [result["llm_output"] for result in results]
+    return {
+        "messages": [result["messages"][0] for result in results],
+        "llm_output": OutputSchema(
+            step="observe",
+            role="tool",
+            content="\n".join(
+                f"[{observation.tool_call_id}] {observation.content}"
+                for observation in observations
+            ),
+            tool_calls=tool_calls,
+        ),
+    }
+
+
 def handle_tool_call(state: Dict[str, Any]):
-    """Handle tool calls based on the LLM output."""
+    """Handle tool calls based on the LLM output.
+
+    All tool calls of an action step are independent, so they run at the same
+    time on the shared tool executor. Results are returned in the order the
+    calls were requested, each message keyed by its tool_call_id.
+    """
     llm_output = state["llm_output"]
     if not llm_output or llm_output.step != "action":
         return state
 
-    tool_name = llm_output.tool_name
-    tool_input = llm_output.tool_input
-    tool_call_id = llm_output.tool_call_id
+    tool_calls = get_tool_calls(llm_output)
+    if not tool_calls:
+        return state
 
-    for tool in tools:
-        if tool.name == tool_name:
-            # Use the correct parameter name based on the tool
-            param_name = "city" if tool_name == "get_weather" else "command"
-            tool_call = tool.invoke(
-                {param_name: tool_input, "tool_call_id": tool_call_id}
-            )
-            return {
-                "messages": [tool_call["messages"][0]],
-                "llm_output": tool_call,
-            }
+    # every call runs in a copy of the node's context, so the tools can reach
+    # the graph's stream writer
+    contexts = [copy_context() for _ in tool_calls]
+    results = list(
+        tool_executor.map(
+            lambda context, call: context.run(run_tool_call, call),
+            contexts,
+            tool_calls,
+        )
+    )
+    return tool_results_update(tool_calls, results)
+
+
+async def ahandle_tool_call(state: Dict[str, Any]):
+    """Async variant of handle_tool_call.
+
+    The tool calls are awaited together on the event loop. The tools bound
+    their own concurrency (pooled HTTP client, command runner semaphore).
+    """
+    llm_output = state["llm_output"]
+    if not llm_output or llm_output.step != "action":
+        return state
+
+    tool_calls = get_tool_calls(llm_output)
+    if not tool_calls:
+        return state
 
-    return state
+    results = await asyncio.gather(*(arun_tool_call(call) for call in tool_calls))
+    return tool_results_update(tool_calls, results)
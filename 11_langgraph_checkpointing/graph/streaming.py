@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Set
+
+from langchain_core.messages import AIMessageChunk
+
+# Single character escapes allowed in JSON strings
+ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class OutputStreamParser:
+    """Incrementally parses the OutputSchema JSON while the model streams it.
+
+    Only the string fields of the top level object are tracked, which is
+    enough to learn the step and to follow the content as it grows. Every
+    character is looked at once, so the cost stays linear in the response
+    length however small the streamed chunks are.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.completed: Set[str] = set()
+        self.emitted = 0
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._escape: Optional[str] = None
+        self._high_surrogate: Optional[str] = None
+        self._buffer = []
+        self._key: Optional[str] = None
+        self._expect_key = False
+
+    @property
+    def step(self) -> Optional[str]:
+        """The step of the response, once it has been streamed completely."""
+        return self.fields.get("step") if "step" in self.completed else None
+
+    def feed(self, text: str) -> str:
+        """Consume the next chunk of JSON and return the new content of an output step."""
+        for char in text:
+            if self._in_string:
+                self._feed_string(char)
+            elif char == "{" or char == "[":
+                self._depth += 1
+                self._expect_key = char == "{" and self._depth == 1
+            elif char == "}" or char == "]":
+                self._depth -= 1
+            elif char == ",":
+                self._expect_key = self._depth == 1
+            elif char == '"':
+                self._in_string = True
+                self._is_key = self._expect_key
+                self._buffer = []
+            elif char == ":":
+                self._expect_key = False
+
+        if self.step != "output":
+            return ""
+        if self._streaming_key() == "content":
+            delta = "".join(self._buffer[self.emitted :])
+            self.emitted = len(self._buffer)
+        else:
+            content = self.fields.get("content", "")
+            delta = content[self.emitted :]
+            self.emitted = len(content)
+        return delta
+
+    def _streaming_key(self) -> Optional[str]:
+        """The top level key whose string value is being streamed right now."""
+        if self._in_string and not self._is_key and self._depth == 1:
+            return self._key
+        return None
+
+    def _feed_string(self, char: str):
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u" and len(self._escape) < 5:
+                return
+            escape, self._escape = self._escape, None
+            if escape[0] == "u":
+                self._append(chr(int(escape[1:], 16)))
+            else:
+                self._append(ESCAPES.get(escape, escape))
+        elif char == "\\":
+            self._escape = ""
+        elif char == '"':
+            self._in_string = False
+            value = "".join(self._buffer)
+            if self._is_key:
+                self._key = value
+            elif self._depth == 1 and self._key is not None:
+                self.fields[self._key] = value
+                self.completed.add(self._key)
+        else:
+            self._append(char)
+
+    def _append(self, char: str):
+        if "\ud800" <= char <= "\udbff":
+            self._high_surrogate = char
+            return
+        if self._high_surrogate is not None:
+            pair, self._high_surrogate = self._high_surrogate + char, None
+            char = pair.encode("utf-16", "surrogatepass").decode("utf-16")
+        self._buffer.append(char)
+
+
+def chunk_text(chunk: AIMessageChunk) -> str:
+    """Return the JSON text carried by a streamed chunk.
+
+    Depending on the structured output method the JSON arrives either as the
+    message content or as the arguments of a tool call.
+    """
+    if isinstance(chunk.content, str) and chunk.content:
+        return chunk.content
+    return "".join(
+        tool_call_chunk.get("args") or "" for tool_call_chunk in chunk.tool_call_chunks
+    )
@@ -1,48 +1,84 @@
-import json
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
-from langgraph.checkpoint.mongodb import MongoDBSaver
-from models.schemas import OutputSchema
-from graph.nodes import tools
-from graph.factory import create_graph
 from config.prompts import SYSTEM_PROMPT
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the LLM and bind tools
-llm = init_chat_model(model_provider="openai", model="gpt-4.1")
-# Bind tools first, then add structured output
-llm_with_tools = llm.bind_tools(tools, tool_choice="auto").with_structured_output(
-    OutputSchema
-)
-
 MONGODB_URI = os.getenv("MONGODB_URI")
+# "full" stores the whole conversation per step, "delta" only the new messages
+CHECKPOINT_MODE = os.getenv("CHECKPOINT_MODE", "full")
+# print the final answer token by token instead of waiting for the whole response
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "true").lower() == "true"
 config = {"configurable": {"thread_id": "1"}}
 
 
+def build_graph(stack: ExitStack):
+    """Load the LangChain and MongoDB stacks, connect the checkpointer and compile the graph.
+
+    This takes seconds, mostly imports, so it is kept out of module import
+    and runs while the user types the first question.
+    """
+    from langgraph.checkpoint.mongodb import MongoDBSaver
+    from graph.checkpointer import MONGODB_COLLECTIONS, DeltaCheckpointSaver
+    from graph.factory import create_graph, get_llm_with_tools
+
+    checkpointer = stack.enter_context(
+        MongoDBSaver.from_conn_string(MONGODB_URI, **MONGODB_COLLECTIONS)
+    )
+    if CHECKPOINT_MODE == "delta":
+        checkpointer = DeltaCheckpointSaver(checkpointer)
+    return create_graph(get_llm_with_tools(), checkpointer, stream_output=STREAM_OUTPUT)
+
+
 def main():
     """Main function to run the chatbot."""
-    with MongoDBSaver.from_conn_string(MONGODB_URI) as checkpointer:
-        graph = create_graph(llm_with_tools, checkpointer)
+    with ExitStack() as stack, ThreadPoolExecutor(max_workers=1) as executor:
+        graph_future = executor.submit(build_graph, stack)
 
         while True:
             query = input("> ")
+            # built once, the first question may wait for the rest of it
+            graph = graph_future.result()
             messages = [
                 {"role": "user", "content": query},
                 {"role": "system", "content": SYSTEM_PROMPT},
             ]
 
-            for event in graph.stream(
-                {"messages": messages, "llm_output": None}, config
+            streamed = False
+            for mode, event in graph.stream(
+                {"messages": messages, "llm_output": None},
+                config,
+                stream_mode=["updates", "custom"],
             ):
+                if mode == "custom" and "command_output" in event:
+                    for line in event["command_output"].splitlines():
+                        print(f"🧰 {event['stream']}: {line}")
+                    continue
+                if mode == "custom":
+                    if not streamed:
+                        print("🤖: ", end="")
+                        streamed = True
+                    print(event["content_delta"], end="", flush=True)
+                    continue
+
                 if "chatbot" in event and "llm_output" in event["chatbot"]:
                     llm_output = event["chatbot"]["llm_output"]
                     if llm_output:
                         try:
                             if llm_output.step == "output":
-                                print(f"🤖: {llm_output.content}")
+                                if streamed:
+                                    print()
+                                else:
+                                    print(f"🤖: {llm_output.content}")
                             elif llm_output.step in ["action", "observe"]:
                                 continue
                             else:
@@ -1,8 +1,18 @@
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.tools import InjectedToolCallId
 
 
+class ToolCall(BaseModel):
+    """Schema for a single tool call requested by the LLM."""
+
+    tool_name: str = Field(description="The name of the function to call")
+    tool_input: str = Field(description="The input of the function")
+    tool_call_id: Optional[Annotated[str, InjectedToolCallId]] = Field(
+        default=None, description="The id of the tool call"
+    )
+
+
 class OutputSchema(BaseModel):
     """Schema for LLM output."""
 
@@ -20,3 +30,7 @@ class OutputSchema(BaseModel):
     tool_call_id: Optional[Annotated[str, InjectedToolCallId]] = Field(
         default=None, description="The id of the tool call"
     )
+    tool_calls: Optional[List[ToolCall]] = Field(
+        default=None,
+        description="The independent tool calls to run together if the step is action",
+    )
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import WSMsgType, web
+from dotenv import load_dotenv
+from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+from graph.checkpointer import MONGODB_COLLECTIONS, DeltaCheckpointSaver
+from graph.factory import create_graph, get_llm_with_tools
+from config.prompts import SYSTEM_PROMPT
+from common.graph_metrics import render_metrics
+
+# Load environment variables
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+# "full" stores the whole conversation per step, "delta" only the new messages
+CHECKPOINT_MODE = os.getenv("CHECKPOINT_MODE", "full")
+# send the final answer as "delta" events while it is generated
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "true").lower() == "true"
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8080"))
+# Turns running through the graph at the same time across all sessions
+MAX_CONCURRENT_TURNS = int(os.getenv("MAX_CONCURRENT_TURNS", "256"))
+# Turns a single session may have running or queued before it is told to back off
+MAX_PENDING_TURNS_PER_SESSION = int(os.getenv("MAX_PENDING_TURNS_PER_SESSION", "2"))
+
+
+class SessionBusyError(Exception):
+    """Raised when a session already has too many turns running or queued."""
+
+
+class Session:
+    """Per-thread state that runs the turns of one conversation one at a time."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ChatServer:
+    """Serves many conversations concurrently through one compiled graph.
+
+    Turns of the same thread_id are serialized, since each one continues from
+    the checkpoint written by the previous one. A session with too many turns
+    in flight is rejected instead of queued without bound, and a global
+    semaphore caps how many turns run through the graph at once.
+    """
+
+    def __init__(
+        self,
+        graph,
+        max_concurrent_turns: int = MAX_CONCURRENT_TURNS,
+        max_pending_turns: int = MAX_PENDING_TURNS_PER_SESSION,
+    ):
+        self.graph = graph
+        self.max_pending_turns = max_pending_turns
+        self.turns = asyncio.Semaphore(max_concurrent_turns)
+        self.sessions: Dict[str, Session] = {}
+
+    async def run_turn(
+        self, thread_id: str, query: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run one user turn and yield the plan and output steps as they are produced.
+
+        With streaming enabled the content of the output step is first sent as
+        "delta" events, followed by the complete output step. The output of a
+        command the agent runs is sent as "command_output" events, with the
+        stream it was written to, while the command runs.
+        """
+        session = self.sessions.setdefault(thread_id, Session())
+        if session.pending >= self.max_pending_turns:
+            raise SessionBusyError(thread_id)
+
+        session.pending += 1
+        try:
+            async with session.lock, self.turns:
+                config = {"configurable": {"thread_id": thread_id}}
+                messages = [
+                    {"role": "user", "content": query},
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                ]
+                async for mode, event in self.graph.astream(
+                    {"messages": messages, "llm_output": None},
+                    config,
+                    stream_mode=["updates", "custom"],
+                ):
+                    if mode == "custom" and "command_output" in event:
+                        yield {
+                            "step": "command_output",
+                            "stream": event["stream"],
+                            "content": event["command_output"],
+                        }
+                    elif mode == "custom":
+                        yield {"step": "delta", "content": event["content_delta"]}
+                    elif "chatbot" in event and "llm_output" in event["chatbot"]:
+                        llm_output = event["chatbot"]["llm_output"]
+                        if llm_output and llm_output.step not in ["action", "observe"]:
+                            yield {
+                                "step": llm_output.step,
+                                "content": llm_output.content,
+                            }
+        finally:
+            session.pending -= 1
+            if session.pending == 0:
+                self.sessions.pop(thread_id, None)
+
+
+async def handle_message(request: web.Request) -> web.StreamResponse:
+    """POST /threads/{thread_id}/messages, streams the steps back as NDJSON."""
+    chat_server: ChatServer = request.app["chat_server"]
+    thread_id = request.match_info["thread_id"]
+    body = await request.json()
+
+    turn = chat_server.run_turn(thread_id, body["content"])
+    try:
+        first_event = await anext(turn)
+    except SessionBusyError:
+        raise web.HTTPTooManyRequests(text="session is busy, retry later")
+    except StopAsyncIteration:
+        first_event = None
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        if first_event is not None:
+            await response.write(json.dumps(first_event).encode() + b"\n")
+            async for event in turn:
+                # write() waits for the transport to drain, so slow clients slow their own turn only
+                await response.write(json.dumps(event).encode() + b"\n")
+    finally:
+        # release the session right away if the client went away mid turn
+        await turn.aclose()
+    await response.write_eof()
+    return response
+
+
+async def handle_websocket(request: web.Request) -> web.WebSocketResponse:
+    """GET /threads/{thread_id}/ws, each text frame is a user turn."""
+    chat_server: ChatServer = request.app["chat_server"]
+    thread_id = request.match_info["thread_id"]
+
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            async for event in chat_server.run_turn(thread_id, msg.data):
+                await ws.send_json(event)
+        except SessionBusyError:
+            await ws.send_json({"step": "error", "content": "session is busy"})
+    return ws
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    chat_server: ChatServer = request.app["chat_server"]
+    return web.json_response({"active_sessions": len(chat_server.sessions)})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    """GET /metrics, node and LLM call metrics in Prometheus text when GRAPH_METRICS is on."""
+    return web.Response(
+        body=render_metrics().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def graph_context(app: web.Application):
+    """Compile the graph once and share one pooled checkpointer connection."""
+    async with AsyncMongoDBSaver.from_conn_string(
+        MONGODB_URI, **MONGODB_COLLECTIONS
+    ) as checkpointer:
+        if CHECKPOINT_MODE == "delta":
+            checkpointer = DeltaCheckpointSaver(checkpointer)
+        graph = create_graph(
+            get_llm_with_tools(), checkpointer, stream_output=STREAM_OUTPUT
+        )
+        app["chat_server"] = ChatServer(graph)
+        yield
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.cleanup_ctx.append(graph_context)
+    app.add_routes(
+        [
+            web.post("/threads/{thread_id}/messages", handle_message),
+            web.get("/threads/{thread_id}/ws", handle_websocket),
+            web.get("/healthz", handle_health),
+            web.get("/metrics", handle_metrics),
+        ]
+    )
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=HOST, port=PORT)
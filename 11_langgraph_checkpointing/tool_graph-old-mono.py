@@ -1,8 +1,12 @@
 import json
 import os
+import sys
+from pathlib import Path
 from typing import Annotated, Any, Dict, List, Optional
 
-import requests
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import AIMessage
@@ -13,6 +17,8 @@ from langsmith import traceable
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from common.weather_client import fetch_weather
+
 # load the environment variables
 load_dotenv()
 
@@ -64,9 +70,8 @@ def get_weather(city: str, tool_call_id: Annotated[str, InjectedToolCallId]) ->
         tool_call_id: The id of the tool call
     """
     print(f"🧰 Tool: Getting weather for {city}")
-    url = f"https://wttr.in/{city}?format=%C+%t"
-    response = requests.get(url)
-    if response.status_code != 200:
+    weather = fetch_weather(city)
+    if weather is None:
         return generate_tool_response(
             response="Sorry, I couldn't get the weather information for that city.",
             tool_name="get_weather",
@@ -74,7 +79,7 @@ def get_weather(city: str, tool_call_id: Annotated[str, InjectedToolCallId]) ->
             tool_call_id=tool_call_id,
         )
     return generate_tool_response(
-        response=f"The weather in {city} is {response.text}.",
+        response=f"The weather in {city} is {weather}.",
         tool_name="get_weather",
         tool_input=city,
         tool_call_id=tool_call_id,
@@ -1,11 +1,36 @@
-import os
 from typing import Annotated
 from langchain_core.tools import InjectedToolCallId, tool
+from langgraph.config import get_stream_writer
 from langsmith import traceable
 
+from common.command_runner import OutputCallback, get_command_runner
 from tools.weather import generate_tool_response
 
 
+def print_command_output(stream: str, chunk: str):
+    """Print the command output to the console as the command produces it."""
+    for line in chunk.splitlines():
+        print(f"🧰 {stream}: {line}")
+
+
+def command_output_writer() -> OutputCallback:
+    """Send the command output to the caller as the command produces it.
+
+    Inside a graph run every chunk goes to the custom stream as a
+    {"command_output", "stream"} event, outside of one it is printed.
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return print_command_output
+
+    def write(stream: str, chunk: str):
+        # the writers of stream() and astream() are safe to call from the runner thread
+        writer({"command_output": chunk, "stream": stream})
+
+    return write
+
+
 @tool
 @traceable
 def execute_command(
@@ -19,10 +44,28 @@ def execute_command(
         tool_call_id: The id of the tool call
     """
     print(f"🧰 Tool: Executing command {command}")
-    response = os.system(command)
+    result = get_command_runner().run(command, on_output=command_output_writer())
     return generate_tool_response(
-        response=f"The command {command} returned {response}.",
+        response=result.summary(),
         tool_name="execute_command",
         tool_input=command,
         tool_call_id=tool_call_id,
     )
+
+
+@traceable
+async def aexecute_command(
+    command: str, tool_call_id: Annotated[str, InjectedToolCallId]
+) -> str:
+    """Async variant of execute_command, used when the tool is awaited by the graph."""
+    print(f"🧰 Tool: Executing command {command}")
+    result = await get_command_runner().arun(command, on_output=command_output_writer())
+    return generate_tool_response(
+        response=result.summary(),
+        tool_name="execute_command",
+        tool_input=command,
+        tool_call_id=tool_call_id,
+    )
+
+
+execute_command.coroutine = aexecute_command
@@ -1,9 +1,9 @@
-import requests
-from typing import Annotated
+from typing import Annotated, Optional
 from langchain_core.tools import InjectedToolCallId, tool
 from langsmith import traceable
 from langchain_core.messages import AIMessage
 
+from common.weather_client import afetch_weather, fetch_weather
 from models.schemas import OutputSchema
 
 
@@ -26,19 +26,11 @@ def generate_tool_response(
     }
 
 
-@tool
-@traceable
-def get_weather(city: str, tool_call_id: Annotated[str, InjectedToolCallId]) -> str:
-    """Get the current weather information for a specified city.
-
-    Args:
-        city: The name of the city to get weather information for
-        tool_call_id: The id of the tool call
-    """
-    print(f"🧰 Tool: Getting weather for {city}")
-    url = f"https://wttr.in/{city}?format=%C+%t"
-    response = requests.get(url)
-    if response.status_code != 200:
+def generate_weather_response(
+    city: str, weather: Optional[str], tool_call_id: str
+) -> dict:
+    """Generate the tool response for a weather lookup."""
+    if weather is None:
         return generate_tool_response(
             response="Sorry, I couldn't get the weather information for that city.",
             tool_name="get_weather",
@@ -46,8 +38,33 @@ def get_weather(city: str, tool_call_id: Annotated[str, InjectedToolCallId]) ->
             tool_call_id=tool_call_id,
         )
     return generate_tool_response(
-        response=f"The weather in {city} is {response.text}.",
+        response=f"The weather in {city} is {weather}.",
         tool_name="get_weather",
         tool_input=city,
         tool_call_id=tool_call_id,
     )
+
+
+@tool
+@traceable
+def get_weather(city: str, tool_call_id: Annotated[str, InjectedToolCallId]) -> str:
+    """Get the current weather information for a specified city.
+
+    Args:
+        city: The name of the city to get weather information for
+        tool_call_id: The id of the tool call
+    """
+    print(f"🧰 Tool: Getting weather for {city}")
+    return generate_weather_response(city, fetch_weather(city), tool_call_id)
+
+
+@traceable
+async def aget_weather(
+    city: str, tool_call_id: Annotated[str, InjectedToolCallId]
+) -> str:
+    """Async variant of get_weather, used when the tool is awaited by the graph."""
+    print(f"🧰 Tool: Getting weather for {city}")
+    return generate_weather_response(city, await afetch_weather(city), tool_call_id)
+
+
+get_weather.coroutine = aget_weather
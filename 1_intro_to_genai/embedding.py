@@ -1,12 +1,20 @@
+import sys
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from common.embeddings import create_embedding
+
 load_dotenv()
 
 client = OpenAI()
 
 text = "The Eiffel Tower, Paris's iconic iron lattice masterpiece, stands as a timeless symbol of French elegance and architectural brilliance."
 
-response = client.embeddings.create(model="text-embedding-3-small", input=text)
+embedding = create_embedding(client, text)
 
-print("vector embedding: ", response.data[0].embedding)
+print("vector embedding: ", embedding)
@@ -1,6 +1,13 @@
-import tiktoken
+import sys
+from pathlib import Path
 
-encoder = tiktoken.encoding_for_model("gpt-4o")
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common.tokenizer import count_tokens_batch, get_encoding
+
+# loaded from the local cache, run `python -m common.tokenizer --seed` once to fill it
+encoder = get_encoding("gpt-4o")
 
 print("token size: ", encoder.n_vocab)
 
@@ -10,3 +17,6 @@ print(f"tokens for {text}: {tokens}")
 
 decoded_text = encoder.decode(tokens)
 print(f"decoded text for {tokens}: {decoded_text}")
+
+texts = ["Hello, world!", "Tokens are not words.", "Counting many texts at once"]
+print(f"token counts for {texts}: {list(count_tokens_batch(texts, 'gpt-4o'))}")
@@ -1,11 +1,22 @@
-import json
+import os
+import sys
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from common.context_window import ContextWindow
+from common.request_scheduler import create_openai_client
+from common.step_protocol import StepBatcher, batch_steps_prompt
 
 load_dotenv()
 
-client = OpenAI()
+client = create_openai_client()
+
+# let the model send all its steps in a single response instead of one per call
+BATCH_STEPS = os.getenv("BATCH_STEPS", "true").lower() == "true"
 
 # chain of thought prompting
 system_prompt = """
@@ -38,26 +49,47 @@ Output: {{ step:"output", content:"The answer to 2 + 2 is 4."}}
 Output: {{ step:"validate", content:"Seems like 4 is correct answer for 2 + 2."}}
 Output: {{ step:"result", content:"2 + 2 = 4 and that is calculated by adding 2 and 2."}}
 """
+if BATCH_STEPS:
+    # no tools here, every step up to the result can be sent at once
+    system_prompt += batch_steps_prompt(
+        example=[
+            {"step": "analyse", "content": "..."},
+            {"step": "think", "content": "..."},
+            {"step": "result", "content": "..."},
+        ],
+        tool_step=None,
+        final_step="result",
+    )
+step_batcher = StepBatcher(stop_steps=["result"])
 
-messages = [
-    {"role": "system", "content": system_prompt},
-]
+# keep the prompt under the token budget however many steps the model takes
+messages = ContextWindow(model="gpt-4o-mini", max_tokens=8000)
+messages.append({"role": "system", "content": system_prompt})
 
 query = input("> ")
 messages.append({"role": "user", "content": query})
 
 while True:
     response = client.chat.completions.create(
-        model="gpt-4o-mini", response_format={"type": "json_object"}, messages=messages
+        model="gpt-4o-mini",
+        response_format={"type": "json_object"},
+        messages=messages.window(),
     )
+    if messages.last_saved_tokens:
+        print(f"✂️ {messages.report()}")
 
-    response_json = json.loads(response.choices[0].message.content)
+    content = response.choices[0].message.content
+    steps = step_batcher.steps(content)
+    for step in steps:
+        if step.get("step") == "result":
+            break
+        print(f"🤖: {step.get('content')}")
 
-    if response_json.get("step") == "result":
-        print(f"👤: {response_json.get('content')}")
+    if steps and steps[-1].get("step") == "result":
+        print(f"👤: {steps[-1].get('content')}")
         break
 
-    print(f"🤖: {response_json.get('content')}")
-    messages.append(
-        {"role": "assistant", "content": response.choices[0].message.content}
-    )
+    messages.append({"role": "assistant", "content": content})
+
+if BATCH_STEPS:
+    print(f"⚡ step batching: {step_batcher.report()}")
@@ -1,23 +1,49 @@
 import json
 import os
+import sys
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from common.context_window import ContextWindow
+from common.llm_gateway import LLMGateway
+from common.request_scheduler import create_openai_client
+from common.step_protocol import StepBatcher, batch_steps_prompt
+from common.weather_client import fetch_weather
 
 load_dotenv()
 
-client = OpenAI()
+client = create_openai_client()
+
+# let the model send all its steps up to the next tool call in a single response
+BATCH_STEPS = os.getenv("BATCH_STEPS", "true").lower() == "true"
+
+# route through the gateway, over every configured provider, instead of OpenAI only
+LLM_GATEWAY = os.getenv("LLM_GATEWAY", "false").lower() == "true"
+gateway = LLMGateway.from_env() if LLM_GATEWAY else None
+
+
+def complete(messages: list) -> str:
+    if gateway:
+        return gateway.chat(messages, tier="standard", json_mode=True).content
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        response_format={"type": "json_object"},
+        messages=messages,
+    )
+    return response.choices[0].message.content
 
 
 def get_weather(city: str) -> str:
     print(f"🤖 Tool: Getting weather for {city}")
-    url = f"https://wttr.in/{city}?format=%C+%t"
-    response = requests.get(url)
-    if response.status_code != 200:
+    weather = fetch_weather(city)
+    if weather is None:
         return "Sorry, I couldn't get the weather information for that city."
 
-    return f"The weather in {city} is {response.text}."
+    return f"The weather in {city} is {weather}."
 
 
 def execute_command(command: str) -> str:
@@ -83,61 +109,87 @@ Output: {{ "step": "action", "function": "get_weather", "input": "Tokyo" }}
 Output: {{ "step": "observe", "output": "12 degrees Celsius" }}
 Output: {{ "step": "output", "content": "The weather in Tokyo is sunny with a temperature of 12 degrees Celsius." }}
 """
+if BATCH_STEPS:
+    system_prompt += batch_steps_prompt()
+step_batcher = StepBatcher(stop_steps=["action", "output"])
+
 
-messages = [
-    {"role": "system", "content": system_prompt},
-]
+def new_session() -> ContextWindow:
+    # keep the prompt under the token budget however long the session gets
+    messages = ContextWindow(model="gpt-4o-mini", max_tokens=8000)
+    messages.append({"role": "system", "content": system_prompt})
+    return messages
 
-while True:
-    query = input("> ")
+
+def run_turn(messages: ContextWindow, query: str) -> str:
+    """Answer a user query, calling the tools the model asks for on the way."""
     messages.append({"role": "user", "content": query})
 
     while True:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            response_format={"type": "json_object"},
-            messages=messages,
-        )
-
-        response_json = json.loads(response.choices[0].message.content)
-        messages.append(
-            {"role": "assistant", "content": response.choices[0].message.content}
-        )
-
-        if response_json.get("step") == "plan":
-            print(f"🤖: {response_json.get('content')}")
-            continue
-
-        if response_json.get("step") == "output":
-            print(f"👤: {response_json.get('content')}")
-            break
-
-        if response_json.get("step") == "action":
-            function_name = response_json.get("function")
-            if function_name not in tools:
-                messages.append(
-                    {
-                        "role": "system",
-                        "content": f"👤: {function_name} is not a valid function",
-                    }
-                )
+        content = complete(messages.window())
+        if messages.last_saved_tokens:
+            print(f"✂️ {messages.report()}")
+
+        steps = step_batcher.steps(content)
+        if BATCH_STEPS:
+            # keep only the steps acted on, not guesses made past an action
+            content = json.dumps({"steps": steps})
+        messages.append({"role": "assistant", "content": content})
+
+        for step in steps:
+            if step.get("step") == "plan":
+                print(f"🤖: {step.get('content')}")
                 continue
 
-            tool_fn = tools[function_name]["fn"]
-            tool_input = response_json.get("input")
-            if tool_input is None:
+            if step.get("step") == "output":
+                print(f"👤: {step.get('content')}")
+                return step.get("content")
+
+            if step.get("step") == "action":
+                # an action always ends the steps, its result needs another call
+                function_name = step.get("function")
+                if function_name not in tools:
+                    messages.append(
+                        {
+                            "role": "system",
+                            "content": f"👤: {function_name} is not a valid function",
+                        }
+                    )
+                    break
+
+                tool_fn = tools[function_name]["fn"]
+                tool_input = step.get("input")
+                if tool_input is None:
+                    messages.append(
+                        {
+                            "role": "system",
+                            "content": f"👤: {function_name} is missing input",
+                        }
+                    )
+                    break
+
+                tool_response = tool_fn(tool_input)
                 messages.append(
                     {
-                        "role": "system",
-                        "content": f"👤: {function_name} is missing input",
+                        "role": "assistant",
+                        "content": json.dumps(
+                            {"step": "observe", "output": tool_response}
+                        ),
                     }
                 )
-                continue
 
-            tool_response = tool_fn(tool_input)
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": json.dumps({"step": "observe", "output": tool_response}),
-                }
-            )
+
+def main():
+    messages = new_session()
+    while True:
+        run_turn(messages, input("> "))
+
+        if BATCH_STEPS:
+            print(f"⚡ step batching: {step_batcher.report()}")
+        if gateway:
+            for line in gateway.report():
+                print(f"📊 {line}")
+
+
+if __name__ == "__main__":
+    main()
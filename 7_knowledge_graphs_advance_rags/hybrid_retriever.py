@@ -0,0 +1,272 @@
+import math
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from common.tokenizer import count_tokens_or_estimate
+
+from memory_retriever import MemoryRetriever
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class IncrementalBM25(BM25Okapi):
+    """BM25Okapi over a corpus that changes one document at a time.
+
+    rank_bm25 builds its statistics once from a fixed corpus. Here documents
+    are added, replaced and removed by id, the per-document term frequencies
+    and document counts are updated in place and only the idf table is
+    recomputed, instead of re-reading the whole corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = 0
+        self.avgdl = 0
+        self.doc_freqs: List[Dict[str, int]] = []
+        self.doc_len: List[int] = []
+        self.idf: Dict[str, float] = {}
+        self.tokenizer = None
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.nd: Dict[str, int] = {}
+        self._total_len = 0
+
+    def _refresh(self):
+        self.corpus_size = len(self.ids)
+        self.avgdl = self._total_len / self.corpus_size if self.corpus_size else 0
+        self.idf = {}
+        if self.nd:
+            self._calc_idf(self.nd)
+
+    def _calc_idf(self, nd: Dict[str, int]):
+        # Lucene's idf, which stays positive, the Okapi one goes negative on the
+        # tiny corpora most users have and would hide every match
+        for word, freq in nd.items():
+            self.idf[word] = math.log(
+                1 + (self.corpus_size - freq + 0.5) / (freq + 0.5)
+            )
+
+    def add(self, id: str, tokens: List[str]):
+        self._add(id, tokens)
+        self._refresh()
+
+    def add_many(self, documents: Iterable[Tuple[str, List[str]]]):
+        """Add (id, tokens) documents, recomputing the idf table once at the end."""
+        for id, tokens in documents:
+            self._add(id, tokens)
+        self._refresh()
+
+    def _add(self, id: str, tokens: List[str]):
+        if id in self.positions:
+            self._remove(id)
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token in frequencies:
+            self.nd[token] = self.nd.get(token, 0) + 1
+        self.positions[id] = len(self.ids)
+        self.ids.append(id)
+        self.doc_freqs.append(frequencies)
+        self.doc_len.append(len(tokens))
+        self._total_len += len(tokens)
+
+    def _remove(self, id: str):
+        position = self.positions.pop(id)
+        for token in self.doc_freqs[position]:
+            self.nd[token] -= 1
+            if not self.nd[token]:
+                del self.nd[token]
+        self._total_len -= self.doc_len[position]
+        # move the last document into the hole so the lists stay dense
+        last = len(self.ids) - 1
+        if position != last:
+            self.ids[position] = self.ids[last]
+            self.doc_freqs[position] = self.doc_freqs[last]
+            self.doc_len[position] = self.doc_len[last]
+            self.positions[self.ids[position]] = position
+        self.ids.pop()
+        self.doc_freqs.pop()
+        self.doc_len.pop()
+
+    def remove(self, id: str):
+        if id in self.positions:
+            self._remove(id)
+            self._refresh()
+
+    def search(self, tokens: List[str], limit: int) -> List[tuple]:
+        """Return (id, score) of the best matching documents, best first."""
+        if not self.corpus_size or not tokens:
+            return []
+        scores = self.get_scores(tokens)
+        top = np.argsort(-scores)[:limit]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+class HybridRetriever:
+    """Fuses BM25 keyword matches with the vector and graph search of a MemoryRetriever.
+
+    A BM25 index of every user's memories is kept in process and updated from
+    the results of memory.add. The keyword and vector rankings are combined
+    with reciprocal rank fusion, and memories are added to the context best
+    first until `token_budget` is used up, instead of injecting every hit.
+
+    When the best keyword match already contains `keyword_coverage` of the
+    query terms, the query is answered without embedding it, only the graph
+    store is searched alongside BM25.
+
+    Args:
+        retriever: The MemoryRetriever doing the vector and graph search
+        token_budget: Maximum tokens of memories and relations added to the prompt
+        keyword_coverage: Share of query terms the best BM25 hit must contain to skip the vector search
+        rrf_k: Reciprocal rank fusion constant, higher values flatten the ranks
+        model: The model the context is sent to, used to count tokens
+    """
+
+    def __init__(
+        self,
+        retriever: MemoryRetriever,
+        token_budget: int = 500,
+        keyword_coverage: float = 1.0,
+        rrf_k: int = 60,
+        model: str = "gpt-4o-mini",
+    ):
+        self.retriever = retriever
+        self.memory = retriever.memory
+        self.token_budget = token_budget
+        self.keyword_coverage = keyword_coverage
+        self.rrf_k = rrf_k
+        self.model = model
+        self.indexes: Dict[str, IncrementalBM25] = {}
+        self.texts: Dict[str, str] = {}
+        self.stats = {"searches": 0, "vector_skipped": 0, "tokens": 0}
+        # user_id -> results of the writes observed while its index is being seeded
+        self._seeding: Dict[str, List[List[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, user_id: str) -> IncrementalBM25:
+        with self._lock:
+            index = self.indexes.get(user_id)
+            if index is not None:
+                return index
+            missed: List[Dict] = []
+            self._seeding.setdefault(user_id, []).append(missed)
+
+        # seed from the store once, later writes come in through observe(). The
+        # lock is not held here, so get_all does not hold up other users, and
+        # the index is only published once it is complete
+        try:
+            memories = self.memory.get_all(user_id=user_id, limit=100000)["results"]
+            seeded = IncrementalBM25()
+            seeded.add_many(
+                (memory["id"], tokenize(memory["memory"])) for memory in memories
+            )
+        except BaseException:
+            with self._lock:
+                self._stop_seeding(user_id, missed)
+            raise
+
+        with self._lock:
+            self._stop_seeding(user_id, missed)
+            # another thread may have seeded the same user meanwhile
+            index = self.indexes.setdefault(user_id, seeded)
+            if index is seeded:
+                for memory in memories:
+                    self.texts[memory["id"]] = memory["memory"]
+                # get_all may have run before these writes were applied
+                for result in missed:
+                    self._apply(index, result)
+        return index
+
+    def _stop_seeding(self, user_id: str, missed: List[Dict]):
+        # by identity, the buffers of two seeders may well be equal
+        seeders = [buffer for buffer in self._seeding[user_id] if buffer is not missed]
+        if seeders:
+            self._seeding[user_id] = seeders
+        else:
+            del self._seeding[user_id]
+
+    def _apply(self, index: IncrementalBM25, result: Dict):
+        for memory in result.get("results", []):
+            if memory["event"] == "DELETE":
+                index.remove(memory["id"])
+                self.texts.pop(memory["id"], None)
+            elif memory["event"] in ("ADD", "UPDATE"):
+                self.texts[memory["id"]] = memory["memory"]
+                index.add(memory["id"], tokenize(memory["memory"]))
+
+    def observe(self, kwargs: Dict, result: Dict):
+        """Apply the memories added, updated or deleted by a memory.add call."""
+        user_id = kwargs.get("user_id")
+        with self._lock:
+            for missed in self._seeding.get(user_id, []):
+                missed.append(result)
+            if user_id in self.indexes:
+                self._apply(self.indexes[user_id], result)
+
+    def _fuse(self, rankings: List[List[str]]) -> List[str]:
+        scores: Dict[str, float] = {}
+        for ranking in rankings:
+            for rank, id in enumerate(ranking):
+                scores[id] = scores.get(id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def context(self, query: str, user_id: str, limit: int = 20) -> str:
+        """Return the related memories and relations that fit in the token budget, best first."""
+        tokens = tokenize(query)
+        index = self._index(user_id)
+        with self._lock:
+            keyword_hits = index.search(tokens, limit)
+            best_terms = (
+                set(index.doc_freqs[index.positions[keyword_hits[0][0]]])
+                if keyword_hits
+                else set()
+            )
+
+        query_terms = set(tokens)
+        use_vector = not query_terms or (
+            len(query_terms & best_terms) / len(query_terms) < self.keyword_coverage
+        )
+        found = self.retriever.search(query, user_id, limit, use_vector=use_vector)
+
+        for memory in found["results"]:
+            self.texts.setdefault(memory["id"], memory["memory"])
+        ranked = self._fuse(
+            [
+                [id for id, _ in keyword_hits],
+                [memory["id"] for memory in found["results"]],
+            ]
+        )
+        lines = [self.texts[id] for id in ranked if id in self.texts]
+        lines += [
+            f"{relation['source']} -- {relation['relationship']} -- {relation['destination']}"
+            for relation in found["relations"]
+        ]
+
+        selected = []
+        used = 0
+        for line in lines:
+            cost = count_tokens_or_estimate(line, self.model) + 1
+            if used + cost > self.token_budget:
+                break
+            selected.append(line)
+            used += cost
+
+        self.stats["searches"] += 1
+        self.stats["vector_skipped"] += not use_vector
+        self.stats["tokens"] += used
+        return "\n".join(selected)
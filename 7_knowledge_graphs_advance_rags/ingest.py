@@ -0,0 +1,410 @@
+"""Bulk load PDFs and chat logs into the mem0 vector and graph stores.
+
+Documents flow through a pipeline of threads, one per stage:
+    load -> chunk -> embed -> upsert -> graph
+Stages are connected by bounded queues, so a slow stage holds the ones before
+it back and memory stays flat however large the corpus is. Every finished
+file is appended to a progress file, and files already listed there are
+skipped when the command is run again. Chunk ids are derived from the file,
+the chunk's position and its text, so a file that was cut off half way is
+upserted over its earlier chunks instead of next to them. Every OpenAI call
+of the pipeline is made at batch priority, so it yields to the chat.
+
+Run from the 7_knowledge_graphs_advance_rags directory:
+    python ingest.py docs/ chats/ --user-id userId123
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import pytz
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from common.request_scheduler import request_context
+
+# Pushed through the pipeline after the last document
+END = object()
+
+PDF_SUFFIXES = {".pdf"}
+CHAT_SUFFIXES = {".jsonl"}
+TEXT_SUFFIXES = {".txt", ".md"}
+
+# Namespace of the uuid5 chunk ids
+CHUNK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "ingest.chunk")
+
+
+@dataclass
+class Document:
+    source: str
+    text: str
+
+
+@dataclass
+class Chunk:
+    source: str
+    # position of the chunk in its file
+    index: int
+    text: str
+    embedding: Optional[List[float]] = None
+
+
+def chunk_id(user_id: str, chunk: Chunk) -> str:
+    """The same id on every run for the same chunk of a file, so writes are idempotent."""
+    digest = hashlib.sha256(chunk.text.encode()).hexdigest()
+    return str(
+        uuid.uuid5(CHUNK_NAMESPACE, f"{user_id}:{chunk.source}:{chunk.index}:{digest}")
+    )
+
+
+@dataclass
+class SourceDone:
+    """Follows the last chunk of a file, the file is complete once it reaches the end."""
+
+    source: str
+    key: Dict
+
+
+def source_key(path: Path) -> Dict:
+    stat = path.stat()
+    return {"source": str(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def read_progress(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def find_files(paths: List[str]) -> Iterator[Path]:
+    suffixes = PDF_SUFFIXES | CHAT_SUFFIXES | TEXT_SUFFIXES
+    for path in map(Path, paths):
+        files = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for file in files:
+            if file.is_file() and file.suffix.lower() in suffixes:
+                yield file
+
+
+def read_chat_log(path: Path) -> Iterator[str]:
+    """Yield one transcript per line, a line is a message or {"messages": [...]}."""
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            messages = record.get("messages", [record])
+            yield "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+
+
+def load_documents(paths: List[str], done: List[Dict]) -> Iterator[object]:
+    """Yield the documents of every file not ingested yet, each file followed by SourceDone."""
+    completed = {json.dumps(key, sort_keys=True) for key in done}
+    for path in find_files(paths):
+        key = source_key(path)
+        if json.dumps(key, sort_keys=True) in completed:
+            continue
+        suffix = path.suffix.lower()
+        if suffix in PDF_SUFFIXES:
+            for page in PdfReader(path).pages:
+                yield Document(str(path), page.extract_text() or "")
+        elif suffix in CHAT_SUFFIXES:
+            for transcript in read_chat_log(path):
+                yield Document(str(path), transcript)
+        else:
+            yield Document(str(path), path.read_text(errors="ignore"))
+        yield SourceDone(str(path), key)
+
+
+class Stage(threading.Thread):
+    """A pipeline stage reading from `inbox` and writing to `outbox`.
+
+    `handle` processes one item and returns what to pass on, `flush` returns
+    whatever a batching stage still holds. Markers are passed on after a
+    flush, so they stay behind every chunk of their file, and `done` is
+    called with each SourceDone the stage sees. `items` and `busy`
+    give the throughput of the stage, time spent waiting on the queues is
+    not counted.
+    """
+
+    def __init__(self, name: str, inbox: queue.Queue, outbox: Optional[queue.Queue]):
+        super().__init__(name=name, daemon=True)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.items = 0
+        self.busy = 0.0
+        self.error: Optional[BaseException] = None
+
+    def handle(self, item) -> List:
+        raise NotImplementedError
+
+    def flush(self) -> List:
+        return []
+
+    def done(self, marker: SourceDone):
+        pass
+
+    def run(self):
+        while True:
+            item = self.inbox.get()
+            start = time.perf_counter()
+            outputs = []
+            try:
+                if self.error is not None:
+                    # keep draining so the stages before this one never block
+                    outputs = [item] if item is END else []
+                elif item is END:
+                    outputs = self.flush() + [item]
+                elif isinstance(item, SourceDone):
+                    outputs = self.flush() + [item]
+                    self.done(item)
+                else:
+                    outputs = self.handle(item)
+            except Exception as e:
+                print(f"⚠️ {self.name} failed: {e}")
+                self.error = e
+                outputs = [item] if item is END else []
+            self.busy += time.perf_counter() - start
+            for output in outputs:
+                if self.outbox is not None:
+                    self.outbox.put(output)
+            if item is END:
+                return
+
+    def throughput(self) -> float:
+        return self.items / self.busy if self.busy else 0.0
+
+
+class ChunkStage(Stage):
+    def __init__(self, inbox, outbox, chunk_size: int, chunk_overlap: int):
+        super().__init__("chunk", inbox, outbox)
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        # chunks of a file are numbered across its documents, files come one by one
+        self.source: Optional[str] = None
+        self.next_index = 0
+
+    def handle(self, document: Document) -> List:
+        self.items += 1
+        if document.source != self.source:
+            self.source, self.next_index = document.source, 0
+        chunks = []
+        for text in self.splitter.split_text(document.text):
+            if text.strip():
+                chunks.append(Chunk(document.source, self.next_index, text))
+                self.next_index += 1
+        return chunks
+
+
+class EmbedStage(Stage):
+    """Embeds chunks `batch_size` at a time through the embedding service.
+
+    The service splits a batch into concurrent requests and skips the chunks
+    it has embedded before, so re-ingesting a file costs no embedding calls.
+    """
+
+    def __init__(self, inbox, outbox, embedding_service, batch_size: int):
+        super().__init__("embed", inbox, outbox)
+        self.embedding_service = embedding_service
+        self.batch_size = batch_size
+        self.batch: List[Chunk] = []
+
+    def handle(self, chunk: Chunk) -> List:
+        self.batch.append(chunk)
+        return self.flush() if len(self.batch) >= self.batch_size else []
+
+    def flush(self) -> List:
+        if not self.batch:
+            return []
+        batch, self.batch = self.batch, []
+        vectors = self.embedding_service.embed_many(
+            chunk.text.replace("\n", " ") for chunk in batch
+        )
+        for chunk, vector in zip(batch, vectors):
+            chunk.embedding = vector.tolist()
+        self.items += len(batch)
+        return [batch]
+
+
+class UpsertStage(Stage):
+    """Writes each embedded batch to the vector store with a single insert."""
+
+    def __init__(self, inbox, outbox, memory, user_id: str):
+        super().__init__("upsert", inbox, outbox)
+        self.vector_store = memory.vector_store
+        self.user_id = user_id
+
+    def handle(self, batch: List[Chunk]) -> List:
+        created_at = datetime.now(pytz.timezone("US/Pacific")).isoformat()
+        # the same payload fields mem0 writes, so search and get_all see these memories
+        payloads = [
+            {
+                "user_id": self.user_id,
+                "data": chunk.text,
+                "hash": hashlib.md5(chunk.text.encode()).hexdigest(),
+                "created_at": created_at,
+                "source": chunk.source,
+            }
+            for chunk in batch
+        ]
+        self.vector_store.insert(
+            vectors=[chunk.embedding for chunk in batch],
+            ids=[chunk_id(self.user_id, chunk) for chunk in batch],
+            payloads=payloads,
+        )
+        self.items += len(batch)
+        return batch
+
+
+class GraphStage(Stage):
+    """Adds chunks to the graph store `batch_size` at a time and records finished files.
+
+    mem0 extracts entities and relations with an LLM call per graph.add, so
+    several chunks are joined into one call. Its calls are made at batch
+    priority, the graph's client is the interactive one the chat searches with.
+    """
+
+    def __init__(self, inbox, memory, user_id: str, batch_size: int, progress: str):
+        super().__init__("graph", inbox, None)
+        self.graph = memory.graph if memory.enable_graph else None
+        self.filters = {"user_id": user_id}
+        self.batch_size = batch_size
+        self.progress = progress
+        self.batch: List[Chunk] = []
+        self.completed = 0
+
+    def handle(self, chunk: Chunk) -> List:
+        if self.graph is None:
+            self.items += 1
+            return []
+        self.batch.append(chunk)
+        return self.flush() if len(self.batch) >= self.batch_size else []
+
+    def flush(self) -> List:
+        if self.batch:
+            batch, self.batch = self.batch, []
+            with request_context(priority="batch"):
+                self.graph.add("\n\n".join(chunk.text for chunk in batch), self.filters)
+            self.items += len(batch)
+        return []
+
+    def done(self, marker: SourceDone):
+        with open(self.progress, "a") as f:
+            f.write(json.dumps(marker.key) + "\n")
+        self.completed += 1
+
+
+def ingest(
+    memory,
+    embedding_service,
+    paths: List[str],
+    user_id: str,
+    progress: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 100,
+    embed_batch_size: int = 512,
+    graph_batch_size: int = 8,
+    queue_size: int = 256,
+):
+    done = read_progress(progress)
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(4)]
+    graph_stage = GraphStage(queues[3], memory, user_id, graph_batch_size, progress)
+    stages = [
+        ChunkStage(queues[0], queues[1], chunk_size, chunk_overlap),
+        EmbedStage(queues[1], queues[2], embedding_service, embed_batch_size),
+        UpsertStage(queues[2], queues[3], memory, user_id),
+        graph_stage,
+    ]
+    for stage in stages:
+        stage.start()
+
+    loaded = 0
+    load_seconds = 0.0
+    start = time.perf_counter()
+    documents = load_documents(paths, done)
+    try:
+        while True:
+            load_start = time.perf_counter()
+            item = next(documents, END)
+            load_seconds += time.perf_counter() - load_start
+            if item is END:
+                break
+            # blocks while the chunker is behind
+            queues[0].put(item)
+            loaded += isinstance(item, Document)
+    finally:
+        queues[0].put(END)
+    for stage in stages:
+        stage.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"{'stage':<8}{'items':>10}{'busy s':>10}{'items/s':>12}")
+    print(
+        f"{'load':<8}{loaded:>10}{load_seconds:>10.2f}{loaded / (load_seconds or 1):>12.1f}"
+    )
+    for stage in stages:
+        print(
+            f"{stage.name:<8}{stage.items:>10}{stage.busy:>10.2f}{stage.throughput():>12.1f}"
+        )
+    print(
+        f"{graph_stage.completed} files ingested in {elapsed:.1f}s, "
+        f"{len(done)} skipped as already done"
+    )
+    failed = [stage for stage in stages if stage.error is not None]
+    if failed:
+        raise SystemExit(f"stopped after errors in {', '.join(s.name for s in failed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--user-id", default="userId123")
+    parser.add_argument(
+        "--progress",
+        default=str(
+            Path(__file__).resolve().parent / ".cache" / "ingest_progress.jsonl"
+        ),
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--embed-batch-size", type=int, default=512)
+    parser.add_argument("--graph-batch-size", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=256)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.progress)), exist_ok=True)
+
+    from memory import create_embedding_service, get_memory
+
+    ingest(
+        get_memory(),
+        # not the shared service, which embeds at interactive priority for the chat
+        create_embedding_service(priority="batch"),
+        args.paths,
+        args.user_id,
+        args.progress,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        embed_batch_size=args.embed_batch_size,
+        graph_batch_size=args.graph_batch_size,
+        queue_size=args.queue_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
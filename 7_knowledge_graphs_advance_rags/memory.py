@@ -1,8 +1,18 @@
 import os
+import sys
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from dotenv import load_dotenv
-from mem0 import Memory
-from openai import OpenAI
+
+from common.embeddings import EmbeddingService
+from common.lazy import once, warm_up
+from common.request_scheduler import create_openai_client
+from hybrid_retriever import HybridRetriever
+from memory_retriever import MemoryRetriever
+from memory_writer import MemoryWriter
 
 load_dotenv()
 
@@ -12,12 +22,31 @@ QDRANT_PORT = 6333
 NEO4J_URL = "bolt://localhost:7687"
 NEO4J_USERNAME = "neo4j"
 NEO4J_PASSWORD = "password"
+# seconds each store may take before the turn goes on without its results
+VECTOR_SEARCH_DEADLINE = float(os.getenv("VECTOR_SEARCH_DEADLINE", "1.0"))
+GRAPH_SEARCH_DEADLINE = float(os.getenv("GRAPH_SEARCH_DEADLINE", "1.5"))
+# tokens of related memories added to the system prompt
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "500"))
+# "qdrant" or "numpy_mmap", the in-process store that needs no server
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant")
+# how numpy_mmap stores vectors: float32, float16 (half the memory) or int8 (a quarter)
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMS = 1536
+
+vector_store_configs = {
+    "qdrant": {"host": QDRANT_HOST, "port": QDRANT_PORT},
+    "numpy_mmap": {
+        "path": str(Path(__file__).resolve().parent / ".cache" / "vector_store"),
+        "dtype": VECTOR_STORE_DTYPE,
+    },
+}
 
 config = {
     "version": "v1.1",
     "vector_store": {
-        "provider": "qdrant",
-        "config": {"host": QDRANT_HOST, "port": QDRANT_PORT},
+        "provider": VECTOR_STORE,
+        "config": vector_store_configs[VECTOR_STORE],
     },
     "llm": {
         "provider": "openai",
@@ -25,7 +54,11 @@ config = {
     },
     "embedder": {
         "provider": "openai",
-        "config": {"api_key": OPENAI_API_KEY, "model": "text-embedding-3-small"},
+        "config": {
+            "api_key": OPENAI_API_KEY,
+            "model": EMBEDDING_MODEL,
+            "embedding_dims": EMBEDDING_DIMS,
+        },
     },
     "graph_store": {
         "provider": "neo4j",
@@ -37,15 +70,84 @@ config = {
     },
 }
 
-memory = Memory.from_config(config)
+# Everything below is built once, on first use: mem0 and the OpenAI stack take
+# seconds to import and the stores are connected when the Memory is built.
+
+
+def create_embedding_service(priority: str = "interactive") -> EmbeddingService:
+    # texts seen before are served from the disk cache, whatever the priority
+    return EmbeddingService(
+        create_openai_client(priority=priority, api_key=OPENAI_API_KEY),
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMS,
+        cache_path=str(
+            Path(__file__).resolve().parent / ".cache" / "embeddings.sqlite"
+        ),
+    )
+
+
+@once
+def get_embedding_service() -> EmbeddingService:
+    # embed through the shared service, the chat waits on these embeddings
+    return create_embedding_service()
+
+
+def embed(text, memory_action=None):
+    return get_embedding_service().embed(text.replace("\n", " "))
+
+
+@once
+def get_memory():
+    """The mem0 Memory, with every OpenAI call going through the shared scheduler."""
+    from mem0 import Memory
+
+    from vector_store import register_vector_store
+
+    register_vector_store()
+    memory = Memory.from_config(config)
+
+    # the fact extraction of memory writes runs in the background, so it yields to the chat
+    memory.llm.client = create_openai_client(priority="batch", api_key=OPENAI_API_KEY)
+    if memory.enable_graph:
+        # the graph also extracts entities when searching, so it stays interactive
+        memory.graph.llm.client = create_openai_client(api_key=OPENAI_API_KEY)
+
+    memory.embedding_model.embed = embed
+    if memory.enable_graph:
+        memory.graph.embedding_model.embed = embed
+    return memory
+
+
+@once
+def get_memory_retriever() -> MemoryRetriever:
+    # search the vector and graph stores concurrently, each within its own deadline
+    return MemoryRetriever(
+        get_memory(),
+        vector_deadline=VECTOR_SEARCH_DEADLINE,
+        graph_deadline=GRAPH_SEARCH_DEADLINE,
+    )
+
+
+@once
+def get_hybrid_retriever() -> HybridRetriever:
+    # rank keyword and vector matches together, within a token budget
+    return HybridRetriever(get_memory_retriever(), token_budget=MEMORY_TOKEN_BUDGET)
+
+
+@once
+def get_memory_writer() -> MemoryWriter:
+    # store new memories in the background so the reply is not held up by the write
+    return MemoryWriter(get_memory(), on_write=get_hybrid_retriever().observe)
+
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+@once
+def get_openai_client():
+    return create_openai_client(api_key=OPENAI_API_KEY)
 
 
 def chat(message):
-    related_memories = memory.search(query=message, user_id="userId123")
-    related_memories_str = "\n".join(
-        [memory["memory"] for memory in related_memories.get("results")]
+    related_memories_str = get_hybrid_retriever().context(
+        query=message, user_id="userId123"
     )
 
     system_prompt = f"""
@@ -64,7 +166,7 @@ def chat(message):
         {"role": "user", "content": message},
     ]
 
-    response = openai_client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model="gpt-4o-mini",
         messages=messages,
     )
@@ -73,12 +175,21 @@ def chat(message):
 
     messages.append({"role": "assistant", "content": response_content})
 
-    memory.add(messages=messages, user_id="userId123")
+    get_memory_writer().add(messages=messages, user_id="userId123")
 
     return response_content
 
 
-while True:
-    message = input(">> ")
-    response = chat(message)
-    print(f"🤖: {response}")
+if __name__ == "__main__":
+    # connect the stores while the user types the first message
+    warm_up(get_memory_writer, get_openai_client)
+    try:
+        while True:
+            message = input(">> ")
+            response = chat(message)
+            print(f"🤖: {response}")
+            print(f"🔎 memory search: {get_memory_retriever().report()}")
+            print(f"🧩 hybrid retrieval: {get_hybrid_retriever().stats}")
+    except (KeyboardInterrupt, EOFError):
+        print("\n💾 saving the remaining memories...")
+        get_memory_writer().close()
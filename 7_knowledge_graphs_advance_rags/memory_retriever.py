@@ -0,0 +1,128 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+
+class MemoryRetriever:
+    """Searches the vector store and the graph store of a mem0 Memory concurrently.
+
+    `memory.search` waits for both stores before it returns, so a slow graph
+    traversal holds up the whole turn. Here both lookups start at the same
+    time on a shared pool and each one gets its own deadline, counted from the
+    start of the search. A backend that misses its deadline is left to finish
+    in the background and its results are dropped for this turn, the turn
+    goes on with whatever has arrived.
+
+    Args:
+        memory: The mem0 Memory to search
+        vector_deadline: Seconds the vector store lookup may take
+        graph_deadline: Seconds the graph store traversal may take
+        max_workers: Threads shared by all lookups
+    """
+
+    def __init__(
+        self,
+        memory,
+        vector_deadline: float = 1.0,
+        graph_deadline: float = 1.5,
+        max_workers: int = 8,
+    ):
+        self.memory = memory
+        self.deadlines = {"vector": vector_deadline, "graph": graph_deadline}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="memory-search"
+        )
+        self.latencies: Dict[str, Optional[float]] = {}
+        self.timeouts = {"vector": 0, "graph": 0}
+
+    @staticmethod
+    def _timed(
+        latencies: Dict[str, Optional[float]], backend: str, search: Callable[[], Any]
+    ) -> Callable[[], Any]:
+        def run():
+            start = time.perf_counter()
+            try:
+                return search()
+            finally:
+                # recorded for its own turn, even when the caller stopped waiting
+                latencies[backend] = time.perf_counter() - start
+
+        return run
+
+    def search(
+        self, query: str, user_id: str, limit: int = 100, use_vector: bool = True
+    ) -> Dict[str, List[Dict]]:
+        """Return the memories and relations found before their deadlines.
+
+        With use_vector=False the query is not embedded and only the graph
+        store is searched.
+        """
+        filters = {"user_id": user_id}
+        searches = {}
+        if use_vector:
+            searches["vector"] = lambda: self.memory._search_vector_store(
+                query, filters, limit
+            )
+        if self.memory.enable_graph:
+            searches["graph"] = lambda: self.memory.graph.search(query, filters, limit)
+
+        start = time.perf_counter()
+        latencies = self.latencies = {backend: None for backend in searches}
+        futures = {
+            backend: self.executor.submit(self._timed(latencies, backend, search))
+            for backend, search in searches.items()
+        }
+
+        found = {"vector": [], "graph": []}
+        for backend, future in futures.items():
+            remaining = self.deadlines[backend] - (time.perf_counter() - start)
+            try:
+                found[backend] = future.result(timeout=max(remaining, 0)) or []
+            except FutureTimeoutError:
+                self.timeouts[backend] += 1
+                print(
+                    f"⏱️ {backend} search missed its {self.deadlines[backend]}s deadline"
+                )
+            except Exception as e:
+                print(f"⚠️ {backend} search failed: {e}")
+
+        return {
+            "results": dedupe_memories(found["vector"]),
+            "relations": dedupe_relations(found["graph"]),
+        }
+
+    def report(self) -> str:
+        return ", ".join(
+            f"{backend} "
+            + ("timed out" if latency is None else f"{latency * 1000:.0f}ms")
+            for backend, latency in self.latencies.items()
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def dedupe_memories(memories: List[Dict]) -> List[Dict]:
+    """Keep the best scored memory per id and per text, in score order."""
+    seen_ids = set()
+    unique: Dict[str, Dict] = {}
+    for memory in sorted(memories, key=lambda m: m.get("score") or 0, reverse=True):
+        key = memory["memory"].strip().lower()
+        if memory.get("id") in seen_ids or key in unique:
+            continue
+        seen_ids.add(memory.get("id"))
+        unique[key] = memory
+    return list(unique.values())
+
+
+def dedupe_relations(relations: List[Dict]) -> List[Dict]:
+    """Drop repeated source, relationship, destination triples, keeping the first."""
+    seen = set()
+    unique = []
+    for relation in relations:
+        key = (relation["source"], relation["relationship"], relation["destination"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(relation)
+    return unique
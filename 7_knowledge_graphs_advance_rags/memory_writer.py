@@ -0,0 +1,170 @@
+import atexit
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Pushed once per worker to tell it to stop after the writes queued before it
+_STOP = object()
+
+# A queued write: the messages, and the keyword arguments for memory.add
+Write = Tuple[List[Dict[str, str]], Dict[str, Any]]
+
+# Roles taken from the later writes of a merged batch, their system prompts are dropped
+MERGED_ROLES = ("user", "assistant")
+
+
+class MemoryWriter:
+    """Write-behind queue in front of `memory.add`.
+
+    `add()` only queues the write and returns, the fact extraction, embedding
+    and store updates happen on background workers. Every user_id is always
+    handled by the same worker, so the writes of one user are applied in the
+    order they were queued. A worker picks up to `batch_size` queued writes at
+    a time and merges the writes of the same user among them into a single
+    `memory.add` call, made of the first write's messages and the user and
+    assistant messages of the ones after it.
+
+    Each worker queue holds at most `max_pending` writes, beyond that `add()`
+    blocks until there is room, so a slow store slows the producer down
+    instead of growing memory without bound. `close()` drains the queues
+    before returning and is registered to run at exit.
+
+    Args:
+        memory: The mem0 Memory the writes are applied to
+        workers: Number of background workers
+        batch_size: Maximum number of queued writes merged into one batch
+        max_pending: Maximum number of queued writes per worker
+        on_write: Optional callback given the arguments and result of every memory.add
+    """
+
+    def __init__(
+        self,
+        memory,
+        workers: int = 2,
+        batch_size: int = 8,
+        max_pending: int = 64,
+        on_write: Optional[Callable[[Dict[str, Any], Dict], None]] = None,
+    ):
+        self.memory = memory
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.queues = [queue.Queue(maxsize=max_pending) for _ in range(workers)]
+        self.threads = [
+            threading.Thread(
+                target=self._work, args=(q,), name=f"memory-writer-{i}", daemon=True
+            )
+            for i, q in enumerate(self.queues)
+        ]
+        self.stats = {
+            "queued": 0,
+            "batches": 0,
+            "calls": 0,
+            "failed": 0,
+            "callback_failed": 0,
+        }
+        self._lock = threading.Lock()
+        self._closed = False
+        for thread in self.threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def _queue_for(self, user_id: Optional[str]) -> queue.Queue:
+        # a stable hash, so a user keeps its worker for the lifetime of the writer
+        return self.queues[zlib.crc32(str(user_id).encode()) % len(self.queues)]
+
+    def add(
+        self,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """Queue a `memory.add(messages, **kwargs)` call.
+
+        Blocks while the worker queue is full, raises queue.Full if there is
+        still no room after `timeout` seconds.
+        """
+        if self._closed:
+            raise RuntimeError("MemoryWriter is closed")
+        self._queue_for(kwargs.get("user_id")).put(
+            (list(messages), kwargs), timeout=timeout
+        )
+        with self._lock:
+            self.stats["queued"] += 1
+
+    def _next_batch(self, q: queue.Queue) -> Tuple[List[Write], bool]:
+        """Wait for a write and take the ones queued behind it, up to batch_size."""
+        batch = []
+        item = q.get()
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _work(self, q: queue.Queue):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch(q)
+            if batch:
+                self._apply(batch)
+            for _ in range(len(batch) + stop):
+                q.task_done()
+
+    def _apply(self, batch: List[Write]):
+        # merge the writes with the same arguments (and so the same user), keeping their order
+        merged: List[Write] = []
+        for messages, kwargs in batch:
+            for merged_messages, merged_kwargs in merged:
+                if merged_kwargs == kwargs:
+                    # every turn carries its own system prompt, one is enough
+                    merged_messages.extend(
+                        m for m in messages if m.get("role") in MERGED_ROLES
+                    )
+                    break
+            else:
+                merged.append((list(messages), kwargs))
+
+        with self._lock:
+            self.stats["batches"] += 1
+        for messages, kwargs in merged:
+            try:
+                result = self.memory.add(messages=messages, **kwargs)
+                failed = 0
+            except Exception as e:
+                print(f"⚠️ memory write failed for {kwargs.get('user_id')}: {e}")
+                failed = 1
+            with self._lock:
+                self.stats["calls"] += 1
+                self.stats["failed"] += failed
+            if failed or self.on_write is None:
+                continue
+
+            # the write itself succeeded, a failing callback must not count against it
+            try:
+                self.on_write(kwargs, result)
+            except Exception as e:
+                print(
+                    f"⚠️ memory write callback failed for {kwargs.get('user_id')}: {e}"
+                )
+                with self._lock:
+                    self.stats["callback_failed"] += 1
+
+    def flush(self):
+        """Block until every write queued so far has been applied."""
+        for q in self.queues:
+            q.join()
+
+    def close(self):
+        """Stop accepting writes, apply the queued ones and stop the workers."""
+        if self._closed:
+            return
+        self._closed = True
+        for q in self.queues:
+            q.put(_STOP)
+        for thread in self.threads:
+            thread.join()
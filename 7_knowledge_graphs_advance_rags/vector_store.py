@@ -0,0 +1,450 @@
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from mem0.utils.factory import VectorStoreFactory
+from mem0.vector_stores.base import VectorStoreBase
+from mem0.vector_stores.configs import VectorStoreConfig
+from pydantic import BaseModel, Field
+
+from common.quantized_store import DTYPES, decode, encode, score_rows
+
+# Name the provider is registered under in the mem0 config
+PROVIDER = "numpy_mmap"
+
+# Rows allocated for a new partition, the file doubles whenever it fills up
+INITIAL_CAPACITY = 256
+
+
+class OutputData(BaseModel):
+    id: Optional[str]  # memory id
+    score: Optional[float]  # cosine similarity
+    payload: Optional[Dict]  # metadata
+
+
+class MmapVectorStoreConfig(BaseModel):
+    collection_name: str = Field("mem0", description="Default name for the collection")
+    path: Optional[str] = Field(None, description="Directory holding the collections")
+    embedding_model_dims: int = Field(
+        1536, description="Dimension of the embedding vector"
+    )
+    index_threshold: int = Field(
+        20000, description="Partition size from which searches go through the IVF index"
+    )
+    n_probe: int = Field(8, description="IVF lists scanned per search")
+    dtype: str = Field(
+        "float32",
+        description="Storage format of new partitions: float32, float16 or int8",
+    )
+
+    model_config = {"extra": "forbid"}
+
+
+def matches(payload: Dict, filters: Optional[Dict]) -> bool:
+    """Return whether a payload has every key/value of the filters, lists match any value."""
+    for key, value in (filters or {}).items():
+        if key not in payload:
+            return False
+        if isinstance(value, list):
+            if payload[key] not in value:
+                return False
+        elif payload[key] != value:
+            return False
+    return True
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class IVFIndex:
+    """Inverted file index: rows are bucketed by their nearest k-means centroid.
+
+    A search only scores the rows of the `n_probe` buckets whose centroids are
+    closest to the query, which trades a little recall for scanning a small
+    fraction of a large partition.
+    """
+
+    def __init__(self, data: np.ndarray, rows: np.ndarray, iterations: int = 10):
+        # data holds the float32 vectors of the rows, in the same order
+        n_lists = max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        sample = data[rng.choice(len(rows), size=n_lists, replace=False)]
+        self.centroids = np.array(sample, dtype=np.float32)
+
+        for _ in range(iterations):
+            assignments = np.argmax(data @ self.centroids.T, axis=1)
+            for i in range(n_lists):
+                members = data[assignments == i]
+                if len(members):
+                    self.centroids[i] = members.mean(axis=0)
+            self.centroids = normalize(self.centroids)
+
+        assignments = np.argmax(data @ self.centroids.T, axis=1)
+        self.lists: List[List[int]] = [
+            rows[assignments == i].tolist() for i in range(n_lists)
+        ]
+        self.built_size = len(rows)
+
+    def add(self, row: int, vector: np.ndarray):
+        self.lists[int(np.argmax(self.centroids @ vector))].append(row)
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        scores = self.centroids @ query
+        probes = np.argsort(-scores)[:n_probe]
+        return np.array([row for i in probes for row in self.lists[i]], dtype=np.int64)
+
+
+class Partition:
+    """The vectors and payloads of one user_id.
+
+    Vectors are normalized and kept in a memory-mapped .npy file next to a
+    pickle holding the ids and payloads. They are stored as float32, float16
+    or int8 with a float32 scale per row in a second file, the formats of
+    common.quantized_store. Deleted rows are only tombstoned, they are
+    skipped by searches but keep their slot in the file.
+    """
+
+    def __init__(self, directory: str, key: str, dims: int, dtype: str = "float32"):
+        slug = hashlib.sha1(key.encode()).hexdigest()[:16]
+        self.key = key
+        self.dims = dims
+        self.dtype = dtype
+        self.vectors_path = os.path.join(directory, f"{slug}.npy")
+        self.scales_path = os.path.join(directory, f"{slug}.scales.npy")
+        self.meta_path = os.path.join(directory, f"{slug}.pkl")
+        self.ids: List[Optional[str]] = []
+        self.payloads: Dict[str, Dict] = {}
+        self.rows: Dict[str, int] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.index: Optional[IVFIndex] = None
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "rb") as f:
+                _, self.ids, self.payloads = pickle.load(f)
+            self.rows = {id: row for row, id in enumerate(self.ids) if id is not None}
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            # a partition keeps the format it was created with
+            self.dtype = self.vectors.dtype.name
+            if self.dtype == "int8":
+                self.scales = np.load(self.scales_path, mmap_mode="r+")
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self.vectors is None else len(self.vectors)
+        if self.count + rows <= capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, 2 * capacity, self.count + rows)
+        self.vectors = self._grow(
+            self.vectors_path, self.vectors, (capacity, self.dims), self.dtype
+        )
+        if self.dtype == "int8":
+            self.scales = self._grow(
+                self.scales_path, self.scales, (capacity,), "float32"
+            )
+
+    def _grow(self, path: str, current, shape: tuple, dtype: str) -> np.ndarray:
+        tmp_path = f"{path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        if self.count:
+            grown[: self.count] = current[: self.count]
+        grown.flush()
+        del grown, current
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    def vector(self, id: str) -> np.ndarray:
+        return decode(self.vectors, self.scales, self.rows[id])
+
+    def save(self):
+        self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((self.key, self.ids, self.payloads), f)
+        # the pickle decides which rows are valid, so it is replaced last and in one step
+        os.replace(tmp_path, self.meta_path)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict]):
+        new_ids = [id for id in ids if id not in self.rows]
+        self._ensure_capacity(len(new_ids))
+        codes, scales = encode(vectors, self.dtype)
+        for i, (id, payload) in enumerate(zip(ids, payloads)):
+            row = self.rows.get(id)
+            if row is None:
+                row = self.rows[id] = self.count
+                self.ids.append(id)
+                if self.index is not None:
+                    self.index.add(row, vectors[i])
+            self.vectors[row] = codes[i]
+            if scales is not None:
+                self.scales[row] = scales[i]
+            self.payloads[id] = payload
+        self.save()
+
+    def remove(self, id: str):
+        row = self.rows.pop(id)
+        self.ids[row] = None
+        self.payloads.pop(id, None)
+        self.save()
+
+    def search(
+        self,
+        query: np.ndarray,
+        limit: int,
+        filters: Optional[Dict],
+        index_threshold: int,
+        n_probe: int,
+    ) -> List[OutputData]:
+        if not self.rows:
+            return []
+
+        live = len(self.rows)
+        if live >= index_threshold:
+            # rebuild once the partition has doubled, so the centroids follow the data
+            if self.index is None or live > 2 * self.index.built_size:
+                rows = np.array(list(self.rows.values()), dtype=np.int64)
+                self.index = IVFIndex(decode(self.vectors, self.scales, rows), rows)
+            rows = self.index.candidates(query, n_probe)
+            scores = score_rows(query, self.vectors, self.scales, rows)
+        else:
+            rows = np.arange(self.count)
+            scores = score_rows(query, self.vectors, self.scales, slice(0, self.count))
+
+        if not len(scores):
+            return []
+
+        # rank a few times more rows than needed, and widen only if filters reject too many
+        k = min(len(scores), max(4 * limit, 64))
+        while True:
+            top = np.argpartition(-scores, k - 1)[:k]
+            results = []
+            for i in top[np.argsort(-scores[top])]:
+                id = self.ids[rows[i]]
+                if id is None or not matches(self.payloads[id], filters):
+                    continue
+                results.append(
+                    OutputData(id=id, score=float(scores[i]), payload=self.payloads[id])
+                )
+                if len(results) >= limit:
+                    return results
+            if k == len(scores):
+                return results
+            k = min(len(scores), 4 * k)
+
+
+class MmapVectorStore(VectorStoreBase):
+    """In-process mem0 vector store backed by memory-mapped NumPy files.
+
+    Memories are partitioned by user_id, so a search filtered on a user only
+    touches that user's vectors with one matrix-vector product, and nothing
+    goes over the network. Partitions of at least `index_threshold` vectors
+    are searched through an IVF index instead of a full scan. With `dtype`
+    float16 or int8 new partitions take a half or a quarter of the memory.
+
+    Args:
+        collection_name: Name of the collection
+        path: Directory holding the collections
+        embedding_model_dims: Dimension of the embedding vector
+        index_threshold: Partition size from which searches go through the IVF index
+        n_probe: IVF lists scanned per search
+        dtype: Storage format of new partitions: float32, float16 or int8
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "mem0",
+        path: Optional[str] = None,
+        embedding_model_dims: int = 1536,
+        index_threshold: int = 20000,
+        n_probe: int = 8,
+        dtype: str = "float32",
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+        self.root = path or f"/tmp/{PROVIDER}"
+        self.dtype = dtype
+        self.embedding_model_dims = embedding_model_dims
+        self.index_threshold = index_threshold
+        self.n_probe = n_probe
+        self._lock = threading.RLock()
+        self.create_col(collection_name, embedding_model_dims)
+
+    def create_col(self, name, vector_size=None, distance="cosine"):
+        with self._lock:
+            self.collection_name = name
+            self.embedding_model_dims = vector_size or self.embedding_model_dims
+            self.directory = os.path.join(self.root, name)
+            os.makedirs(self.directory, exist_ok=True)
+            self.partitions: Dict[str, Partition] = {}
+            self.locations: Dict[str, str] = {}
+            for file in os.listdir(self.directory):
+                if file.endswith(".pkl"):
+                    with open(os.path.join(self.directory, file), "rb") as f:
+                        key = pickle.load(f)[0]
+                    partition = self._partition(key)
+                    for id in partition.rows:
+                        self.locations[id] = key
+        return self
+
+    def _partition(self, key: str) -> Partition:
+        partition = self.partitions.get(key)
+        if partition is None:
+            partition = self.partitions[key] = Partition(
+                self.directory, key, self.embedding_model_dims, self.dtype
+            )
+        return partition
+
+    @staticmethod
+    def _key(payload: Optional[Dict]) -> str:
+        return str((payload or {}).get("user_id", ""))
+
+    def insert(self, vectors, payloads=None, ids=None):
+        ids = ids or [str(uuid.uuid4()) for _ in vectors]
+        payloads = payloads or [{} for _ in vectors]
+        vectors = normalize(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            groups: Dict[str, List[int]] = {}
+            for i, (id, payload) in enumerate(zip(ids, payloads)):
+                key = self._key(payload)
+                # an id moving to another user leaves its old partition
+                if self.locations.get(id, key) != key:
+                    self.delete(id)
+                groups.setdefault(key, []).append(i)
+            for key, indexes in groups.items():
+                self._partition(key).upsert(
+                    [ids[i] for i in indexes],
+                    vectors[indexes],
+                    [dict(payloads[i]) for i in indexes],
+                )
+                for i in indexes:
+                    self.locations[ids[i]] = key
+
+    def search(self, query, vectors, limit=5, filters=None):
+        query_vector = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1))
+        with self._lock:
+            if filters and isinstance(filters.get("user_id"), str):
+                partitions = [self.partitions.get(filters["user_id"])]
+            else:
+                partitions = list(self.partitions.values())
+
+            results = []
+            for partition in partitions:
+                if partition is not None:
+                    results.extend(
+                        partition.search(
+                            query_vector,
+                            limit,
+                            filters,
+                            self.index_threshold,
+                            self.n_probe,
+                        )
+                    )
+        results.sort(key=lambda result: result.score, reverse=True)
+        return results[:limit]
+
+    def delete(self, vector_id):
+        with self._lock:
+            key = self.locations.pop(vector_id, None)
+            if key is not None:
+                self.partitions[key].remove(vector_id)
+
+    def update(self, vector_id, vector=None, payload=None):
+        with self._lock:
+            current = self.get(vector_id)
+            if current is None:
+                raise ValueError(f"Vector {vector_id} not found")
+            partition = self.partitions[self.locations[vector_id]]
+            if vector is None:
+                vector = partition.vector(vector_id)
+            self.insert(
+                [vector],
+                [payload if payload is not None else current.payload],
+                [vector_id],
+            )
+
+    def get(self, vector_id):
+        with self._lock:
+            key = self.locations.get(vector_id)
+            if key is None:
+                return None
+            payload = self.partitions[key].payloads[vector_id]
+        return OutputData(id=vector_id, score=None, payload=dict(payload))
+
+    def list_cols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def delete_col(self):
+        with self._lock:
+            self.partitions = {}
+            self.locations = {}
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def col_info(self):
+        with self._lock:
+            return {
+                "name": self.collection_name,
+                "count": len(self.locations),
+                "partitions": len(self.partitions),
+                "dimension": self.embedding_model_dims,
+                "distance": "cosine",
+            }
+
+    def list(self, filters=None, limit=None):
+        with self._lock:
+            if filters and isinstance(filters.get("user_id"), str):
+                partitions = [self.partitions.get(filters["user_id"])]
+            else:
+                partitions = list(self.partitions.values())
+
+            results = []
+            for partition in partitions:
+                if partition is None:
+                    continue
+                for id, payload in partition.payloads.items():
+                    if matches(payload, filters):
+                        results.append(
+                            OutputData(id=id, score=None, payload=dict(payload))
+                        )
+                    if limit and len(results) >= limit:
+                        return [results]
+        return [results]
+
+
+def register_vector_store():
+    """Make the store selectable with `"provider": "numpy_mmap"` in a mem0 config.
+
+    mem0 resolves providers through fixed tables and imports the config class
+    from its own package, so the provider is added to both tables and this
+    module is aliased under the package path mem0 imports from.
+    """
+    VectorStoreFactory.provider_to_class[PROVIDER] = (
+        f"{MmapVectorStore.__module__}.{MmapVectorStore.__name__}"
+    )
+    VectorStoreConfig.__private_attributes__["_provider_configs"].default[
+        PROVIDER
+    ] = MmapVectorStoreConfig.__name__
+    sys.modules[f"mem0.configs.vector_stores.{PROVIDER}"] = sys.modules[__name__]
@@ -0,0 +1,173 @@
+"""Compare the stock checkpointer against the delta checkpointer.
+
+Drives a graph with the same State as the real one through a long conversation
+and reports bytes written and put latency for both modes. "full" times the
+stock saver on its own and "delta" the DeltaCheckpointSaver wrapped around it.
+An InMemorySaver is used as the storage stand-in so no MongoDB is needed.
+
+Run from the repository root:
+    python -m benchmarks.checkpoint_benchmark --turns 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# make the shared modules and the checkpointing lesson importable
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "11_langgraph_checkpointing"))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from graph.checkpointer import DeltaCheckpointSaver
+from graph.factory import State
+
+
+class CountingSerializer:
+    """Serializer wrapper that counts the bytes it produces."""
+
+    def __init__(self, serde):
+        self.serde = serde
+        self.bytes_written = 0
+
+    def dumps_typed(self, obj):
+        type_, data = self.serde.dumps_typed(obj)
+        self.bytes_written += len(data)
+        return type_, data
+
+    def loads_typed(self, data):
+        return self.serde.loads_typed(data)
+
+
+class TimedSaver(BaseCheckpointSaver):
+    """Passes everything through to `saver` and records how long each write takes."""
+
+    def __init__(self, saver: BaseCheckpointSaver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.put_latencies = []
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_tuple(self, config):
+        return self.saver.get_tuple(config)
+
+    def list(self, config, **kwargs):
+        return self.saver.list(config, **kwargs)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        start = time.perf_counter()
+        result = self.saver.put(config, checkpoint, metadata, new_versions)
+        self.put_latencies.append(time.perf_counter() - start)
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.saver.put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+
+def build_graph(checkpointer, reply: str):
+    def chatbot(state):
+        return {"messages": [AIMessage(content=reply)], "llm_output": None}
+
+    graph = StateGraph(State)
+    graph.add_node("chatbot", chatbot)
+    graph.add_edge(START, "chatbot")
+    graph.add_edge("chatbot", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(delta: bool, turns: int, message_size: int, snapshot_interval: int):
+    storage = InMemorySaver()
+    serde = CountingSerializer(storage.serde)
+    storage.serde = serde
+    if delta:
+        saver = TimedSaver(
+            DeltaCheckpointSaver(storage, snapshot_interval=snapshot_interval)
+        )
+    else:
+        saver = TimedSaver(storage)
+
+    graph = build_graph(saver, reply="a" * message_size)
+    config = {"configurable": {"thread_id": "benchmark"}}
+    for turn in range(turns):
+        graph.invoke(
+            {
+                "messages": [HumanMessage(content=f"question {turn}")],
+                "llm_output": None,
+            },
+            config,
+        )
+
+    # read the final state back through a cold checkpointer so it is rebuilt from storage
+    def cold():
+        if not delta:
+            return storage
+        return DeltaCheckpointSaver(storage, snapshot_interval=snapshot_interval)
+
+    start = time.perf_counter()
+    messages = cold().get_tuple(config).checkpoint["channel_values"]["messages"]
+    read_latency = time.perf_counter() - start
+    checkpoint = asyncio.run(cold().aget_tuple(config)).checkpoint
+    assert (
+        checkpoint["channel_values"]["messages"] == messages
+    ), "async read rebuilt a different conversation"
+
+    return {
+        "bytes_written": serde.bytes_written,
+        "puts": len(saver.put_latencies),
+        "p50_ms": statistics.median(saver.put_latencies) * 1000,
+        "p99_ms": percentile(saver.put_latencies, 0.99) * 1000,
+        "read_ms": read_latency * 1000,
+        "messages": [(type(m).__name__, m.content) for m in messages],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--message-size", type=int, default=500)
+    parser.add_argument("--snapshot-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {
+        mode: run(
+            mode == "delta", args.turns, args.message_size, args.snapshot_interval
+        )
+        for mode in ["full", "delta"]
+    }
+    assert (
+        results["full"]["messages"] == results["delta"]["messages"]
+    ), "delta checkpointer rebuilt a different conversation"
+
+    print(f"{args.turns} turns, {args.message_size} byte replies")
+    print(
+        f"{'mode':<8}{'bytes':>14}{'puts':>8}{'p50 ms':>10}{'p99 ms':>10}{'read ms':>10}"
+    )
+    for mode, result in results.items():
+        print(
+            f"{mode:<8}{result['bytes_written']:>14,}{result['puts']:>8}"
+            f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['read_ms']:>10.3f}"
+        )
+    ratio = results["full"]["bytes_written"] / results["delta"]["bytes_written"]
+    print(f"delta mode writes {ratio:.1f}x fewer bytes")
+
+
+if __name__ == "__main__":
+    main()
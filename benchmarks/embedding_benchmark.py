@@ -0,0 +1,110 @@
+"""Measure embedding throughput of single calls against the EmbeddingService.
+
+Embeds the same corpus one text per request, then through the service with
+a cold cache and again with a warm one. Everything runs against the local
+fake OpenAI server, so no API key or network is needed.
+
+Run from the repository root:
+    python -m benchmarks.embedding_benchmark --texts 5000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from openai import OpenAI
+
+from benchmarks.fake_openai import FakeOpenAIServer
+from common.embeddings import EmbeddingService, create_embedding
+
+WORDS = "the quick brown fox jumps over a lazy dog while memory graphs store facts about users".split()
+
+
+def make_corpus(count: int, duplicates: float) -> list:
+    rng = random.Random(0)
+    unique = [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+        for _ in range(count)
+    ]
+    # a share of the texts repeat earlier ones, as chat logs and chunked documents do
+    return [
+        rng.choice(unique[: i + 1]) if rng.random() < duplicates else text
+        for i, text in enumerate(unique)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--single-texts", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.texts, args.duplicates)
+    with FakeOpenAIServer(latency=args.latency) as server:
+        client = OpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+        rows = []
+
+        start = time.perf_counter()
+        single = [
+            create_embedding(client, text) for text in corpus[: args.single_texts]
+        ]
+        rows.append(
+            (
+                "single calls",
+                args.single_texts,
+                time.perf_counter() - start,
+                args.single_texts,
+            )
+        )
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            service = EmbeddingService(
+                client,
+                cache_path=f"{cache_dir}/embeddings.sqlite",
+                batch_size=args.batch_size,
+                max_concurrency=args.concurrency,
+                requests_per_minute=1_000_000,
+            )
+            for name in ["service cold", "service warm"]:
+                requests = server.requests
+                start = time.perf_counter()
+                matrix = service.embed_many(corpus)
+                rows.append(
+                    (
+                        name,
+                        len(corpus),
+                        time.perf_counter() - start,
+                        server.requests - requests,
+                    )
+                )
+            service.close()
+
+        assert np.allclose(
+            matrix[: len(single)], np.array(single, dtype=np.float32), atol=1e-6
+        )
+
+    print(
+        f"{len(corpus)} texts, {args.duplicates:.0%} duplicates, {args.latency * 1000:.0f}ms per request"
+    )
+    print(f"{'mode':<14}{'texts':>8}{'seconds':>10}{'requests':>10}{'texts/s':>12}")
+    for name, count, seconds, requests in rows:
+        print(
+            f"{name:<14}{count:>8}{seconds:>10.2f}{requests:>10}{count / seconds:>12.0f}"
+        )
+    speedup = (rows[1][1] / rows[1][2]) / (rows[0][1] / rows[0][2])
+    print(f"service cold is {speedup:.0f}x the throughput of single calls")
+
+
+if __name__ == "__main__":
+    main()
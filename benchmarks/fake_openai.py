@@ -0,0 +1,330 @@
+"""A local stand-in for the OpenAI API, so benchmarks run offline and repeatably.
+
+The server answers like the real API but with a fixed, configurable latency,
+and returns deterministic embeddings derived from a hash of each input.
+
+Chat completions are answered by a scripted responder, a function of the
+request body returning either the text of the reply or the structured output
+object. Objects are sent back the way the request asked for structure: as a
+tool call when a function is forced, as JSON content otherwise. Replies take
+the request latency plus their length at `tokens_per_second`, and are sent as
+server-sent events when the request streams.
+
+A weather route stands in for wttr.in, so tools that look up the weather stay
+offline too.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+from aiohttp import web
+
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def echo_responder(body: Dict[str, Any]) -> str:
+    """Default responder, repeats the last message back."""
+    return str(body["messages"][-1].get("content") or "")
+
+
+def forced_function(body: Dict[str, Any]) -> Optional[str]:
+    """The function the request forces the model to call, if any."""
+    tool_choice = body.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        return tool_choice["function"]["name"]
+    return None
+
+
+class FakeOpenAIServer:
+    """Runs the fake API on a background thread, use as a context manager.
+
+    Args:
+        latency: Seconds every request takes before it is answered
+        latency_per_input: Extra seconds per embedded input
+        dimensions: Default embedding size when the request does not ask for one
+        tokens_per_second: Generation rate of chat replies, 0 sends them at once
+        responder: Returns the reply to a chat completion request body, as
+            text or as the structured output object
+        weather: Answer of the weather route
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        latency_per_input: float = 0.0001,
+        dimensions: int = 1536,
+        tokens_per_second: float = 0,
+        responder: Callable[[Dict[str, Any]], Union[str, dict]] = echo_responder,
+        weather: str = "Sunny +21°C",
+    ):
+        self.latency = latency
+        self.latency_per_input = latency_per_input
+        self.dimensions = dimensions
+        self.tokens_per_second = tokens_per_second
+        self.responder = responder
+        self.weather = weather
+        self.requests = 0
+        # seconds the chat replies were held back for, the simulated provider time
+        self.simulated_seconds = 0.0
+        self._lock = threading.Lock()
+        self.port: Optional[int] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def handle_embeddings(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or self.dimensions
+        delay = self.latency + self.latency_per_input * len(inputs)
+        self._simulated(delay)
+        await asyncio.sleep(delay)
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            embedding = (
+                base64.b64encode(vector.tobytes()).decode()
+                if body.get("encoding_format") == "base64"
+                else vector.tolist()
+            )
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        return web.json_response(
+            {
+                "object": "list",
+                "data": data,
+                "model": body["model"],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        )
+
+    def generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _simulated(self, seconds: float):
+        with self._lock:
+            self.simulated_seconds += seconds
+
+    async def handle_chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        reply = self.responder(body)
+        function = forced_function(body)
+        if isinstance(reply, str):
+            text, function = reply, None
+        else:
+            text = json.dumps(reply)
+
+        prompt_tokens = sum(
+            estimate_tokens(json.dumps(message)) for message in body["messages"]
+        )
+        completion_tokens = estimate_tokens(text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "created": int(time.time()),
+            "model": body["model"],
+            "system_fingerprint": "fake",
+        }
+
+        if body.get("stream"):
+            return await self._stream_chat(
+                request, body, completion, text, function, usage
+            )
+
+        delay = self.latency + self.generation_time(completion_tokens)
+        self._simulated(delay)
+        await asyncio.sleep(delay)
+        message = {"role": "assistant", "content": text, "refusal": None}
+        if function:
+            message["content"] = None
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": function, "arguments": text},
+                }
+            ]
+        return web.json_response(
+            {
+                **completion,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if function else "stop",
+                        "logprobs": None,
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    async def _stream_chat(
+        self,
+        request: web.Request,
+        body: Dict[str, Any],
+        completion: Dict[str, Any],
+        text: str,
+        function: Optional[str],
+        usage: Dict[str, int],
+    ) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def write(chunk: dict):
+            data = {**completion, "object": "chat.completion.chunk", **chunk}
+            await response.write(f"data: {json.dumps(data)}\n\n".encode())
+
+        async def send(delta: dict, finish_reason: Optional[str] = None):
+            choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+            await write({"choices": [choice]})
+
+        self._simulated(self.latency)
+        await asyncio.sleep(self.latency)
+        if function:
+            await send(
+                {
+                    "role": "assistant",
+                    "tool_calls": [
+                        {
+                            "index": 0,
+                            "id": f"call_{uuid.uuid4().hex[:24]}",
+                            "type": "function",
+                            "function": {"name": function, "arguments": ""},
+                        }
+                    ],
+                }
+            )
+        else:
+            await send({"role": "assistant", "content": ""})
+
+        # about four tokens per chunk, like the real API sends
+        for start in range(0, len(text), 16):
+            piece = text[start : start + 16]
+            delay = self.generation_time(len(piece) / 4)
+            self._simulated(delay)
+            await asyncio.sleep(delay)
+            if function:
+                await send(
+                    {"tool_calls": [{"index": 0, "function": {"arguments": piece}}]}
+                )
+            else:
+                await send({"content": piece})
+
+        await send({}, finish_reason="tool_calls" if function else "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await write({"choices": [], "usage": usage})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_weather(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.weather)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes(
+            [
+                web.post("/v1/embeddings", self.handle_embeddings),
+                web.post("/v1/chat/completions", self.handle_chat_completions),
+                web.get("/weather/{city}", self.handle_weather),
+            ]
+        )
+        return app
+
+    @property
+    def weather_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/weather"
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def _serve(conn, options: Dict[str, Any]):
+    with FakeOpenAIServer(**options) as server:
+        conn.send(server.port)
+        while conn.recv() != "stop":
+            conn.send((server.requests, server.simulated_seconds))
+
+
+class FakeOpenAIProcess:
+    """Runs the fake API in a child process, use as a context manager.
+
+    Takes the same arguments as FakeOpenAIServer, the responder must be a
+    module level function. Serving from another process keeps the server off
+    the GIL and out of the heap of the code being measured.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.port: Optional[int] = None
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(child_conn, options), daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def weather_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/weather"
+
+    def stats(self) -> Tuple[int, float]:
+        """Requests served and seconds of simulated provider time so far."""
+        self._conn.send("stats")
+        return self._conn.recv()
+
+    def __enter__(self) -> "FakeOpenAIProcess":
+        self._process.start()
+        self.port = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._conn.send("stop")
+        self._process.join()
@@ -0,0 +1,165 @@
+"""Profile the startup imports of the CLI entry points with python -X importtime.
+
+Each entry point is imported in a fresh interpreter, as running it would,
+and the time spent in imports, the number of modules loaded and the slowest
+packages are reported. Heavy packages an entry point must only load once it
+needs them are listed in ENTRY_POINTS, importing one at startup is reported
+as a regression, as is an import time over the baseline plus the tolerance.
+
+Run from the repository root:
+    python -m benchmarks.import_time_benchmark
+    python -m benchmarks.import_time_benchmark --save benchmarks/import_time_baseline.json
+
+import_time_before.json holds the profile taken before the entry points
+deferred their heavy imports, for comparison.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "import_time_baseline.json"
+
+# name -> (directory it runs from, module, packages it must not import at startup)
+ENTRY_POINTS = {
+    "checkpointing_main": (
+        "11_langgraph_checkpointing",
+        "main",
+        ["langchain_openai", "langchain.chat_models", "openai", "pymongo"],
+    ),
+    "memory": (
+        "7_knowledge_graphs_advance_rags",
+        "memory",
+        ["mem0", "openai", "qdrant_client", "neo4j"],
+    ),
+}
+
+
+def profile(directory: str, module: str) -> Tuple[Dict[str, float], Optional[str]]:
+    """Import time in ms of every module `module` loads, and its import error if any."""
+    env = {
+        **os.environ,
+        # nothing is sent, the key only has to exist for clients built at import
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "import-time-benchmark"),
+        "VECTOR_STORE": "numpy_mmap",
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT / directory,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(self_us) / 1000
+    error = result.stderr.strip().splitlines()[-1] if result.returncode else None
+    return modules, error
+
+
+def packages(modules: Dict[str, float]) -> Dict[str, float]:
+    totals = defaultdict(float)
+    for name, ms in modules.items():
+        totals[name.split(".")[0]] += ms
+    return totals
+
+
+def run(name: str, repeat: int, top: int) -> dict:
+    directory, module, lazy = ENTRY_POINTS[name]
+    runs = [profile(directory, module) for _ in range(repeat)]
+    # the modules loaded are the same every run, the times are not
+    modules, error = runs[-1]
+    if error:
+        # a failed import still shows how much was loaded before it failed
+        print(f"⚠️ import {module} failed: {error}")
+    slowest = sorted(packages(modules).items(), key=lambda item: -item[1])[:top]
+    return {
+        "import_ms": round(statistics.median(sum(r.values()) for r, _ in runs), 1),
+        "modules": len(modules),
+        "slowest": {package: round(ms, 1) for package, ms in slowest},
+        "eager": [
+            package
+            for package in lazy
+            if any(m == package or m.startswith(f"{package}.") for m in modules)
+        ],
+    }
+
+
+def regressions(
+    results: Dict[str, dict],
+    baseline: Dict[str, dict],
+    tolerance: float,
+    slack_ms: float,
+) -> List[str]:
+    found = []
+    for name, result in results.items():
+        for package in result["eager"]:
+            found.append(f"{name} imports {package} at startup")
+        before = baseline.get(name)
+        if not before:
+            continue
+        # the slack keeps a few ms of noise on a small baseline from failing
+        if result["import_ms"] > before["import_ms"] * (1 + tolerance) + slack_ms:
+            found.append(
+                f"{name} import time: {before['import_ms']:.0f} -> "
+                f"{result['import_ms']:.0f} ms"
+            )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--entry-point",
+        choices=list(ENTRY_POINTS),
+        action="append",
+        help="entry point to profile, can be repeated, all of them by default",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest packages shown")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", default=str(BASELINE))
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--slack-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'entry point':<22}{'import ms':>12}{'modules':>10}  slowest packages")
+    for name in args.entry_point or list(ENTRY_POINTS):
+        results[name] = result = run(name, args.repeat, args.top)
+        slowest = ", ".join(f"{p} {ms:.0f}" for p, ms in result["slowest"].items())
+        print(
+            f"{name:<22}{result['import_ms']:>12.0f}{result['modules']:>10}  {slowest}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nresults saved to {args.save}")
+        return
+
+    if not os.path.exists(args.compare):
+        return
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    found = regressions(results, baseline, args.tolerance, args.slack_ms)
+    for line in found:
+        print(f"🔺 {line}")
+    if found:
+        sys.exit(1)
+    print(f"\nno regressions over {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
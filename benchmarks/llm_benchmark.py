@@ -0,0 +1,480 @@
+"""Measure the overhead of the graphs and the agent loop against a stub of the OpenAI API.
+
+Each scenario runs scripted conversations against a local stand-in for the
+OpenAI API, so the time spent "at the provider" is known exactly and what is
+left is this project's own overhead: graph scheduling, checkpointing, output
+parsing, caches, rate limiting and tools. Weather lookups go to the stub too,
+so nothing leaves the machine.
+
+Scenarios:
+    checkpointing  11_langgraph_checkpointing graph: plan, weather tool, output
+    hello_graph    10_intro_to_langgraph compiled_graph: detector and solvers
+    agent          3_agents_and_fine_tuning agent loop: plan, weather tool, output
+
+For every scenario it reports p50/p95/p99 latency per node and per turn, the
+throughput of N concurrent sessions, the provider time and overhead per turn,
+and the memory allocated per turn, traced in a separate single session pass.
+Results can be saved and compared against a baseline to catch regressions.
+
+Run from the repository root, no network needed:
+    python -m benchmarks.llm_benchmark --sessions 8 --turns 20
+    python -m benchmarks.llm_benchmark --save baseline.json
+    python -m benchmarks.llm_benchmark --compare baseline.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.fake_openai import FakeOpenAIProcess
+
+ROOT = Path(__file__).resolve().parent.parent
+
+OUTPUT_TEXT = (
+    "It is sunny with a temperature of 21 degrees Celsius, a light breeze from "
+    "the west and no rain expected for the rest of the day."
+)
+SOLUTION_TEXT = (
+    "Sort the list with sorted(items, key=len) and keep the first element, "
+    "or use min(items, key=len) to find it in a single pass."
+)
+
+
+def last_user_index(messages: List[dict]) -> int:
+    return max(i for i, message in enumerate(messages) if message["role"] == "user")
+
+
+def city_of(message: dict) -> str:
+    return message["content"].rsplit(" in ", 1)[-1].rstrip("?")
+
+
+def checkpointing_reply(body: Dict[str, Any]) -> dict:
+    """OutputSchema steps: plan, then the weather tool, then the answer."""
+    messages = body["messages"]
+    start = last_user_index(messages)
+    city = city_of(messages[start])
+    replies = sum(message["role"] == "assistant" for message in messages[start:])
+    if replies == 0:
+        return {
+            "step": "plan",
+            "role": "assistant",
+            "content": f"The user wants the weather in {city}, I will look it up.",
+        }
+    if replies == 1:
+        return {
+            "step": "action",
+            "role": "assistant",
+            "content": f"Getting the weather in {city}.",
+            "tool_name": "get_weather",
+            "tool_input": city,
+            "tool_call_id": f"call_{len(messages)}",
+        }
+    return {"step": "output", "role": "assistant", "content": OUTPUT_TEXT}
+
+
+def agent_reply(body: Dict[str, Any]) -> dict:
+    """JSON steps: plan and the weather tool in one response, then the answer."""
+    messages = body["messages"]
+    if messages[-1]["role"] == "user":
+        city = city_of(messages[-1])
+        return {
+            "steps": [
+                {"step": "plan", "content": f"The user wants the weather in {city}."},
+                {"step": "action", "function": "get_weather", "input": city},
+            ]
+        }
+    return {"steps": [{"step": "output", "content": OUTPUT_TEXT}]}
+
+
+def respond(body: Dict[str, Any]) -> dict:
+    """Scripted replies of every scenario, told apart by the requested output format."""
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_object":
+        return agent_reply(body)
+
+    schema = response_format["json_schema"]["name"]
+    if schema == "OutputSchema":
+        return checkpointing_reply(body)
+    if schema == "QueryTypeDetectionResponse":
+        return {"is_coding_question": "code" in body["messages"][-1]["content"]}
+    return {"solution": SOLUTION_TEXT}
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Collects how long each graph node takes, from the LangChain callbacks.
+
+    A node is the outermost run whose name is the langgraph_node of its
+    metadata, the runnables it calls inherit the metadata but either have
+    names of their own or run inside the node run. Code outside of a graph is
+    timed by wrapping it with `timed`.
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._started: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def record(self, node: str, seconds: float):
+        with self._lock:
+            self.latencies[node].append(seconds)
+
+    def timed(self, node: str, fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(node, time.perf_counter() - start)
+
+        return wrapper
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        node = (metadata or {}).get("langgraph_node")
+        if (
+            node is not None
+            and kwargs.get("name") == node
+            and parent_run_id not in self._started
+        ):
+            self._started[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started:
+            self.record(started[0], time.perf_counter() - started[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def reset(self):
+        with self._lock:
+            self.latencies.clear()
+
+
+def weather_query(session: int, turn: int) -> str:
+    # a new city every turn, so that the weather and LLM caches miss like new questions do
+    return f"What is the weather in Springfield {session}-{turn}?"
+
+
+class CheckpointingScenario:
+    """The lesson 11 graph with an in-memory checkpointer instead of MongoDB."""
+
+    name = "checkpointing"
+
+    def __init__(self, timer: NodeTimer, args):
+        sys.path.append(str(ROOT / "11_langgraph_checkpointing"))
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        from config.prompts import SYSTEM_PROMPT
+        from graph.checkpointer import DeltaCheckpointSaver
+        from graph.factory import create_graph, create_llm_with_tools
+
+        checkpointer = InMemorySaver()
+        if args.checkpoint_mode == "delta":
+            checkpointer = DeltaCheckpointSaver(checkpointer)
+        self.graph = create_graph(
+            create_llm_with_tools(), checkpointer, stream_output=args.stream
+        )
+        self.system_prompt = SYSTEM_PROMPT
+        self.timer = timer
+
+    query = staticmethod(weather_query)
+
+    def new_session(self, session: int):
+        return {"configurable": {"thread_id": str(session)}, "callbacks": [self.timer]}
+
+    def turn(self, config, query: str):
+        messages = [
+            {"role": "user", "content": query},
+            {"role": "system", "content": self.system_prompt},
+        ]
+        for _ in self.graph.stream(
+            {"messages": messages, "llm_output": None},
+            config,
+            stream_mode=["updates", "custom"],
+        ):
+            pass
+
+
+class HelloGraphScenario:
+    """The lesson 10 graph, half of the questions are coding questions."""
+
+    name = "hello_graph"
+
+    def __init__(self, timer: NodeTimer, args):
+        sys.path.append(str(ROOT / "10_intro_to_langgraph"))
+        self.graph = importlib.import_module("hello_graph").compiled_graph
+        self.timer = timer
+
+    def new_session(self, session: int):
+        return {"callbacks": [self.timer]}
+
+    def query(self, session: int, turn: int) -> str:
+        if turn % 2:
+            return f"Can you write code to find the shortest word? ({session}-{turn})"
+        return f"Which is the longest river in Europe? ({session}-{turn})"
+
+    def turn(self, config, query: str):
+        self.graph.invoke({"user_message": query}, config)
+
+
+class AgentScenario:
+    """The lesson 3 agent loop, its model calls and tools are timed as nodes."""
+
+    name = "agent"
+
+    def __init__(self, timer: NodeTimer, args):
+        sys.path.append(str(ROOT / "3_agents_and_fine_tuning"))
+        self.agent = importlib.import_module("agent")
+        self.agent.complete = timer.timed("llm", self.agent.complete)
+        for name, tool in self.agent.tools.items():
+            tool["fn"] = timer.timed(name, tool["fn"])
+
+    query = staticmethod(weather_query)
+
+    def new_session(self, session: int):
+        return self.agent.new_session()
+
+    def turn(self, messages, query: str):
+        self.agent.run_turn(messages, query)
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [CheckpointingScenario, HelloGraphScenario, AgentScenario]
+}
+
+
+def run_sessions(scenario, sessions: int, turns: int, first_turn: int = 0):
+    """Runs the sessions side by side and returns the latency of every turn."""
+
+    def run_session(session: int) -> List[float]:
+        state = scenario.new_session(session)
+        latencies = []
+        for turn in range(first_turn, first_turn + turns):
+            start = time.perf_counter()
+            scenario.turn(state, scenario.query(session, turn))
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        results = executor.map(run_session, range(sessions))
+        return [latency for latencies in results for latency in latencies]
+
+
+def trace_allocations(scenario, turns: int, first_turn: int) -> Dict[str, float]:
+    """Peak and retained traced memory of the turns of a single session."""
+    state = scenario.new_session(-1)
+    peaks, retained, blocks = [], [], []
+    tracemalloc.start()
+    try:
+        for turn in range(first_turn, first_turn + turns):
+            before = tracemalloc.take_snapshot()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            scenario.turn(state, scenario.query(-1, turn))
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+            retained.append(after - current)
+            blocks.append(
+                sum(
+                    stat.count_diff
+                    for stat in tracemalloc.take_snapshot().compare_to(
+                        before, "filename"
+                    )
+                )
+            )
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib": statistics.mean(peaks) / 1024,
+        "retained_kib": statistics.mean(retained) / 1024,
+        "blocks": statistics.mean(blocks),
+    }
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "calls": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run(name: str, server: FakeOpenAIProcess, args) -> Dict[str, Any]:
+    timer = NodeTimer()
+    scenario = SCENARIOS[name](timer, args)
+
+    # first requests pay for imports, connections and lazy setup, keep them out
+    run_sessions(scenario, 1, args.warmup, first_turn=-args.warmup)
+    timer.reset()
+
+    _, simulated_before = server.stats()
+    start = time.perf_counter()
+    latencies = run_sessions(scenario, args.sessions, args.turns)
+    elapsed = time.perf_counter() - start
+    _, simulated_after = server.stats()
+
+    turns = len(latencies)
+    provider = (simulated_after - simulated_before) / turns
+    nodes = {node: summarize(values) for node, values in timer.latencies.items()}
+    nodes["turn"] = summarize(latencies)
+    return {
+        "turns": turns,
+        "elapsed_s": elapsed,
+        "throughput": turns / elapsed,
+        "provider_ms": provider * 1000,
+        "overhead_ms": (statistics.mean(latencies) - provider) * 1000,
+        "nodes": nodes,
+        "allocations": trace_allocations(scenario, args.alloc_turns, args.turns),
+    }
+
+
+def print_result(name: str, result: Dict[str, Any], sessions: int):
+    print(
+        f"\n{name}: {sessions} sessions, {result['turns']} turns in "
+        f"{result['elapsed_s']:.2f} s, {result['throughput']:.1f} turns/s"
+    )
+    print(
+        f"provider {result['provider_ms']:.1f} ms/turn, "
+        f"overhead {result['overhead_ms']:.1f} ms/turn"
+    )
+    print(f"{'node':<26}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for node, stats in result["nodes"].items():
+        print(
+            f"{node:<26}{stats['calls']:>8}{stats['p50_ms']:>10.2f}"
+            f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+    allocations = result["allocations"]
+    print(
+        f"allocations per turn: peak {allocations['peak_kib']:.1f} KiB, "
+        f"retained {allocations['retained_kib']:.1f} KiB, "
+        f"{allocations['blocks']:.0f} blocks retained"
+    )
+
+
+def regressions(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Metrics that got worse than the baseline by more than the tolerance."""
+    found = []
+
+    def check(label: str, value: float, before: float):
+        if before > 0 and value > before * (1 + tolerance):
+            found.append(f"{label}: {before:.2f} -> {value:.2f}")
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        check(f"{name} overhead ms/turn", result["overhead_ms"], before["overhead_ms"])
+        check(
+            f"{name} peak KiB/turn",
+            result["allocations"]["peak_kib"],
+            before["allocations"]["peak_kib"],
+        )
+        for node, stats in result["nodes"].items():
+            if node in before["nodes"]:
+                check(
+                    f"{name} {node} p95 ms",
+                    stats["p95_ms"],
+                    before["nodes"][node]["p95_ms"],
+                )
+        # fewer turns per second is the regression here
+        if result["throughput"] < before["throughput"] / (1 + tolerance):
+            found.append(
+                f"{name} turns/s: {before['throughput']:.1f} -> {result['throughput']:.1f}"
+            )
+    return found
+
+
+def configure(server: FakeOpenAIProcess, cache_dir: str):
+    """Point every client at the stub, before the scenarios import them."""
+    os.environ.update(
+        OPENAI_BASE_URL=server.base_url,
+        OPENAI_API_KEY="benchmark",
+        WEATHER_API_URL=server.weather_url,
+        # the stub has no rate limits, only the overhead of the scheduler is measured
+        OPENAI_RPM="1000000",
+        OPENAI_TPM="1000000000",
+        GRAPH_CACHE_DIR=cache_dir,
+        LLM_GATEWAY="false",
+        LANGSMITH_TRACING="false",
+        LANGCHAIN_TRACING_V2="false",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        choices=list(SCENARIOS),
+        action="append",
+        help="scenario to run, can be repeated, all of them by default",
+    )
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=20, help="turns per session")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--alloc-turns", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tokens-per-second", type=float, default=1000)
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--checkpoint-mode", choices=["full", "delta"], default="full")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    with FakeOpenAIProcess(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        responder=respond,
+    ) as server, tempfile.TemporaryDirectory() as cache_dir:
+        configure(server, cache_dir)
+        for name in names:
+            # the nodes and tools print as they go, keep the report readable
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results[name] = run(name, server, args)
+            print_result(name, results[name], args.sessions)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"🔺 {line}")
+        if found:
+            sys.exit(1)
+        print(f"\nno regressions over {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare the size, speed and recall of the quantized vector store formats.
+
+Builds the same store of synthetic clustered embeddings as float32, float16
+and int8, with and without sign bit prefiltering, and measures recall@k of
+each one against the exact float32 search.
+
+Run from the repository root:
+    python -m benchmarks.quantized_store_benchmark --vectors 50000 --dims 768
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from common.quantized_store import QuantizedVectorStore, normalize, recall_at_k
+
+
+def make_embeddings(count: int, dims: int, clusters: int, rng) -> np.ndarray:
+    # real embeddings are far from uniform, they bunch up around topics
+    centers = rng.standard_normal((clusters, dims)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=count)]
+    vectors += 0.6 * rng.standard_normal((count, dims)).astype(np.float32)
+    return normalize(vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shard-size", type=int, default=16384)
+    parser.add_argument(
+        "--prefilter", type=int, default=1000, help="sign bit candidates per shard"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_embeddings(args.vectors, args.dims, 100, rng)
+    queries = normalize(
+        vectors[rng.integers(args.vectors, size=args.queries)]
+        + 0.3 * rng.standard_normal((args.queries, args.dims)).astype(np.float32)
+    )
+    ids = [str(i) for i in range(args.vectors)]
+
+    configs = [
+        ("float32", False),
+        ("float16", False),
+        ("int8", False),
+        ("float16", True),
+        ("int8", True),
+    ]
+    rows = []
+    expected = None
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype, binary in configs:
+            store = QuantizedVectorStore(
+                f"{directory}/{dtype}-{binary}",
+                dims=args.dims,
+                dtype=dtype,
+                binary=binary,
+                shard_size=args.shard_size,
+            )
+            store.add(ids, vectors)
+            store.flush()
+
+            start = time.perf_counter()
+            found, _ = store.search(queries, args.k, prefilter=args.prefilter)
+            elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = found
+            rows.append(
+                (
+                    dtype + (" + bits" if binary else ""),
+                    store.bytes_per_vector,
+                    elapsed * 1000 / args.queries,
+                    recall_at_k(found, expected),
+                )
+            )
+
+    python_floats = args.dims * 32 + 56
+    print(
+        f"{args.vectors} vectors of {args.dims} dims, {args.queries} queries, recall@{args.k} vs exact float32"
+    )
+    print(f"{'format':<16}{'bytes/vec':>10}{'MB':>9}{'ms/query':>10}{'recall':>9}")
+    print(
+        f"{'python floats':<16}{python_floats:>10}{python_floats * args.vectors / 1e6:>9.1f}{'':>10}{'':>9}"
+    )
+    for name, size, ms, recall in rows:
+        print(
+            f"{name:<16}{size:>10}{size * args.vectors / 1e6:>9.1f}{ms:>10.3f}{recall:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
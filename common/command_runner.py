@@ -0,0 +1,181 @@
+import asyncio
+import os
+import signal
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional
+
+# Called with the stream name ("stdout" or "stderr") and each chunk of output as it arrives
+OutputCallback = Callable[[str, str], None]
+
+COMMAND_TIMEOUT = float(os.getenv("COMMAND_TIMEOUT", "30"))
+COMMAND_MAX_OUTPUT_BYTES = int(os.getenv("COMMAND_MAX_OUTPUT_BYTES", str(16 * 1024)))
+COMMAND_MAX_CONCURRENCY = int(os.getenv("COMMAND_MAX_CONCURRENCY", "4"))
+
+
+@dataclass
+class CommandResult:
+    """Outcome of a shell command run by the CommandRunner."""
+
+    command: str
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+
+    def summary(self) -> str:
+        """Describe the result in a form that can be handed back to the LLM."""
+        if self.timed_out:
+            status = "timed out and was killed"
+        else:
+            status = f"exited with code {self.returncode}"
+        lines = [f"The command {self.command} {status}."]
+        if self.stdout:
+            lines.append(f"stdout:\n{self.stdout.rstrip()}")
+        if self.stderr:
+            lines.append(f"stderr:\n{self.stderr.rstrip()}")
+        if self.truncated:
+            lines.append("(output was truncated)")
+        return "\n".join(lines)
+
+
+class CommandRunner:
+    """Runs shell commands on asyncio subprocesses without blocking the caller's thread.
+
+    Commands run on a dedicated event loop thread. A semaphore bounds how many
+    commands run at once across every session in the process, each command is
+    killed once it exceeds its timeout, and the output kept per stream is capped
+    at `max_output_bytes` while the rest is drained and dropped.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = COMMAND_MAX_CONCURRENCY,
+        timeout: float = COMMAND_TIMEOUT,
+        max_output_bytes: int = COMMAND_MAX_OUTPUT_BYTES,
+    ):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="command-runner", daemon=True
+        )
+        self._thread.start()
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[OutputCallback] = None,
+    ) -> CommandResult:
+        """Run a command and wait for its result from a synchronous caller."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(command, timeout, on_output), self._loop
+        )
+        try:
+            return future.result()
+        except BaseException:
+            # interrupted while waiting, e.g. by Ctrl+C: stop the command as well
+            future.cancel()
+            raise
+
+    async def arun(
+        self,
+        command: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[OutputCallback] = None,
+    ) -> CommandResult:
+        """Run a command and await its result from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(command, timeout, on_output), self._loop
+        )
+        return await asyncio.wrap_future(future)
+
+    async def _run(
+        self,
+        command: str,
+        timeout: Optional[float],
+        on_output: Optional[OutputCallback],
+    ) -> CommandResult:
+        timeout = self.timeout if timeout is None else timeout
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                # run in its own process group so that a timeout also kills its children
+                start_new_session=True,
+            )
+            stdout, stderr = bytearray(), bytearray()
+            truncated = set()
+            readers = asyncio.gather(
+                self._read_stream(
+                    process.stdout, "stdout", stdout, truncated, on_output
+                ),
+                self._read_stream(
+                    process.stderr, "stderr", stderr, truncated, on_output
+                ),
+                process.wait(),
+            )
+            timed_out = False
+            try:
+                await asyncio.wait_for(readers, timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._kill(process)
+                await process.wait()
+            except BaseException:
+                # the caller was cancelled or an output callback failed, so nobody
+                # will wait for the command: kill its process group before leaving
+                self._kill(process)
+                raise
+
+        return CommandResult(
+            command=command,
+            returncode=process.returncode,
+            stdout=stdout.decode(errors="replace"),
+            stderr=stderr.decode(errors="replace"),
+            timed_out=timed_out,
+            truncated=bool(truncated),
+        )
+
+    async def _read_stream(
+        self,
+        stream: asyncio.StreamReader,
+        name: str,
+        buffer: bytearray,
+        truncated: set,
+        on_output: Optional[OutputCallback],
+    ):
+        while chunk := await stream.read(4096):
+            remaining = self.max_output_bytes - len(buffer)
+            if len(chunk) > remaining:
+                chunk = chunk[: max(remaining, 0)]
+                truncated.add(name)
+            if not chunk:
+                # keep draining so the process never blocks on a full pipe
+                continue
+            buffer.extend(chunk)
+            if on_output:
+                on_output(name, chunk.decode(errors="replace"))
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+@lru_cache(maxsize=None)
+def get_command_runner() -> CommandRunner:
+    """Return the process wide command runner."""
+    return CommandRunner()
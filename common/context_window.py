@@ -0,0 +1,182 @@
+from typing import Callable, Dict, List, Optional
+
+from common.tokenizer import DEFAULT_ENCODING, count_tokens_or_estimate
+
+# Every chat message is framed with a few extra tokens on top of its content,
+# and every reply is primed with a few more (see the OpenAI cookbook on counting tokens).
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Turns a list of evicted messages, and the previous summary if any, into a new summary
+Summarizer = Callable[[List[Dict[str, str]], Optional[str]], str]
+
+
+def count_message_tokens(message: Dict[str, str], model: str = DEFAULT_ENCODING) -> int:
+    """Count the tokens a single chat message costs in a prompt."""
+    tokens = TOKENS_PER_MESSAGE
+    for value in message.values():
+        if isinstance(value, str):
+            tokens += count_tokens_or_estimate(value, model)
+    return tokens
+
+
+class ContextWindow:
+    """Token-budgeted view over an ever-growing list of chat messages.
+
+    The full history is kept in `messages`, but `window()` only returns what
+    fits in `max_tokens`: the leading system messages and the latest user
+    message are always pinned, so a long tool output cannot push the current
+    question out, and the newest messages are added until the budget is used
+    up. Older turns are dropped, or folded into a running summary when a
+    summarizer is given.
+    Token counts are computed once per message as it is appended, and
+    estimated when the tokenizer is neither cached nor downloadable.
+
+    Args:
+        model: The model the messages are sent to, used to pick the tokenizer
+        max_tokens: The prompt token budget for a single call
+        summarizer: Optional callable used to summarize evicted messages
+    """
+
+    def __init__(
+        self,
+        model: str = "gpt-4o-mini",
+        max_tokens: int = 8000,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.messages: List[Dict[str, str]] = []
+        self.token_counts: List[int] = []
+        self.summary: Optional[str] = None
+        self.summarized_upto = 0
+        self.last_saved_tokens = 0
+        self.total_saved_tokens = 0
+        self.calls = 0
+
+    def append(self, message: Dict[str, str]):
+        self.messages.append(message)
+        self.token_counts.append(count_message_tokens(message, self.model))
+
+    def extend(self, messages: List[Dict[str, str]]):
+        for message in messages:
+            self.append(message)
+
+    @property
+    def total_tokens(self) -> int:
+        """Tokens the full history would cost if it was sent as is."""
+        return sum(self.token_counts) + TOKENS_PER_REPLY
+
+    def _pinned_count(self) -> int:
+        count = 0
+        while count < len(self.messages) and self.messages[count]["role"] == "system":
+            count += 1
+        return count
+
+    def _latest_user_index(self, pinned: int) -> Optional[int]:
+        for index in range(len(self.messages) - 1, pinned - 1, -1):
+            if self.messages[index]["role"] == "user":
+                return index
+        return None
+
+    def _summary_message(self) -> Optional[Dict[str, str]]:
+        if self.summary is None:
+            return None
+        return {
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{self.summary}",
+        }
+
+    def window(self) -> List[Dict[str, str]]:
+        """Return the messages to send on the next call, within the token budget."""
+        pinned = self._pinned_count()
+        budget = self.max_tokens - TOKENS_PER_REPLY - sum(self.token_counts[:pinned])
+
+        summary_message = self._summary_message()
+        summary_tokens = (
+            count_message_tokens(summary_message, self.model) if summary_message else 0
+        )
+
+        # the latest user message is sent even when the walk below stops before it
+        latest_user = self._latest_user_index(pinned)
+        reserved = 0 if latest_user is None else self.token_counts[latest_user]
+
+        # walk back from the newest message, always keeping at least the last one
+        start = len(self.messages)
+        used = summary_tokens + reserved
+        while start > pinned:
+            index = start - 1
+            tokens = 0 if index == latest_user else self.token_counts[index]
+            if used + tokens > budget and start < len(self.messages):
+                break
+            used += tokens
+            start -= 1
+
+        if self.summarizer and start > max(pinned, self.summarized_upto):
+            evicted = self.messages[max(pinned, self.summarized_upto) : start]
+            self.summary = self.summarizer(evicted, self.summary)
+            self.summarized_upto = start
+            summary_message = self._summary_message()
+            summary_tokens = count_message_tokens(summary_message, self.model)
+            # the new summary may be longer than the old one, drop more turns if needed
+            used = summary_tokens + reserved + sum(self.token_counts[start:])
+            if latest_user is not None and latest_user >= start:
+                used -= reserved
+            while used > budget and start < len(self.messages) - 1:
+                if start != latest_user:
+                    used -= self.token_counts[start]
+                start += 1
+
+        window = self.messages[:pinned]
+        if summary_message and start > pinned:
+            window.append(summary_message)
+        else:
+            summary_tokens = 0
+        pinned_user = latest_user is not None and latest_user < start
+        if pinned_user:
+            window.append(self.messages[latest_user])
+        window.extend(self.messages[start:])
+
+        sent_tokens = (
+            sum(self.token_counts[:pinned])
+            + summary_tokens
+            + (reserved if pinned_user else 0)
+            + sum(self.token_counts[start:])
+            + TOKENS_PER_REPLY
+        )
+        self.last_saved_tokens = max(self.total_tokens - sent_tokens, 0)
+        self.total_saved_tokens += self.last_saved_tokens
+        self.calls += 1
+        return window
+
+    def report(self) -> str:
+        return (
+            f"saved {self.last_saved_tokens} prompt tokens on this call, "
+            f"{self.total_saved_tokens} over {self.calls} calls"
+        )
+
+
+def openai_summarizer(client, model: str = "gpt-4o-mini") -> Summarizer:
+    """Build a summarizer that asks an OpenAI chat model to condense evicted turns."""
+
+    def summarize(
+        messages: List[Dict[str, str]], previous_summary: Optional[str]
+    ) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"Previous summary:\n{previous_summary}\n\n{transcript}"
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Summarize the conversation below in a few sentences. "
+                    "Keep every fact, decision and tool result that later turns may need.",
+                },
+                {"role": "user", "content": transcript},
+            ],
+        )
+        return response.choices[0].message.content
+
+    return summarize
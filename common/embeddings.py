@@ -0,0 +1,314 @@
+"""Embedding helpers shared by the lessons.
+
+`create_embedding` embeds a single string. `EmbeddingService` is meant for
+anything that embeds more than a handful of texts: it packs inputs into
+provider-sized batches, sends the batches concurrently under a rate limit,
+and keeps every embedding in a content-hash disk cache, so a text is only
+ever sent once per model.
+
+Embed a file into a memory-mapped matrix, from the repository root:
+    python -m common.embeddings texts.jsonl vectors.npy --dtype float16
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Limits of a single OpenAI embeddings request
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300_000
+
+
+def create_embedding(client, text: str, model: str = EMBEDDING_MODEL) -> List[float]:
+    """Embed a single string with the OpenAI embeddings API."""
+    response = client.embeddings.create(model=model, input=text)
+    return response.data[0].embedding
+
+
+def estimate_tokens(text: str) -> int:
+    # a cheap upper bound, English averages about 4 characters per token
+    return len(text) // 3 + 1
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` calls per minute, in bursts of up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # take the token now, possibly going into debt, and wait the debt off
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class EmbeddingCache:
+    """Content-hash keyed embedding store in a SQLite file, safe to share between threads."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            # stay well below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                part = keys[start : start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [
+                    (key, np.asarray(vector, dtype=np.float32).tobytes())
+                    for key, vector in items.items()
+                ],
+            )
+            self._db.commit()
+
+
+class EmbeddingService:
+    """Batched, cached and concurrent embeddings.
+
+    Inputs are deduplicated and looked up in the cache by a hash of the model,
+    the dimensions and the text. The rest is packed into batches of at most
+    `batch_size` inputs (and the provider's token limit), which are sent on
+    `max_concurrency` threads while `requests_per_minute` is respected.
+    Results always come back in the order of the inputs.
+
+    Args:
+        client: The OpenAI client, or any client with the same embeddings API
+        model: The embedding model
+        dimensions: Optional number of dimensions to ask the model for
+        cache_path: Optional SQLite file used as the disk cache
+        batch_size: Maximum number of inputs per request
+        max_concurrency: Maximum number of requests in flight
+        requests_per_minute: Request rate limit
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str = EMBEDDING_MODEL,
+        dimensions: Optional[int] = None,
+        cache_path: Optional[str] = None,
+        batch_size: int = 256,
+        max_concurrency: int = 4,
+        requests_per_minute: float = 3000,
+    ):
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.batch_size = min(batch_size, MAX_BATCH_INPUTS)
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute, burst=max_concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embeddings"
+        )
+        self.stats = {"inputs": 0, "cache_hits": 0, "embedded": 0, "requests": 0}
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model}:{self.dimensions}:{text}".encode()
+        ).hexdigest()
+
+    def _batches(self, texts: List[str]) -> Iterator[List[str]]:
+        batch, tokens = [], 0
+        for text in texts:
+            cost = estimate_tokens(text)
+            if batch and (
+                len(batch) >= self.batch_size or tokens + cost > MAX_BATCH_TOKENS
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += cost
+        if batch:
+            yield batch
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.rate_limiter.acquire()
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = self.client.embeddings.create(
+            model=self.model, input=texts, **kwargs
+        )
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["embedded"] += len(texts)
+        return [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
+
+    def _embed_window(self, texts: List[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        unique = dict(zip(keys, texts))
+        vectors = self.cache.get_many(list(unique)) if self.cache else {}
+
+        missing = [key for key in unique if key not in vectors]
+        batches = list(self._batches([unique[key] for key in missing]))
+        embedded = {}
+        offset = 0
+        for batch, result in zip(
+            batches, self.executor.map(self._embed_batch, batches)
+        ):
+            for key, vector in zip(missing[offset : offset + len(batch)], result):
+                embedded[key] = np.asarray(vector, dtype=np.float32)
+            offset += len(batch)
+        if self.cache and embedded:
+            self.cache.put_many(embedded)
+        vectors.update(embedded)
+
+        with self._lock:
+            self.stats["inputs"] += len(texts)
+            self.stats["cache_hits"] += len(unique) - len(missing)
+        return np.stack([vectors[key] for key in keys])
+
+    def embed_iter(
+        self, texts: Iterable[str], window: Optional[int] = None
+    ) -> Iterator[np.ndarray]:
+        """Embed a stream of texts, yielding one (n, dims) matrix per window of inputs.
+
+        Only a window of texts is held in memory at a time, so this works for
+        inputs of any size.
+        """
+        window = window or self.batch_size * self.max_concurrency * 2
+        iterator = iter(texts)
+        while True:
+            texts = list(islice(iterator, window))
+            if not texts:
+                return
+            yield self._embed_window(texts)
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        """Embed texts and return a (n, dims) float32 matrix, in input order."""
+        matrices = list(self.embed_iter(texts))
+        return np.concatenate(matrices) if matrices else np.empty((0, 0), np.float32)
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single string, a drop-in replacement for create_embedding."""
+        return self._embed_window([text])[0].tolist()
+
+    def embed_to_matrix(
+        self,
+        records: Iterable[Tuple[str, str]],
+        path: str,
+        count: int,
+        dtype: str = "float32",
+    ) -> np.ndarray:
+        """Embed (id, text) records into a memory-mapped .npy matrix.
+
+        Row i holds the embedding of the i-th record, and the ids are written
+        in row order to a .ids.json file next to the matrix.
+        """
+        ids: List[str] = []
+
+        def texts():
+            for id, text in records:
+                ids.append(id)
+                yield text
+
+        matrix = None
+        row = 0
+        for vectors in self.embed_iter(texts()):
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=dtype, shape=(count, vectors.shape[1])
+                )
+            matrix[row : row + len(vectors)] = vectors.astype(dtype)
+            row += len(vectors)
+        if matrix is not None:
+            matrix.flush()
+        with open(Path(path).with_suffix(".ids.json"), "w") as f:
+            json.dump(ids, f)
+        return matrix
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def read_records(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (id, text) from a .jsonl file of {"id", "text"} objects, or one text per line."""
+    with open(path) as f:
+        for number, line in enumerate(f):
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                yield str(record.get("id", number)), record["text"]
+            else:
+                yield str(number), line.rstrip("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Embed a file into a memory-mapped matrix."
+    )
+    parser.add_argument(
+        "input", help=".jsonl of {id, text} or a text file, one text per line"
+    )
+    parser.add_argument("output", help="the .npy file to write")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--cache", default=".cache/embeddings.sqlite")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=3000)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    load_dotenv()
+    service = EmbeddingService(
+        OpenAI(),
+        model=args.model,
+        cache_path=args.cache,
+        batch_size=args.batch_size,
+        max_concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+    )
+    count = sum(1 for _ in read_records(args.input))
+    start = time.perf_counter()
+    service.embed_to_matrix(read_records(args.input), args.output, count, args.dtype)
+    elapsed = time.perf_counter() - start
+    print(f"{count} texts in {elapsed:.1f}s ({count / elapsed:.0f}/s), {service.stats}")
+
+
+if __name__ == "__main__":
+    main()
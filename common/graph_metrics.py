@@ -0,0 +1,535 @@
+"""Local latency, token and cost metrics of graph nodes and the LLM calls they make.
+
+Nodes are wrapped with `instrument_node` where the graph is built. Every
+OpenAI request made through `common.request_scheduler` is recorded with its
+wall time, the time it waited for the rate limits, its prompt, completion and
+cached tokens and its estimated cost, and is added to the node it was made
+from. Nothing leaves the machine: the metrics are served as Prometheus text
+and every node run and LLM call can be appended to a JSONL trace file.
+
+Turned on with environment variables, when off the nodes are not wrapped and
+requests pay for a single check:
+
+    GRAPH_METRICS=true             record metrics
+    GRAPH_METRICS_PORT=9464        serve them on http://0.0.0.0:9464/metrics
+    GRAPH_TRACE_FILE=trace.jsonl   append one JSON line per node run and LLM call
+
+Summarize a trace, to see which node eats the latency budget:
+    python -m common.graph_metrics trace.jsonl
+"""
+
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+GRAPH_METRICS = os.getenv("GRAPH_METRICS", "false").lower() == "true"
+GRAPH_METRICS_PORT = os.getenv("GRAPH_METRICS_PORT")
+GRAPH_TRACE_FILE = os.getenv("GRAPH_TRACE_FILE")
+
+# USD per 1M tokens: prompt, cached prompt, completion. Versioned names such
+# as gpt-4o-mini-2024-07-18 use the price of their longest matching prefix.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
+
+# Upper bounds in seconds of the latency histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The tail of a streamed response kept to find its usage chunk
+STREAM_TAIL_BYTES = 8192
+
+
+def model_price(model: str) -> Optional[Tuple[float, float, float]]:
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return None
+
+
+def estimate_cost(model: str, prompt: int, completion: int, cached: int) -> float:
+    """Estimated USD cost of a call, 0 for models without a known price."""
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    prompt_price, cached_price, completion_price = price
+    return (
+        (prompt - cached) * prompt_price
+        + cached * cached_price
+        + completion * completion_price
+    ) / 1_000_000
+
+
+class Usage:
+    """Tokens, cost and rate limit wait of one or more LLM calls."""
+
+    __slots__ = ("calls", "queue_wait", "prompt", "completion", "cached", "cost")
+
+    def __init__(self):
+        self.calls = 0
+        self.queue_wait = 0.0
+        self.prompt = 0
+        self.completion = 0
+        self.cached = 0
+        self.cost = 0.0
+
+    def add(self, other: "Usage"):
+        self.calls += other.calls
+        self.queue_wait += other.queue_wait
+        self.prompt += other.prompt
+        self.completion += other.completion
+        self.cached += other.cached
+        self.cost += other.cost
+
+    def fields(self) -> dict:
+        return {
+            "queue_wait_ms": round(self.queue_wait * 1000, 3),
+            "prompt_tokens": self.prompt,
+            "completion_tokens": self.completion,
+            "cached_tokens": self.cached,
+            "cost_usd": round(self.cost, 8),
+        }
+
+
+class NodeRun:
+    """A node being run, the LLM calls made from it add their usage here."""
+
+    __slots__ = ("graph", "node", "usage")
+
+    def __init__(self, graph: str, node: str):
+        self.graph = graph
+        self.node = node
+        self.usage = Usage()
+
+
+_node_run: contextvars.ContextVar[Optional[NodeRun]] = contextvars.ContextVar(
+    "graph_node_run", default=None
+)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return (
+        "{"
+        + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+        + "}"
+    )
+
+
+class GraphMetrics:
+    """Collects the node and LLM call metrics of the process.
+
+    Args:
+        trace_file: Optional JSONL file every node run and LLM call is appended to
+    """
+
+    def __init__(self, trace_file: Optional[str] = None):
+        self.node_latency: Dict[tuple, Histogram] = defaultdict(Histogram)
+        self.node_errors: Dict[tuple, int] = defaultdict(int)
+        self.llm_latency: Dict[tuple, Histogram] = defaultdict(Histogram)
+        self.llm_usage: Dict[tuple, Usage] = defaultdict(Usage)
+        self._lock = threading.Lock()
+        self._trace = open(trace_file, "a", buffering=1) if trace_file else None
+
+    def _write(self, event: dict):
+        if self._trace is not None:
+            line = json.dumps(event)
+            with self._lock:
+                self._trace.write(line + "\n")
+
+    def observe_node(self, run: NodeRun, seconds: float, error: Optional[str]):
+        key = (run.graph, run.node)
+        with self._lock:
+            self.node_latency[key].observe(seconds)
+            if error:
+                self.node_errors[key] += 1
+        self._write(
+            {
+                "ts": time.time(),
+                "type": "node",
+                "graph": run.graph,
+                "node": run.node,
+                "wall_ms": round(seconds * 1000, 3),
+                "llm_calls": run.usage.calls,
+                **run.usage.fields(),
+                "error": error,
+            }
+        )
+
+    def observe_llm(
+        self, run: Optional[NodeRun], model: str, seconds: float, usage: Usage
+    ):
+        graph, node = (run.graph, run.node) if run else ("", "")
+        key = (graph, node, model)
+        with self._lock:
+            self.llm_latency[key].observe(seconds)
+            self.llm_usage[key].add(usage)
+            if run:
+                run.usage.add(usage)
+        self._write(
+            {
+                "ts": time.time(),
+                "type": "llm",
+                "graph": graph,
+                "node": node,
+                "model": model,
+                "wall_ms": round(seconds * 1000, 3),
+                **usage.fields(),
+            }
+        )
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(name: str, help: str, series: Dict[tuple, Histogram], names):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in series.items():
+                labels = dict(zip(names, key))
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    bucket = format_labels({**labels, "le": str(bound)})
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                bucket = format_labels({**labels, "le": "+Inf"})
+                lines.append(f"{name}_bucket{bucket} {hist.count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {hist.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {hist.count}")
+
+        def counter(name: str, help: str, values: Dict[tuple, float]):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in values.items():
+                lines.append(f"{name}{format_labels(dict(labels))} {value}")
+
+        llm_names = ("graph", "node", "model")
+        with self._lock:
+            histogram(
+                "graph_node_duration_seconds",
+                "Wall time of graph node runs.",
+                self.node_latency,
+                ("graph", "node"),
+            )
+            counter(
+                "graph_node_errors_total",
+                "Graph node runs that raised.",
+                {
+                    (("graph", graph), ("node", node)): count
+                    for (graph, node), count in self.node_errors.items()
+                },
+            )
+            histogram(
+                "llm_request_duration_seconds",
+                "Wall time of LLM calls, rate limit wait included.",
+                self.llm_latency,
+                llm_names,
+            )
+            usage = {
+                tuple(zip(llm_names, key)): value
+                for key, value in self.llm_usage.items()
+            }
+            counter(
+                "llm_queue_wait_seconds_total",
+                "Time LLM calls waited for the rate limits.",
+                {labels: u.queue_wait for labels, u in usage.items()},
+            )
+            counter(
+                "llm_tokens_total",
+                "Tokens of LLM calls, cached ones are also counted as prompt.",
+                {
+                    (*labels, ("kind", kind)): getattr(u, kind)
+                    for labels, u in usage.items()
+                    for kind in ("prompt", "completion", "cached")
+                },
+            )
+            counter(
+                "llm_cost_usd_total",
+                "Estimated cost of LLM calls in USD.",
+                {labels: u.cost for labels, u in usage.items()},
+            )
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[GraphMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Optional[GraphMetrics]:
+    """The metrics of the process, None unless GRAPH_METRICS is on."""
+    global _metrics
+    if _metrics is not None or not GRAPH_METRICS:
+        return _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = GraphMetrics(GRAPH_TRACE_FILE)
+            if GRAPH_METRICS_PORT:
+                serve(_metrics, int(GRAPH_METRICS_PORT))
+        return _metrics
+
+
+def render_metrics() -> str:
+    metrics = get_metrics()
+    return metrics.render() if metrics else ""
+
+
+def serve(
+    metrics: GraphMetrics, port: int, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serve GET /metrics on a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="graph-metrics", daemon=True
+    ).start()
+    print(f"📈 metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def instrument_node(graph: str, node: str, fn: Callable) -> Callable:
+    """Record the runs of a node function, sync or async. Returns `fn` itself when metrics are off."""
+    metrics = get_metrics()
+    if metrics is None:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            run = NodeRun(graph, node)
+            token = _node_run.set(run)
+            start = time.perf_counter()
+            error = None
+            try:
+                return await fn(*args, **kwargs)
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                _node_run.reset(token)
+                metrics.observe_node(run, time.perf_counter() - start, error)
+
+        return async_wrapper
+
+    # wraps() keeps the signature, which LangGraph reads to pass config and writer
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        run = NodeRun(graph, node)
+        token = _node_run.set(run)
+        start = time.perf_counter()
+        error = None
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _node_run.reset(token)
+            metrics.observe_node(run, time.perf_counter() - start, error)
+
+    return wrapper
+
+
+class LLMCall:
+    """An LLM request in flight, from the first attempt to the end of its body."""
+
+    __slots__ = ("metrics", "run", "start", "queue_wait")
+
+    def __init__(self, metrics: GraphMetrics):
+        self.metrics = metrics
+        self.run = _node_run.get()
+        self.start = time.perf_counter()
+        self.queue_wait = 0.0
+
+    def finish(self, body: Optional[dict]):
+        usage = Usage()
+        usage.calls = 1
+        usage.queue_wait = self.queue_wait
+        model = "unknown"
+        if body:
+            model = body.get("model") or model
+            tokens = body.get("usage") or {}
+            usage.prompt = tokens.get("prompt_tokens") or 0
+            usage.completion = tokens.get("completion_tokens") or 0
+            usage.cached = (tokens.get("prompt_tokens_details") or {}).get(
+                "cached_tokens"
+            ) or 0
+            usage.cost = estimate_cost(
+                model, usage.prompt, usage.completion, usage.cached
+            )
+        self.metrics.observe_llm(
+            self.run, model, time.perf_counter() - self.start, usage
+        )
+
+
+def start_llm_call() -> Optional[LLMCall]:
+    """Start timing a request, None when metrics are off."""
+    metrics = get_metrics()
+    return LLMCall(metrics) if metrics else None
+
+
+def last_usage_event(tail: bytes) -> Optional[dict]:
+    """The last server-sent event of a stream that reports its usage."""
+    for line in reversed(tail.split(b"\n")):
+        if line.startswith(b"data: {") and b'"usage"' in line:
+            try:
+                event = json.loads(line[6:])
+            except ValueError:
+                continue
+            if event.get("usage"):
+                return event
+    return None
+
+
+class MeteredStream(httpx.SyncByteStream):
+    """Passes a streamed body through and finishes the call when it is closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, call: LLMCall):
+        self.stream = stream
+        self.call = call
+        self.tail = b""
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.tail = (self.tail + chunk)[-STREAM_TAIL_BYTES:]
+            yield chunk
+
+    def close(self):
+        self.stream.close()
+        self.call.finish(last_usage_event(self.tail))
+
+
+class AsyncMeteredStream(httpx.AsyncByteStream):
+    """The asyncio version of MeteredStream."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, call: LLMCall):
+        self.stream = stream
+        self.call = call
+        self.tail = b""
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.tail = (self.tail + chunk)[-STREAM_TAIL_BYTES:]
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+        self.call.finish(last_usage_event(self.tail))
+
+
+def finish_llm_call(
+    call: Optional[LLMCall], response: httpx.Response, stream: bool
+) -> httpx.Response:
+    """Record a finished request, a streamed one once its body has been read."""
+    if call is None:
+        return response
+    if stream and response.status_code < 400:
+        if isinstance(response.stream, httpx.AsyncByteStream):
+            response.stream = AsyncMeteredStream(response.stream, call)
+        else:
+            response.stream = MeteredStream(response.stream, call)
+        return response
+
+    try:
+        body = json.loads(response.content)
+    except (ValueError, httpx.ResponseNotRead):
+        body = None
+    call.finish(body if isinstance(body, dict) else None)
+    return response
+
+
+def read_trace(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a graph metrics trace")
+    parser.add_argument("trace", help="JSONL file written with GRAPH_TRACE_FILE")
+    parser.add_argument("--graph", help="only the nodes of this graph")
+    args = parser.parse_args()
+
+    runs = defaultdict(list)
+    for event in read_trace(args.trace):
+        if event["type"] == "node" and args.graph in (None, event["graph"]):
+            runs[(event["graph"], event["node"])].append(event)
+    if not runs:
+        print("no node runs in the trace")
+        return
+
+    total = sum(event["wall_ms"] for events in runs.values() for event in events)
+    print(
+        f"{'graph/node':<36}{'runs':>7}{'share':>8}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'wait ms':>10}{'tokens':>10}{'cost $':>10}"
+    )
+    # the nodes that spend the most time first
+    for (graph, node), events in sorted(
+        runs.items(), key=lambda item: -sum(e["wall_ms"] for e in item[1])
+    ):
+        walls = [event["wall_ms"] for event in events]
+        tokens = sum(e["prompt_tokens"] + e["completion_tokens"] for e in events)
+        print(
+            f"{f'{graph}/{node}':<36}{len(events):>7}"
+            f"{sum(walls) / total:>8.1%}{percentile(walls, 0.5):>10.1f}"
+            f"{percentile(walls, 0.95):>10.1f}"
+            f"{sum(e['queue_wait_ms'] for e in events):>10.1f}"
+            f"{tokens:>10,}{sum(e['cost_usd'] for e in events):>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
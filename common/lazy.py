@@ -0,0 +1,45 @@
+import threading
+from functools import wraps
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def once(fn: Callable[[], T]) -> Callable[[], T]:
+    """Cache the result of a function without arguments, built by its first caller.
+
+    Callers arriving while it is being built wait for it instead of building
+    another one, so it can be warmed up on a background thread. A call that
+    raises caches nothing and the next call tries again.
+    """
+    lock = threading.Lock()
+    result = []
+
+    @wraps(fn)
+    def wrapper() -> T:
+        if not result:
+            with lock:
+                # another thread may have built it while we waited
+                if not result:
+                    result.append(fn())
+        return result[0]
+
+    return wrapper
+
+
+def warm_up(*fns: Callable[[], object]) -> threading.Thread:
+    """Call `once` functions on a background thread, so they are ready by their first use.
+
+    A failure is left to the first real call, which tries again and raises it.
+    """
+
+    def run():
+        for fn in fns:
+            try:
+                fn()
+            except Exception:
+                return
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
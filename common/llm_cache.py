@@ -0,0 +1,232 @@
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+# Turns a string into its embedding vector
+Embedder = Callable[[str], List[float]]
+
+
+@dataclass
+class CacheEntry:
+    value: str
+    expires_at: float
+    namespace: str
+    embedding: Optional[np.ndarray] = None
+
+
+def hash_json(obj) -> str:
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class LLMCache:
+    """Two tier cache for LLM calls made by graph nodes.
+
+    The exact tier is keyed by a hash of the model, the messages and the
+    response_format. On an exact miss, the semantic tier embeds the last user
+    message and reuses a cached response whose question has a cosine
+    similarity of at least `similarity_threshold`. It only looks at entries
+    with the same model, response_format and earlier messages (the namespace),
+    so a cached answer is never reused under a different system prompt.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `max_entries`. When `path` is given, the cache is loaded
+    from and saved to that file.
+
+    Args:
+        path: Optional file used to persist the cache between runs
+        max_entries: Maximum number of cached responses
+        ttl: Seconds after which a cached response expires
+        embed: Optional embedder, enables the semantic tier
+        similarity_threshold: Minimum cosine similarity for a semantic hit
+        save_every: Number of new entries after which the cache is saved
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 1024,
+        ttl: float = 24 * 60 * 60,
+        embed: Optional[Embedder] = None,
+        similarity_threshold: float = 0.95,
+        save_every: int = 10,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.save_every = save_every
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        # namespace -> (keys, normalized embedding matrix), rebuilt lazily when stale
+        self._index: Dict[str, tuple] = {}
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        if path:
+            if os.path.exists(path):
+                self.load()
+            atexit.register(self.save)
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Return the normalized embedding of a text.
+
+        The same question is usually embedded by several nodes, so the last
+        few embeddings are kept around.
+        """
+        with self._lock:
+            embedding = self._embeddings.get(text)
+        if embedding is None:
+            embedding = np.asarray(self.embed(text), dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+            with self._lock:
+                self._embeddings[text] = embedding
+                if len(self._embeddings) > 128:
+                    self._embeddings.popitem(last=False)
+        return embedding
+
+    def _evict(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._index.pop(entry.namespace, None)
+
+    def _get_exact(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time():
+            self._evict(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def _get_semantic(
+        self, namespace: str, embedding: np.ndarray
+    ) -> Optional[CacheEntry]:
+        index = self._index.get(namespace)
+        if index is None:
+            keys = [
+                key
+                for key, entry in self.entries.items()
+                if entry.namespace == namespace and entry.embedding is not None
+            ]
+            if not keys:
+                return None
+            matrix = np.stack([self.entries[key].embedding for key in keys])
+            index = self._index[namespace] = (keys, matrix)
+
+        keys, matrix = index
+        similarities = matrix @ embedding
+        candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+        # most similar first, an expired match is evicted and the next one tried
+        for i in candidates[np.argsort(-similarities[candidates])]:
+            entry = self._get_exact(keys[i])
+            if entry is not None:
+                return entry
+        return None
+
+    def get_or_call(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        response_format: Type[BaseModel],
+        call: Callable[[], BaseModel],
+    ) -> BaseModel:
+        """Return the cached response for this request, or make the call and cache it.
+
+        Args:
+            model: The model the request is sent to
+            messages: The chat messages of the request
+            response_format: The pydantic model the response is parsed into
+            call: Makes the actual LLM call and returns the parsed response
+        """
+        schema = response_format.model_json_schema()
+        key = hash_json([model, messages, schema])
+        namespace = hash_json([model, messages[:-1], schema])
+
+        with self._lock:
+            entry = self._get_exact(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return response_format.model_validate_json(entry.value)
+
+        embedding = None
+        if self.embed is not None and messages and messages[-1]["role"] == "user":
+            embedding = self.embed_text(messages[-1]["content"])
+            with self._lock:
+                entry = self._get_semantic(namespace, embedding)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return response_format.model_validate_json(entry.value)
+
+        response = call()
+        with self._lock:
+            self.misses += 1
+            self._evict(key)
+            self.entries[key] = CacheEntry(
+                value=response.model_dump_json(),
+                expires_at=time.time() + self.ttl,
+                namespace=namespace,
+                embedding=embedding,
+            )
+            self._index.pop(namespace, None)
+            while len(self.entries) > self.max_entries:
+                self._evict(next(iter(self.entries)))
+            self._unsaved += 1
+            if self.path and self._unsaved >= self.save_every:
+                self._save()
+        return response
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "entries": len(self.entries),
+        }
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.entries, f)
+        # replace the old file in one step so a crash never leaves a torn cache behind
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def save(self):
+        with self._lock:
+            if self.path:
+                self._save()
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            entries = pickle.load(f)
+        now = time.time()
+        with self._lock:
+            self.entries = OrderedDict(
+                (key, entry)
+                for key, entry in entries.items()
+                if entry.expires_at >= now
+            )
+            self._index.clear()
@@ -0,0 +1,456 @@
+"""One chat interface over OpenAI, Gemini and Ollama, routed by measured latency.
+
+Every backend is a provider and model with a capability tier. The gateway
+keeps rolling latency and error stats per backend, sends each request to
+the fastest healthy backend of at least the requested tier, hedges it to
+the next one when it runs slower than usual, and fails over on errors.
+
+    gateway = LLMGateway.from_env()
+    result = gateway.chat([{"role": "user", "content": "Why is the sky blue?"}])
+    print(result.content, result.provider, result.latency)
+
+Try the routing from the repository root:
+    python -m common.llm_gateway "Why is the sky blue?" --tier small
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Capability tiers, a request may be served by any backend of its tier or above
+TIERS = {"small": 1, "standard": 2, "large": 3}
+
+
+@dataclass
+class ChatResult:
+    content: str
+    provider: str
+    model: str
+    latency: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # answered by another backend than the first choice, as a hedge or a failover
+    hedged: bool = False
+
+
+class NoBackendError(RuntimeError):
+    pass
+
+
+class Backend:
+    """A provider and model behind the common chat interface."""
+
+    provider = ""
+
+    def __init__(self, client, model: str, tier: str = "standard"):
+        if tier not in TIERS:
+            raise ValueError(f"tier must be one of {', '.join(TIERS)}")
+        self.client = client
+        self.model = model
+        self.tier = tier
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+    def chat(self, messages: List[Dict[str, str]], json_mode: bool = False):
+        """Return (content, input_tokens, output_tokens)."""
+        raise NotImplementedError
+
+
+class OpenAIBackend(Backend):
+    provider = "openai"
+
+    def chat(self, messages, json_mode=False):
+        kwargs = {"response_format": {"type": "json_object"}} if json_mode else {}
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, **kwargs
+        )
+        usage = response.usage
+        return (
+            response.choices[0].message.content,
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+        )
+
+
+class GeminiBackend(Backend):
+    provider = "gemini"
+
+    def chat(self, messages, json_mode=False):
+        from google.genai import types
+
+        # Gemini takes the system prompt apart, and calls the assistant "model"
+        system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        contents = [
+            types.Content(
+                role="model" if m["role"] == "assistant" else "user",
+                parts=[types.Part(text=m["content"])],
+            )
+            for m in messages
+            if m["role"] != "system"
+        ]
+        config = types.GenerateContentConfig(
+            system_instruction=system or None,
+            response_mime_type="application/json" if json_mode else None,
+        )
+        response = self.client.models.generate_content(
+            model=self.model, contents=contents, config=config
+        )
+        usage = response.usage_metadata
+        return (
+            response.text,
+            (usage.prompt_token_count or 0) if usage else 0,
+            (usage.candidates_token_count or 0) if usage else 0,
+        )
+
+
+class OllamaBackend(Backend):
+    provider = "ollama"
+
+    def chat(self, messages, json_mode=False):
+        response = self.client.chat(
+            model=self.model, messages=messages, format="json" if json_mode else None
+        )
+        return (
+            response["message"]["content"],
+            response.get("prompt_eval_count") or 0,
+            response.get("eval_count") or 0,
+        )
+
+
+class BackendStats:
+    """Rolling latency and error rate of one backend.
+
+    An exponentially weighted average of the latencies, which follows a spike
+    within a call or two, is used for routing. The p95 of the last `window`
+    successful calls decides when to hedge. `failure_limit`
+    failures in a row open a circuit that keeps the backend out of
+    rotation for `cooldown` seconds. The circuit is then half-open: a single
+    request probes the backend, its success closes the circuit and its
+    failure opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        window: int = 50,
+        failure_limit: int = 3,
+        cooldown: float = 30,
+        smoothing: float = 0.3,
+    ):
+        self.latencies = deque(maxlen=window)
+        self.average: Optional[float] = None
+        self.smoothing = smoothing
+        self.outcomes = deque(maxlen=window)
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.last_used = 0.0
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def record(self, latency: Optional[float], error: bool, probe: bool = False):
+        if probe:
+            self.probing = False
+        self.calls += 1
+        self.last_used = time.monotonic()
+        self.outcomes.append(error)
+        if error:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_limit:
+                self.open_until = time.monotonic() + self.cooldown
+        else:
+            self.consecutive_failures = 0
+            self.latencies.append(latency)
+            self.update_average(latency)
+
+    def update_average(self, latency: float):
+        if self.average is None:
+            self.average = latency
+        else:
+            self.average += self.smoothing * (latency - self.average)
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_limit:
+            return "closed"
+        if time.monotonic() < self.open_until:
+            return "open"
+        return "half-open"
+
+    @property
+    def healthy(self) -> bool:
+        """Closed, or half-open with no probe in flight."""
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.probing)
+
+    def admit(self) -> bool:
+        """Whether a request may be sent now, claiming the probe of a half-open circuit."""
+        state = self.state
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return state == "closed"
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LLMGateway:
+    """Routes chat requests over backends by tier, latency and health.
+
+    Backends of at least the requested tier are ranked by their expected
+    latency: the moving average, inflated by the error rate. Backends without
+    recent measurements, or unused for `stale_after` seconds, are expected
+    to take `default_latency`, so a backend that had a spike is tried again
+    once its peers are slower than that. Ties keep the order of `backends`.
+
+    A request runs on the best backend, and when it takes longer than the
+    backend's p95 (at least `min_hedge_delay`) the same request is also sent
+    to the runner-up, the first answer wins. Errors fail over down the
+    ranking.
+
+    Args:
+        backends: The backends in order of preference
+        default_latency: Expected seconds per call of an unmeasured backend
+        stale_after: Seconds after which a backend's stats are not trusted
+        hedge: Send slow requests to a second backend
+        min_hedge_delay: Minimum seconds to wait before hedging
+        max_workers: Threads running backend calls
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        default_latency: float = 2.0,
+        stale_after: float = 60,
+        hedge: bool = True,
+        min_hedge_delay: float = 0.5,
+        max_workers: int = 16,
+    ):
+        self.backends = backends
+        self.stats = {backend.name: BackendStats() for backend in backends}
+        self.default_latency = default_latency
+        self.stale_after = stale_after
+        self.hedge = hedge
+        self.min_hedge_delay = min_hedge_delay
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llm-gateway"
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "LLMGateway":
+        """Gateway over every provider configured in the environment.
+
+        OpenAI with OPENAI_API_KEY, Gemini with GEMINI_API_KEY, and Ollama
+        with OLLAMA_HOST (its model from OLLAMA_MODEL, default gemma3:1b).
+        """
+        backends: List[Backend] = []
+        if os.getenv("OPENAI_API_KEY"):
+            from common.request_scheduler import create_openai_client
+
+            openai_client = create_openai_client()
+            backends.append(OpenAIBackend(openai_client, "gpt-4o-mini", "standard"))
+        if os.getenv("GEMINI_API_KEY"):
+            from google import genai
+
+            client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+            backends.append(GeminiBackend(client, "gemini-2.0-flash", "standard"))
+        if os.getenv("OLLAMA_HOST"):
+            import ollama
+
+            client = ollama.Client(host=os.getenv("OLLAMA_HOST"))
+            model = os.getenv("OLLAMA_MODEL", "gemma3:1b")
+            backends.append(OllamaBackend(client, model, "small"))
+        if os.getenv("OPENAI_API_KEY"):
+            # last, so it only takes standard traffic when the cheaper backends can't
+            backends.append(OpenAIBackend(openai_client, "gpt-4o", "large"))
+        if not backends:
+            raise NoBackendError(
+                "no LLM provider configured, set OPENAI_API_KEY, GEMINI_API_KEY or OLLAMA_HOST"
+            )
+        return cls(backends, **kwargs)
+
+    def expected_latency(self, backend: Backend) -> float:
+        stats = self.stats[backend.name]
+        latency = stats.average
+        if latency is None or time.monotonic() - stats.last_used > self.stale_after:
+            latency = min(latency or self.default_latency, self.default_latency)
+        # a backend failing half its calls costs about two attempts per answer
+        return latency / max(1 - stats.error_rate, 0.1)
+
+    def ranked(self, tier: str = "standard") -> List[Backend]:
+        """Healthy backends of at least `tier`, fastest first."""
+        with self._lock:
+            candidates = [
+                (self.expected_latency(backend), index, backend)
+                for index, backend in enumerate(self.backends)
+                if TIERS[backend.tier] >= TIERS[tier]
+                and self.stats[backend.name].healthy
+            ]
+        return [backend for _, _, backend in sorted(candidates)]
+
+    def _call(
+        self, backend: Backend, messages, json_mode: bool, probe: bool = False
+    ) -> ChatResult:
+        start = time.perf_counter()
+        try:
+            content, input_tokens, output_tokens = backend.chat(messages, json_mode)
+        except Exception:
+            with self._lock:
+                self.stats[backend.name].record(None, error=True, probe=probe)
+            raise
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.stats[backend.name].record(latency, error=False, probe=probe)
+        return ChatResult(
+            content,
+            backend.provider,
+            backend.model,
+            latency,
+            input_tokens,
+            output_tokens,
+        )
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        with self._lock:
+            p95 = self.stats[backend.name].percentile(0.95)
+        return max(p95 or self.default_latency, self.min_hedge_delay)
+
+    def chat(
+        self,
+        messages: List[Dict[str, str]],
+        tier: str = "standard",
+        json_mode: bool = False,
+    ) -> ChatResult:
+        """Answer a chat request on the best backend for `tier`."""
+        candidates = self.ranked(tier)
+        if not candidates:
+            raise NoBackendError(f"no healthy backend for the {tier} tier")
+
+        running: Dict[Future, Backend] = {}
+        started = time.perf_counter()
+        errors = []
+
+        def start_next(hedged: bool = False) -> bool:
+            while candidates:
+                index = 0
+                if hedged:
+                    # a spike usually hits a whole provider, so hedge to another one
+                    index = next(
+                        (
+                            i
+                            for i, backend in enumerate(candidates)
+                            if backend.provider != primary.provider
+                        ),
+                        0,
+                    )
+                backend = candidates.pop(index)
+                with self._lock:
+                    stats = self.stats[backend.name]
+                    probe = stats.state == "half-open"
+                    if not stats.admit():
+                        # another request took the probe since the ranking
+                        continue
+                    if hedged:
+                        stats.hedges += 1
+                future = self.executor.submit(
+                    self._call, backend, messages, json_mode, probe
+                )
+                running[future] = backend
+                return True
+            return False
+
+        primary = candidates[0]
+        if not start_next():
+            raise NoBackendError(f"no healthy backend for the {tier} tier")
+        while running:
+            timeout = None
+            if self.hedge and len(running) == 1 and candidates and not errors:
+                timeout = self._hedge_delay(primary)
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # the request is slower than this backend usually is, race a second one
+                start_next(hedged=True)
+                continue
+            for future in done:
+                backend = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    if not running and candidates:
+                        start_next()
+                    continue
+                with self._lock:
+                    self.stats[backend.name].wins += 1
+                    if primary in running.values():
+                        # don't wait for the slow call to finish to route away from it
+                        elapsed = time.perf_counter() - started
+                        self.stats[primary.name].update_average(elapsed)
+                result.hedged = backend is not primary
+                # a losing hedge still finishes in the background and records its stats
+                return result
+        raise NoBackendError(f"every backend failed: {'; '.join(errors)}")
+
+    def report(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for backend in self.backends:
+                stats = self.stats[backend.name]
+                p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+                lines.append(
+                    f"{backend.name} ({backend.tier}): {stats.calls} calls, "
+                    f"p50 {p50 or 0:.2f}s, p95 {p95 or 0:.2f}s, "
+                    f"errors {stats.error_rate:.0%}, hedged to {stats.hedges}, "
+                    f"won {stats.wins}"
+                    f"{'' if stats.state == 'closed' else f', circuit {stats.state}'}"
+                )
+        return lines
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Send a prompt through the LLM gateway."
+    )
+    parser.add_argument("prompt")
+    parser.add_argument("--tier", choices=list(TIERS), default="small")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    gateway = LLMGateway.from_env()
+    for _ in range(args.repeat):
+        result = gateway.chat([{"role": "user", "content": args.prompt}], args.tier)
+        print(
+            f"🤖 {result.provider}/{result.model} in {result.latency:.2f}s"
+            f"{' (hedged)' if result.hedged else ''}: {result.content}"
+        )
+    for line in gateway.report():
+        print(f"📊 {line}")
+    gateway.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Storage formats, with the bytes each one takes per dimension
+DTYPES = {"float32": 4, "float16": 2, "int8": 1}
+
+# Rows scored at once when int8 vectors are widened to float32
+SCORE_CHUNK = 16384
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization, returns the codes and their scales."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def encode(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Store normalized float32 vectors as `dtype`, int8 codes come with their scales."""
+    if dtype == "int8":
+        return quantize_int8(vectors)
+    return vectors.astype(dtype), None
+
+
+def score_rows(
+    queries: np.ndarray, vectors: np.ndarray, scales: Optional[np.ndarray], index
+) -> np.ndarray:
+    """Cosine scores of normalized queries against the rows `index` of stored vectors."""
+    block = np.asarray(vectors[index], dtype=np.float32)
+    scores = queries @ block.T
+    if scales is not None:
+        scores *= scales[index]
+    return scores
+
+
+def decode(vectors: np.ndarray, scales: Optional[np.ndarray], index) -> np.ndarray:
+    """The rows `index` of stored vectors back as float32."""
+    block = np.asarray(vectors[index], dtype=np.float32)
+    if scales is not None:
+        block *= np.asarray(scales[index])[..., None]
+    return block
+
+
+def sign_bits(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign of every dimension into bits, as (n, words) uint64 for fast hamming distances."""
+    bits = np.packbits(vectors > 0, axis=1)
+    padding = -bits.shape[1] % 8
+    if padding:
+        bits = np.pad(bits, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def hamming(query_bits: np.ndarray, bits: np.ndarray) -> np.ndarray:
+    """(m, n) hamming distances between m queries' sign bits and n rows' (words, n) bits."""
+    distances = np.zeros((len(query_bits), bits.shape[1]), dtype=np.uint16)
+    # one 64-bit word at a time keeps the intermediate arrays at (m, n), and
+    # reusing them avoids allocating per word
+    xor = np.empty(distances.shape, dtype=np.uint64)
+    count = np.empty(distances.shape, dtype=np.uint8)
+    for word in range(len(bits)):
+        np.bitwise_xor(query_bits[:, word, None], bits[word], out=xor)
+        distances += np.bitwise_count(xor, out=count)
+    return distances
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k highest scores along the last axis, best first."""
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+    return np.take_along_axis(top, order, axis=-1)
+
+
+class Shard:
+    """One memory-mapped block of quantized vectors, with their scales and sign bits."""
+
+    def __init__(self, prefix: str, dtype: str, binary: bool):
+        self.vectors = np.load(f"{prefix}.npy", mmap_mode="r")
+        self.scales = np.load(f"{prefix}.scales.npy") if dtype == "int8" else None
+        self.bits = np.load(f"{prefix}.bits.npy", mmap_mode="r") if binary else None
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def scores(
+        self, queries: np.ndarray, rows: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Cosine scores of normalized queries against all rows, or the given ones."""
+        scores = []
+        total = len(self) if rows is None else len(rows)
+        for start in range(0, total, SCORE_CHUNK):
+            index = (
+                slice(start, start + SCORE_CHUNK)
+                if rows is None
+                else rows[start : start + SCORE_CHUNK]
+            )
+            scores.append(score_rows(queries, self.vectors, self.scales, index))
+        return (
+            np.concatenate(scores, axis=-1)
+            if scores
+            else np.empty((len(queries), 0), np.float32)
+        )
+
+    def candidate_scores(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine scores of every query against its own (m, p) candidate rows."""
+        scores = np.empty(rows.shape, dtype=np.float32)
+        # bound the gathered (queries, p, dims) block to about SCORE_CHUNK rows
+        step = max(1, SCORE_CHUNK // max(rows.shape[1], 1))
+        for start in range(0, len(rows), step):
+            index = rows[start : start + step]
+            block = np.asarray(self.vectors[index], dtype=np.float32)
+            part = np.einsum("qd,qpd->qp", queries[start : start + step], block)
+            if self.scales is not None:
+                part *= self.scales[index]
+            scores[start : start + step] = part
+        return scores
+
+
+class QuantizedVectorStore:
+    """Compact, append-only store of normalized embeddings split into memory-mapped shards.
+
+    Vectors are stored as float32, float16 or int8 (with a float32 scale per
+    vector), which is 4, 2 or 1 byte per dimension. With `binary` enabled
+    the sign of every dimension is kept as well, and searches first rank
+    rows by the hamming distance of those bits, and only score the best
+    `prefilter` rows per query with the quantized vectors. The bits are 1/8
+    of an int8 vector, so this pays off when the shards are larger than the
+    page cache, in memory a full int8 scan is faster and more accurate.
+
+    Searches take a batch of queries and score them against a shard with one
+    matrix product, the top k of every shard are merged at the end. Vectors
+    added since the last full shard are searched too, exactly in float32,
+    and are only written to disk by `flush()`.
+
+    Args:
+        path: Directory holding the shards and the manifest
+        dims: Dimension of the vectors, required when creating a new store
+        dtype: One of float32, float16 or int8
+        binary: Keep sign bits for hamming prefiltering
+        shard_size: Number of vectors per shard file
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dims: Optional[int] = None,
+        dtype: str = "int8",
+        binary: bool = False,
+        shard_size: int = 65536,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+        self.path = path
+        self.manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            dims, dtype = manifest["dims"], manifest["dtype"]
+            binary, shard_size = manifest["binary"], manifest["shard_size"]
+            self.ids: List[str] = manifest["ids"]
+            shard_count = manifest["shards"]
+        else:
+            if dims is None:
+                raise ValueError("dims is required to create a store")
+            self.ids = []
+            shard_count = 0
+        self.dims = dims
+        self.dtype = dtype
+        self.binary = binary
+        self.shard_size = shard_size
+        self.shards = [
+            Shard(self._prefix(i), dtype, binary) for i in range(shard_count)
+        ]
+        # blocks of normalized float32 vectors not written to a shard yet
+        self._pending: List[np.ndarray] = []
+        self._pending_ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self._pending_ids)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        size = self.dims * DTYPES[self.dtype]
+        if self.dtype == "int8":
+            size += 4
+        if self.binary:
+            size += -(-self.dims // 64) * 8
+        return size
+
+    def _id(self, row: int) -> str:
+        # rows past the shards are the queued vectors, in the order they were added
+        if row < len(self.ids):
+            return self.ids[row]
+        return self._pending_ids[row - len(self.ids)]
+
+    def _prefix(self, shard: int) -> str:
+        return os.path.join(self.path, f"shard-{shard:05d}")
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Queue vectors for writing, full shards are written right away.
+
+        Queued vectors can be searched at once, call `flush()` to persist them.
+        """
+        self._pending.append(normalize(np.atleast_2d(vectors)))
+        self._pending_ids.extend(ids)
+        while len(self._pending_ids) >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def _pending_block(self) -> np.ndarray:
+        # merged lazily, so adding one vector at a time does not copy the rest
+        if len(self._pending) > 1:
+            self._pending = [np.concatenate(self._pending)]
+        return self._pending[0]
+
+    def _write_shard(self, rows: int):
+        pending = self._pending_block()
+        vectors, rest = pending[:rows], pending[rows:]
+        self._pending = [rest] if len(rest) else []
+        ids = self._pending_ids[:rows]
+        del self._pending_ids[:rows]
+
+        os.makedirs(self.path, exist_ok=True)
+        prefix = self._prefix(len(self.shards))
+        codes, scales = encode(vectors, self.dtype)
+        np.save(f"{prefix}.npy", codes)
+        if scales is not None:
+            np.save(f"{prefix}.scales.npy", scales)
+        if self.binary:
+            # word-major, so each word of every row is one contiguous scan
+            np.save(f"{prefix}.bits.npy", np.ascontiguousarray(sign_bits(vectors).T))
+        self.shards.append(Shard(prefix, self.dtype, self.binary))
+        self.ids.extend(ids)
+
+    def flush(self):
+        """Write the queued vectors as a last, smaller shard and save the manifest."""
+        if self._pending_ids:
+            self._write_shard(len(self._pending_ids))
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "dims": self.dims,
+                    "dtype": self.dtype,
+                    "binary": self.binary,
+                    "shard_size": self.shard_size,
+                    "shards": len(self.shards),
+                    "ids": self.ids,
+                },
+                f,
+            )
+        os.replace(tmp_path, self.manifest_path)
+
+    def search(
+        self, queries: np.ndarray, k: int = 10, prefilter: Optional[int] = None
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """Return the ids and scores of the k best rows for every query.
+
+        Args:
+            queries: (m, dims) query vectors, or a single (dims,) vector
+            k: Number of results per query
+            prefilter: Rows per shard kept by the sign bit ranking, defaults
+                to 100 * k when the store has sign bits
+        """
+        queries = normalize(np.atleast_2d(queries))
+        use_bits = self.binary and prefilter != 0
+        prefilter = prefilter or 100 * k
+        query_bits = sign_bits(queries) if use_bits else None
+
+        best_rows, best_scores = [], []
+        offset = 0
+        for shard in self.shards:
+            if use_bits and prefilter < len(shard):
+                # rank by hamming distance, then only score the survivors
+                distances = hamming(query_bits, shard.bits)
+                candidates = top_k(-distances.astype(np.int32), prefilter)
+                candidate_scores = shard.candidate_scores(queries, candidates)
+                top = top_k(candidate_scores, k)
+                rows = np.take_along_axis(candidates, top, axis=-1)
+                scores = np.take_along_axis(candidate_scores, top, axis=-1)
+            else:
+                shard_scores = shard.scores(queries)
+                rows = top_k(shard_scores, k)
+                scores = np.take_along_axis(shard_scores, rows, axis=-1)
+            best_rows.append(rows + offset)
+            best_scores.append(scores)
+            offset += len(shard)
+
+        if self._pending_ids:
+            pending_scores = queries @ self._pending_block().T
+            rows = top_k(pending_scores, k)
+            best_rows.append(rows + offset)
+            best_scores.append(np.take_along_axis(pending_scores, rows, axis=-1))
+
+        if not best_rows:
+            return [[] for _ in queries], np.empty((len(queries), 0), np.float32)
+        rows = np.concatenate(best_rows, axis=1)
+        scores = np.concatenate(best_scores, axis=1)
+        top = top_k(scores, k)
+        rows = np.take_along_axis(rows, top, axis=1)
+        scores = np.take_along_axis(scores, top, axis=1)
+        ids = [
+            [self._id(row) for row, score in zip(r, s) if score > -np.inf]
+            for r, s in zip(rows, scores)
+        ]
+        return ids, scores
+
+
+def recall_at_k(found: List[List[str]], expected: List[List[str]]) -> float:
+    """Share of the exact top k ids that a search returned."""
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / max(sum(len(e) for e in expected), 1)
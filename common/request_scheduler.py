@@ -0,0 +1,495 @@
+"""Process-wide scheduling of OpenAI requests under the account's rate limits.
+
+Every client made by `create_openai_client` sends its requests through one
+RequestScheduler, which admits them under token buckets for requests and
+tokens per minute, interactive requests ahead of batch ones. Responses feed
+the x-ratelimit-* headers back into the buckets, and a 429 pauses everyone
+for its retry-after and halves the rates until requests succeed again.
+Retries happen here, with jitter, so the SDK's own retries are turned off.
+With GRAPH_METRICS on, every request is also recorded by common.graph_metrics.
+
+    client = create_openai_client(priority="batch")
+    with request_context(deadline=5):
+        client.chat.completions.create(...)  # DeadlineExceeded if not admitted within 5s
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Set, Tuple
+
+import httpx
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from common.context_window import TOKENS_PER_MESSAGE
+from common.graph_metrics import finish_llm_call, start_llm_call
+from common.tokenizer import count_tokens_or_estimate
+
+# Lower runs first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Statuses worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_priority: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_priority", default=None
+)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def request_context(priority: Optional[str] = None, deadline: Optional[float] = None):
+    """Set the priority, and a deadline in seconds from now, of requests made on this thread."""
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    tokens = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if deadline is not None:
+        tokens.append((_deadline, _deadline.set(time.monotonic() + deadline)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in a rate limit reset header, e.g. "1s", "6m0s" or "20ms"."""
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(
+        float(amount) * units[unit]
+        for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value)
+    )
+
+
+class TokenBucket:
+    """Refills to `per_minute` over a minute, and may go into debt when usage is corrected."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float, slowdown: float):
+        rate = self.per_minute / 60 * slowdown
+        self.level = min(self.per_minute, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, slowdown: float) -> float:
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.per_minute / 60 * slowdown)
+
+
+class RequestScheduler:
+    """Admits requests in priority order under requests and tokens per minute limits.
+
+    The limits start at `requests_per_minute` and `tokens_per_minute` and
+    are replaced by the limits the API reports. A request waits until it is
+    the first in line of the best priority and both buckets can pay for it,
+    or raises DeadlineExceeded once it can no longer be admitted in time.
+    Threads wait with `acquire`, coroutines with `aacquire` in the same line.
+
+    Args:
+        requests_per_minute: Initial request limit
+        tokens_per_minute: Initial token limit, prompt plus requested output
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # share of the limits used, halved on every 429 and regrown on success
+        self.slowdown = 1.0
+        self.paused_until = 0.0
+        self.stats = {
+            "admitted": {priority: 0 for priority in PRIORITIES},
+            "waited": {priority: 0.0 for priority in PRIORITIES},
+            "rate_limited": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+        }
+        self._waiting: List[tuple] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        # (loop, event) of every coroutine waiting in aacquire
+        self._async_waiters: Set[tuple] = set()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        self.requests.refill(now, self.slowdown)
+        self.tokens.refill(now, self.slowdown)
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, self.slowdown),
+            # a request larger than the whole bucket only waits for a full one
+            self.tokens.wait_time(min(tokens, self.tokens.per_minute), self.slowdown),
+        )
+
+    def _notify(self):
+        # called with the lock held, wakes the waiting threads and coroutines
+        self._cond.notify_all()
+        for loop, event in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the loop was closed with the coroutine still waiting
+                pass
+
+    def _try_admit(
+        self, entry: tuple, tokens: int, priority: str, deadline: Optional[float]
+    ) -> Tuple[bool, Optional[float]]:
+        """Admit `entry` if it may go now, called with the lock held.
+
+        Returns whether it was admitted, and else the seconds to wait before
+        trying again, None to wait until notified.
+        """
+        now = time.monotonic()
+        wait = None
+        if self._waiting[0] == entry:
+            wait = self._wait_time(tokens, now)
+            if wait <= 0:
+                heapq.heappop(self._waiting)
+                self.requests.level -= 1
+                self.tokens.level -= tokens
+                return True, None
+        if deadline is not None:
+            if deadline <= now or (wait is not None and now + wait > deadline):
+                raise DeadlineExceeded(
+                    f"{priority} request not admitted within its deadline"
+                )
+            wait = deadline - now if wait is None else wait
+        return False, wait
+
+    def _withdraw(self, entry: tuple, error: BaseException):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+        if isinstance(error, DeadlineExceeded):
+            self.stats["deadline_exceeded"] += 1
+
+    def _admitted(self, priority: str, start: float) -> float:
+        waited = time.monotonic() - start
+        self.stats["admitted"][priority] += 1
+        self.stats["waited"][priority] += waited
+        return waited
+
+    def acquire(
+        self,
+        tokens: int,
+        priority: str = "interactive",
+        deadline: Optional[float] = None,
+    ) -> float:
+        """Block until the request may be sent, `deadline` is a time.monotonic() value.
+
+        Returns the seconds the request waited.
+        """
+        start = time.monotonic()
+        entry = (PRIORITIES[priority], next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    admitted, wait = self._try_admit(entry, tokens, priority, deadline)
+                    if admitted:
+                        break
+                    self._cond.wait(wait)
+            except BaseException as e:
+                self._withdraw(entry, e)
+                raise
+            finally:
+                # the next in line may be able to go, or has become the first
+                self._notify()
+            return self._admitted(priority, start)
+
+    async def aacquire(
+        self,
+        tokens: int,
+        priority: str = "interactive",
+        deadline: Optional[float] = None,
+    ) -> float:
+        """The asyncio version of `acquire`, waiting on the event loop without a thread.
+
+        A cancelled coroutine leaves the line before it is admitted, it never
+        takes budget for a request it does not send.
+        """
+        start = time.monotonic()
+        entry = (PRIORITIES[priority], next(self._sequence))
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    # cleared before the check, a notify after it sets the event again
+                    waiter[1].clear()
+                    admitted, wait = self._try_admit(entry, tokens, priority, deadline)
+                if admitted:
+                    break
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException as e:
+            with self._cond:
+                self._withdraw(entry, e)
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._notify()
+        with self._cond:
+            return self._admitted(priority, start)
+
+    def settle_response(self, estimated: int, response: httpx.Response):
+        """Correct the token bucket with the usage a response reports."""
+        if response.status_code in RETRY_STATUSES:
+            # a rejected request costs nothing, its retry pays again
+            used = 0
+        else:
+            try:
+                used = (json.loads(response.content).get("usage") or {})["total_tokens"]
+            except (ValueError, AttributeError, KeyError):
+                return
+        with self._cond:
+            self.tokens.level -= used - estimated
+            self._notify()
+
+    def record_retry(self):
+        with self._cond:
+            self.stats["retries"] += 1
+
+    def observe(self, status: int, headers: httpx.Headers):
+        """Adapt to the rate limit headers of a response."""
+        with self._cond:
+            now = time.monotonic()
+            for bucket, kind in [(self.requests, "requests"), (self.tokens, "tokens")]:
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                if limit:
+                    bucket.per_minute = float(limit)
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining:
+                    bucket.refill(now, self.slowdown)
+                    # the server has the true count, other processes share it
+                    bucket.level = min(bucket.level, float(remaining))
+                    reset = headers.get(f"x-ratelimit-reset-{kind}")
+                    if float(remaining) <= 0 and reset:
+                        self.paused_until = max(
+                            self.paused_until, now + parse_duration(reset)
+                        )
+
+            if status == 429:
+                self.stats["rate_limited"] += 1
+                self.slowdown = max(self.slowdown / 2, 0.05)
+                retry_after = headers.get("retry-after-ms")
+                delay = (
+                    float(retry_after) / 1000
+                    if retry_after
+                    else float(headers.get("retry-after") or 1)
+                )
+                self.paused_until = max(self.paused_until, now + delay)
+            elif status < 400:
+                self.slowdown = min(self.slowdown * 1.1, 1.0)
+            self._notify()
+
+    def report(self) -> str:
+        with self._cond:
+            admitted = ", ".join(
+                f"{count} {priority} (waited {self.stats['waited'][priority]:.1f}s)"
+                for priority, count in self.stats["admitted"].items()
+            )
+            return (
+                f"admitted {admitted}, {self.stats['rate_limited']} rate limited, "
+                f"{self.stats['retries']} retries, "
+                f"{self.stats['deadline_exceeded']} past their deadline, "
+                f"running at {self.slowdown:.0%} of {self.requests.per_minute:.0f} rpm "
+                f"and {self.tokens.per_minute:.0f} tpm"
+            )
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """The scheduler shared by the whole process, limits from OPENAI_RPM and OPENAI_TPM."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                float(os.getenv("OPENAI_RPM", "500")),
+                float(os.getenv("OPENAI_TPM", "200000")),
+            )
+        return _scheduler
+
+
+def estimate_request_tokens(body: dict) -> int:
+    """Tokens a chat or embeddings request counts against the limit, prompt plus output."""
+    model = body.get("model", "gpt-4o")
+    messages = body.get("messages", [])
+    texts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(
+                part.get("text", "") for part in content if isinstance(part, dict)
+            )
+    inputs = body.get("input", [])
+    texts.extend(
+        [inputs]
+        if isinstance(inputs, str)
+        else [t for t in inputs if isinstance(t, str)]
+    )
+
+    tokens = sum(count_tokens_or_estimate(text, model) for text in texts)
+    # the framing of every chat message, as counted by common.context_window
+    tokens += TOKENS_PER_MESSAGE * len(messages)
+    return tokens + (body.get("max_completion_tokens") or body.get("max_tokens") or 0)
+
+
+def _request_info(request: httpx.Request) -> tuple:
+    try:
+        body = json.loads(request.content) if request.content else {}
+    except (ValueError, UnicodeDecodeError, httpx.RequestNotRead):
+        body = {}
+    return estimate_request_tokens(body), bool(body.get("stream"))
+
+
+def _retry_options(scheduler: RequestScheduler, max_retries: int) -> dict:
+    return dict(
+        retry=retry_if_result(lambda r: r.status_code in RETRY_STATUSES)
+        | retry_if_exception_type(httpx.TransportError),
+        # the scheduler already holds everyone back for a 429's retry-after
+        wait=wait_random_exponential(multiplier=0.5, max=20),
+        stop=stop_after_attempt(max_retries + 1),
+        before_sleep=lambda _: scheduler.record_retry(),
+        # hand the last response to the SDK, which raises the matching error
+        retry_error_callback=lambda state: state.outcome.result(),
+    )
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    """httpx transport sending every request through the process-wide scheduler."""
+
+    def __init__(
+        self,
+        priority: str = "interactive",
+        max_retries: int = 4,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        self.priority = priority
+        self.max_retries = max_retries
+        self.transport = transport or httpx.HTTPTransport()
+        self.scheduler = get_scheduler()
+
+    def _send_once(self, request: httpx.Request, tokens: int, stream: bool, call):
+        waited = self.scheduler.acquire(
+            tokens, _priority.get() or self.priority, _deadline.get()
+        )
+        if call:
+            call.queue_wait += waited
+        response = self.transport.handle_request(request)
+        self.scheduler.observe(response.status_code, response.headers)
+        if response.status_code in RETRY_STATUSES or (
+            response.status_code < 400 and not stream
+        ):
+            # frees the connection before a retry, and gives the usage to settle
+            response.read()
+            self.scheduler.settle_response(tokens, response)
+        return response
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tokens, stream = _request_info(request)
+        call = start_llm_call()
+        retrying = Retrying(**_retry_options(self.scheduler, self.max_retries))
+        response = retrying(self._send_once, request, tokens, stream, call)
+        return finish_llm_call(call, response, stream)
+
+    def close(self):
+        self.transport.close()
+
+
+class ScheduledAsyncTransport(httpx.AsyncBaseTransport):
+    """The asyncio version of ScheduledTransport, waiting for admission on the event loop."""
+
+    def __init__(
+        self,
+        priority: str = "interactive",
+        max_retries: int = 4,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.priority = priority
+        self.max_retries = max_retries
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.scheduler = get_scheduler()
+
+    async def _send_once(self, request: httpx.Request, tokens: int, stream: bool, call):
+        waited = await self.scheduler.aacquire(
+            tokens, _priority.get() or self.priority, _deadline.get()
+        )
+        if call:
+            call.queue_wait += waited
+        response = await self.transport.handle_async_request(request)
+        self.scheduler.observe(response.status_code, response.headers)
+        if response.status_code in RETRY_STATUSES or (
+            response.status_code < 400 and not stream
+        ):
+            await response.aread()
+            self.scheduler.settle_response(tokens, response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens, stream = _request_info(request)
+        call = start_llm_call()
+        retrying = AsyncRetrying(**_retry_options(self.scheduler, self.max_retries))
+        response = await retrying(self._send_once, request, tokens, stream, call)
+        return finish_llm_call(call, response, stream)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_http_clients(priority: str = "interactive", max_retries: int = 4) -> dict:
+    """Scheduled sync and async httpx clients, as the OpenAI and LangChain clients take them."""
+    timeout = httpx.Timeout(600, connect=5)
+    return {
+        "http_client": httpx.Client(
+            transport=ScheduledTransport(priority, max_retries), timeout=timeout
+        ),
+        "http_async_client": httpx.AsyncClient(
+            transport=ScheduledAsyncTransport(priority, max_retries), timeout=timeout
+        ),
+    }
+
+
+def create_openai_client(priority: str = "interactive", max_retries: int = 4, **kwargs):
+    """An OpenAI client whose requests go through the shared scheduler.
+
+    `priority` is the default of the client's requests, `request_context`
+    overrides it on the current thread. Retries are left to the scheduler.
+    """
+    from openai import OpenAI
+
+    http_client = create_http_clients(priority, max_retries)["http_client"]
+    return OpenAI(max_retries=0, http_client=http_client, **kwargs)
@@ -0,0 +1,93 @@
+import json
+from typing import Iterable, List, Optional, Sequence
+
+# Example response of a tool agent, a plan followed by its tool call
+TOOL_STEPS_EXAMPLE = (
+    {"step": "plan", "content": "..."},
+    {"step": "action", "function": "...", "input": "..."},
+)
+
+
+def batch_steps_prompt(
+    example: Sequence[dict] = TOOL_STEPS_EXAMPLE,
+    tool_step: Optional[str] = "action",
+    final_step: str = "output",
+) -> str:
+    """Batching instructions appended to the system prompt of a JSON step agent.
+
+    They let the model send every step up to the next tool call in one
+    response instead of one per call.
+
+    Args:
+        example: The steps of the example response
+        tool_step: The step calling a tool, None for a model without tools
+        final_step: The step holding the final answer
+    """
+    if tool_step:
+        scope = (
+            "every step you can take\nwithout waiting for a tool result. "
+            "Each item follows the output format above.\n"
+            f'End the list with the first "{tool_step}" step, or with the "{final_step}" step. '
+            "Never write the\nresult of a tool yourself, it is sent to you in the next message."
+        )
+    else:
+        scope = (
+            f'every step up to and including\nthe "{final_step}" step. '
+            "Each item follows the output format above."
+        )
+    return f"""
+Batching:
+This replaces the rule to perform one step at a time.
+Respond with a JSON object {{"steps": [...]}} holding, in order, {scope}
+
+Example:
+Output: {json.dumps({"steps": list(example)})}
+"""
+
+
+class StepBatcher:
+    """Splits model responses of the JSON step protocol into steps, and counts the round trips saved.
+
+    A response is either a single step object or {"steps": [...]}. Steps
+    after the first one in `stop_steps` are dropped, since they could only
+    be guesses about a tool result the model has not seen yet.
+
+    Args:
+        stop_steps: Steps that end a response, the tool call and the final answer
+    """
+
+    def __init__(self, stop_steps: Iterable[str] = ("action",)):
+        self.stop_steps = set(stop_steps)
+        self.calls = 0
+        self.steps_taken = 0
+
+    def steps(self, content: str) -> List[dict]:
+        self.calls += 1
+        response = json.loads(content)
+        if isinstance(response, list):
+            steps = response
+        elif isinstance(response.get("steps"), list):
+            steps = response["steps"]
+        else:
+            steps = [response]
+
+        kept = []
+        for step in steps:
+            if not isinstance(step, dict):
+                continue
+            kept.append(step)
+            if step.get("step") in self.stop_steps:
+                break
+        self.steps_taken += len(kept)
+        return kept
+
+    @property
+    def saved_round_trips(self) -> int:
+        """Calls a one step per response model would have needed on top of ours."""
+        return max(self.steps_taken - self.calls, 0)
+
+    def report(self) -> str:
+        return (
+            f"{self.steps_taken} steps in {self.calls} calls, "
+            f"saved {self.saved_round_trips} round trips"
+        )
@@ -0,0 +1,238 @@
+"""Count the tokens of files and JSONL chat transcripts before sending them.
+
+Every line of a .jsonl file is a record: a chat transcript when it has a
+"messages" list (counted with the framing tokens every message and the reply
+cost), otherwise its "text", "content" or "prompt" field, or the raw line.
+Any other file is one record. Records are counted on all cores, with one
+tokenizer per worker process.
+
+From the repository root:
+    python -m common.token_counter transcripts/ --model gpt-4o-mini --price 0.15
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from itertools import islice
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from common.context_window import TOKENS_PER_MESSAGE, TOKENS_PER_REPLY
+from common.tokenizer import get_encoding
+
+TEXT_FIELDS = ["text", "content", "prompt"]
+
+# A record to count: where it comes from, and either a jsonl line or None for a whole file
+Record = Tuple[str, int, Optional[str]]
+
+
+class RecordCount(NamedTuple):
+    source: str
+    line: int
+    tokens: int
+    messages: int
+
+
+def iter_records(paths: Iterable[str], pattern: str = "*") -> Iterator[Record]:
+    """Yield every jsonl line and every other file under the paths, "-" reads jsonl from stdin."""
+    for path in paths:
+        if path == "-":
+            for number, line in enumerate(sys.stdin, 1):
+                if line.strip():
+                    yield "-", number, line
+            continue
+        files = (
+            sorted(p for p in Path(path).rglob(pattern) if p.is_file())
+            if os.path.isdir(path)
+            else [Path(path)]
+        )
+        for file in files:
+            if file.suffix != ".jsonl":
+                yield str(file), 0, None
+                continue
+            with open(file, encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if line.strip():
+                        yield str(file), number, line
+
+
+def _text_tokens(encoding, value) -> int:
+    if isinstance(value, str):
+        return len(encoding.encode_ordinary(value))
+    if isinstance(value, list):
+        # multimodal content, a list of {"type": "text", "text": ...} parts
+        return sum(
+            _text_tokens(encoding, part.get("text"))
+            for part in value
+            if isinstance(part, dict)
+        )
+    return 0
+
+
+def count_chat(messages: List[dict], encoding) -> int:
+    """Prompt tokens of a chat transcript, framing included, as in ContextWindow."""
+    tokens = TOKENS_PER_REPLY
+    for message in messages:
+        tokens += TOKENS_PER_MESSAGE
+        tokens += sum(_text_tokens(encoding, value) for value in message.values())
+    return tokens
+
+
+def count_record(record: Record, encoding) -> RecordCount:
+    source, number, line = record
+    if line is None:
+        with open(source, encoding="utf-8", errors="replace") as f:
+            return RecordCount(source, 0, _text_tokens(encoding, f.read()), 0)
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        data = line
+    if isinstance(data, dict) and isinstance(data.get("messages"), list):
+        messages = data["messages"]
+        return RecordCount(
+            source, number, count_chat(messages, encoding), len(messages)
+        )
+    if isinstance(data, dict):
+        text = next((data[f] for f in TEXT_FIELDS if f in data), line)
+        return RecordCount(source, number, _text_tokens(encoding, text), 0)
+    return RecordCount(source, number, _text_tokens(encoding, line), 0)
+
+
+_model: Optional[str] = None
+
+
+def _init_worker(model: str):
+    global _model
+    _model = model
+    # load the encoding once per process, not once per batch
+    get_encoding(model)
+
+
+def _count_batch(batch: List[Record]) -> List[RecordCount]:
+    encoding = get_encoding(_model)
+    return [count_record(record, encoding) for record in batch]
+
+
+def _batches(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    iterator = iter(records)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def count_records(
+    records: Iterable[Record],
+    model: str = "gpt-4o",
+    processes: Optional[int] = None,
+    batch_size: int = 1000,
+) -> Iterator[RecordCount]:
+    """Count records on a pool of processes, yielding the counts in input order."""
+    get_encoding(model)  # fail early, and forked workers start with the encoding
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(model)
+        for batch in _batches(records, batch_size):
+            yield from _count_batch(batch)
+        return
+    with Pool(processes, initializer=_init_worker, initargs=(model,)) as pool:
+        for counts in pool.imap(_count_batch, _batches(records, batch_size)):
+            yield from counts
+
+
+def histogram(counts: np.ndarray, width: int = 40) -> List[str]:
+    """Text histogram of token counts in power of two buckets."""
+    if not len(counts):
+        return []
+    # bucket 0 holds empty records, bucket b the counts from 2**(b-1) to 2**b - 1
+    buckets = np.bincount(
+        np.where(counts > 0, np.log2(np.maximum(counts, 1)) + 1, 0).astype(int)
+    )
+    peak = buckets.max()
+    lines = []
+    for bucket, records in enumerate(buckets):
+        low, high = (0, 0) if bucket == 0 else (2 ** (bucket - 1), 2**bucket - 1)
+        bar = "█" * max(round(records / peak * width), 1 if records else 0)
+        lines.append(f"{low:>9}-{high:<9}{records:>10}  {bar}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Count the tokens of files and JSONL chat transcripts."
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="files or directories to count, - for jsonl on stdin"
+    )
+    parser.add_argument("--model", default="gpt-4o", help="picks the tokenizer")
+    parser.add_argument(
+        "--pattern", default="*", help="file glob used inside directories"
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--max-tokens", type=int, help="report records over this context budget"
+    )
+    parser.add_argument("--price", type=float, help="USD per 1M input tokens")
+    parser.add_argument(
+        "--output", help="write {source, line, tokens, messages} per record as jsonl"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tokens = []
+    messages = chats = 0
+    over_budget = 0
+    output = open(args.output, "w") if args.output else None
+    try:
+        for count in count_records(
+            iter_records(args.paths, args.pattern),
+            args.model,
+            args.processes,
+            args.batch_size,
+        ):
+            tokens.append(count.tokens)
+            messages += count.messages
+            chats += count.messages > 0
+            if args.max_tokens and count.tokens > args.max_tokens:
+                over_budget += 1
+            if output:
+                output.write(json.dumps(count._asdict()) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    counts = np.array(tokens, dtype=np.int64)
+    total = int(counts.sum())
+    print(
+        f"📄 {len(counts)} records, {total} tokens ({args.model}), "
+        f"{len(counts) / elapsed:.0f} records/s on {args.processes} processes"
+    )
+    if not len(counts):
+        return
+    p50, p95, p99 = np.percentile(counts, [50, 95, 99])
+    print(
+        f"📊 per record: mean {counts.mean():.0f}, p50 {p50:.0f}, p95 {p95:.0f}, "
+        f"p99 {p99:.0f}, max {counts.max()}"
+    )
+    if messages:
+        framing = messages * TOKENS_PER_MESSAGE + chats * TOKENS_PER_REPLY
+        print(
+            f"💬 {chats} transcripts with {messages} messages, "
+            f"{framing} framing tokens included"
+        )
+    if args.max_tokens:
+        print(f"📏 {over_budget} records over {args.max_tokens} tokens")
+    if args.price:
+        print(f"💰 ${total / 1_000_000 * args.price:.4f} at ${args.price}/1M tokens")
+    print(f"{'tokens':>19}{'records':>10}")
+    for line in histogram(counts):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Offline-safe tokenizers shared by the lessons.
+
+tiktoken downloads the BPE ranks of an encoding on first use. Every encoding
+loaded here is also saved to `.cache/tiktoken` at the repository root (or
+$TIKTOKEN_CACHE_DIR) and read from there on the next load, so a checkout or
+an image seeded once never needs the network again. Nothing is shipped with
+the repository, the directory is ignored by git. Seed it on a machine with
+network access, from the repository root:
+    python -m common.tokenizer --seed o200k_base cl100k_base
+
+Every encoding is built once per process and shared by all callers, and the
+batch helpers spread large corpora over a thread pool, tiktoken releases the
+GIL while it encodes. Callers that must keep working without a tokenizer
+count with `count_tokens_or_estimate`, which falls back to an estimate.
+"""
+
+import argparse
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+import tiktoken
+
+CACHE_DIR = os.environ.get("TIKTOKEN_CACHE_DIR") or str(
+    Path(__file__).resolve().parent.parent / ".cache" / "tiktoken"
+)
+
+# Used for models tiktoken does not know, the encoding of the gpt-4o family
+DEFAULT_ENCODING = "o200k_base"
+
+# Characters per token of English text, estimated when no tokenizer can be loaded
+CHARS_PER_TOKEN = 4
+
+# Texts encoded per task on the thread pool, and the threads in the pool
+BATCH_SIZE = 256
+WORKERS = os.cpu_count() or 4
+
+_encodings: Dict[str, tiktoken.Encoding] = {}
+# encodings neither cached nor downloadable, not tried again by the estimates
+_missing: Set[str] = set()
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def encoding_name(model: str) -> str:
+    """Name of the encoding a model uses, `model` may also be an encoding name."""
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return model if model in tiktoken.list_encoding_names() else DEFAULT_ENCODING
+
+
+def _cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}.pkl")
+
+
+def _load(name: str) -> tiktoken.Encoding:
+    # the constructor arguments of the encoding, so loading it needs no download
+    path = _cache_path(name)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return tiktoken.Encoding(**pickle.load(f))
+
+    try:
+        encoding = tiktoken.get_encoding(name)
+    except OSError as e:
+        raise RuntimeError(
+            f"the {name} tokenizer is not cached in {CACHE_DIR} and could not be "
+            f"downloaded, seed the cache on a machine with network access with: "
+            f"python -m common.tokenizer --seed {name}"
+        ) from e
+    _save(encoding, path)
+    return encoding
+
+
+def _save(encoding: tiktoken.Encoding, path: str):
+    state = {
+        "name": encoding.name,
+        "pat_str": encoding._pat_str,
+        "mergeable_ranks": encoding._mergeable_ranks,
+        "special_tokens": encoding._special_tokens,
+    }
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # a read-only checkout still works, it just downloads again next time
+        print(f"⚠️ could not cache the {encoding.name} tokenizer in {CACHE_DIR}: {e}")
+
+
+def get_encoding(model: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """The shared encoding for a model or encoding name, loaded on first use."""
+    name = encoding_name(model)
+    encoding = _encodings.get(name)
+    if encoding is None:
+        with _lock:
+            # another thread may have loaded it while we waited
+            if name not in _encodings:
+                _encodings[name] = _load(name)
+            encoding = _encodings[name]
+    return encoding
+
+
+def preload(*models: str) -> threading.Thread:
+    """Load encodings on a background thread, so the first count does not wait for them."""
+    thread = threading.Thread(
+        target=lambda: [get_encoding(model) for model in models or [DEFAULT_ENCODING]],
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=WORKERS, thread_name_prefix="tokenizer"
+            )
+        return _executor
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(texts)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def encode_batch(
+    texts: Sequence[str], model: str = DEFAULT_ENCODING, batch_size: int = BATCH_SIZE
+) -> List[List[int]]:
+    """Encode texts in order, on the thread pool once there is more than a batch.
+
+    Special tokens in the texts are encoded as plain text.
+    """
+    encoding = get_encoding(model)
+
+    def encode(chunk: Sequence[str]) -> List[List[int]]:
+        return [encoding.encode_ordinary(text) for text in chunk]
+
+    if len(texts) <= batch_size:
+        return encode(texts)
+    encoded = _get_executor().map(encode, _chunks(texts, batch_size))
+    return [tokens for chunk in encoded for tokens in chunk]
+
+
+def count_tokens(text: str, model: str = DEFAULT_ENCODING) -> int:
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_or_estimate(text: str, model: str = DEFAULT_ENCODING) -> int:
+    """Count the tokens of a text, or estimate them when the tokenizer can't be loaded.
+
+    A tokenizer that is neither cached nor downloadable is reported once, and
+    every later count is estimated at `CHARS_PER_TOKEN` characters a token.
+    """
+    name = encoding_name(model)
+    if name not in _missing:
+        try:
+            return count_tokens(text, name)
+        except RuntimeError as e:
+            with _lock:
+                first = name not in _missing
+                _missing.add(name)
+            if first:
+                print(f"⚠️ {e}, estimating token counts instead")
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def count_tokens_batch(
+    texts: Iterable[str], model: str = DEFAULT_ENCODING, batch_size: int = BATCH_SIZE
+) -> Iterator[int]:
+    """Yield the token count of every text in order.
+
+    Works on streams of any size, only a few batches per thread are
+    encoded ahead of the consumer.
+    """
+    encoding = get_encoding(model)
+    executor = _get_executor()
+    window = batch_size * WORKERS * 2
+
+    def count(chunk: List[str]) -> List[int]:
+        return [len(encoding.encode_ordinary(text)) for text in chunk]
+
+    for texts_window in _chunks(texts, window):
+        for counts in executor.map(count, _chunks(texts_window, batch_size)):
+            yield from counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Seed or check the local tokenizer cache."
+    )
+    parser.add_argument(
+        "--seed",
+        nargs="*",
+        metavar="ENCODING",
+        help=f"encodings to download into the cache, defaults to {DEFAULT_ENCODING}",
+    )
+    args = parser.parse_args()
+
+    names = args.seed or [DEFAULT_ENCODING]
+    for name in names:
+        start = time.perf_counter()
+        try:
+            encoding = get_encoding(name)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+        print(
+            f"✅ {encoding.name}: {encoding.n_vocab} tokens, "
+            f"loaded in {time.perf_counter() - start:.2f}s"
+        )
+    print(f"📁 cache: {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Dict, Optional, Set
+from urllib.parse import quote
+
+import httpx
+from cachetools import TTLCache
+
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "https://wttr.in")
+WEATHER_FORMAT = "%C+%t"
+
+
+def normalize_city(city: str) -> str:
+    """Normalize a city name so that "  new york" and "New York" share a cache entry."""
+    return " ".join(city.split()).casefold()
+
+
+class WeatherClient:
+    """Shared weather-fetch layer on top of wttr.in.
+
+    Keeps one pooled httpx client alive for the whole process, caches results in
+    memory for `ttl` seconds keyed by normalized city name, and merges duplicate
+    lookups for the same city that are in flight at the same time.
+    """
+
+    def __init__(
+        self,
+        base_url: str = WEATHER_API_URL,
+        ttl: float = 600,
+        maxsize: int = 1024,
+        timeout: float = 10.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._ainflight: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        # closes of clients left behind by an earlier event loop, kept until done
+        self._closing: Set[asyncio.Future] = set()
+
+    def _url(self, city: str) -> str:
+        return f"{self.base_url}/{quote(city.strip())}?format={WEATHER_FORMAT}"
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def _set_cached(self, key: str, text: Optional[str]):
+        # failed lookups are not cached so that they are retried on the next call
+        if text is not None:
+            with self._lock:
+                self._cache[key] = text
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        # an AsyncClient is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._aclient is not None and self._aclient_loop is loop:
+                return self._aclient
+            stale, stale_loop = self._aclient, self._aclient_loop
+            self._aclient = httpx.AsyncClient(timeout=self.timeout)
+            self._aclient_loop = loop
+        if stale is not None:
+            self._close_stale(stale, stale_loop, loop)
+        return self._aclient
+
+    def _close_stale(
+        self,
+        client: httpx.AsyncClient,
+        client_loop: asyncio.AbstractEventLoop,
+        loop: asyncio.AbstractEventLoop,
+    ):
+        """Close the pool of a client replaced on a new event loop."""
+        if client_loop.is_running():
+            # its connections belong to that loop, so close them there
+            future = asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+        else:
+            future = loop.create_task(self._aclose_quietly(client))
+        self._closing.add(future)
+        future.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(client: httpx.AsyncClient):
+        # the loop the connections were opened on is gone, release what can be
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+    def _request(self, city: str) -> Optional[str]:
+        try:
+            response = self.client.get(self._url(city))
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 200:
+            return None
+        return response.text
+
+    async def _arequest(self, city: str) -> Optional[str]:
+        try:
+            response = await self.aclient.get(self._url(city))
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 200:
+            return None
+        return response.text
+
+    def fetch(self, city: str) -> Optional[str]:
+        """Get the weather for a city, or None if it could not be fetched."""
+        key = normalize_city(city)
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                return text
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            text = self._request(city)
+            self._set_cached(key, text)
+            future.set_result(text)
+            return text
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def afetch(self, city: str) -> Optional[str]:
+        """Async variant of fetch that can be awaited from the graph."""
+        key = normalize_city(city)
+        text = self._get_cached(key)
+        if text is not None:
+            return text
+
+        task = self._ainflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._afetch_uncached(key, city))
+            self._ainflight[key] = task
+        # shield the shared lookup so that one cancelled caller does not cancel it for the rest
+        return await asyncio.shield(task)
+
+    async def _afetch_uncached(self, key: str, city: str) -> Optional[str]:
+        try:
+            text = await self._arequest(city)
+            self._set_cached(key, text)
+            return text
+        finally:
+            # a lookup started on another event loop may have taken the key over
+            if self._ainflight.get(key) is asyncio.current_task():
+                del self._ainflight[key]
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+            self._aclient_loop = None
+
+
+@lru_cache(maxsize=None)
+def get_weather_client() -> WeatherClient:
+    """Return the process wide weather client."""
+    return WeatherClient()
+
+
+def fetch_weather(city: str) -> Optional[str]:
+    return get_weather_client().fetch(city)
+
+
+async def afetch_weather(city: str) -> Optional[str]:
+    return await get_weather_client().afetch(city)
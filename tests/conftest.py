@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+import tiktoken
+
+# make the shared modules at the repository root importable
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import tokenizer
+
+
+@pytest.fixture
+def byte_encoding(monkeypatch):
+    # one token per byte, so the test needs no downloaded BPE ranks
+    encoding = tiktoken.Encoding(
+        "o200k_base",
+        pat_str=r"\S+|\s+",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    monkeypatch.setitem(tokenizer._encodings, "o200k_base", encoding)
+    return encoding
+
+
+@pytest.fixture
+def no_tokenizer(monkeypatch):
+    # as offline without a seeded cache: the encoding can't be loaded
+    def missing(name):
+        raise RuntimeError(f"the {name} tokenizer is not cached")
+
+    monkeypatch.delitem(tokenizer._encodings, "o200k_base", raising=False)
+    monkeypatch.setattr(tokenizer, "_load", missing)
+    monkeypatch.setattr(tokenizer, "_missing", set())
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from common.command_runner import CommandRunner
+
+
+@pytest.fixture
+def runner():
+    runner = CommandRunner(max_concurrency=2, timeout=5)
+    yield runner
+    runner.close()
+
+
+def group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def wait_for_group_exit(pgid: int, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not group_alive(pgid):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def wait_for_exit(pid: int, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_timeout_kills_process_group(runner):
+    pids = []
+
+    def on_output(name, chunk):
+        pids.extend(int(line) for line in chunk.split())
+
+    # the shell's pid, then its child's
+    result = runner.run(
+        "echo $$; sleep 30 & echo $!; wait", timeout=0.5, on_output=on_output
+    )
+    assert result.timed_out
+    assert "timed out" in result.summary()
+    assert len(pids) == 2
+    assert wait_for_group_exit(pids[0])
+    assert wait_for_exit(pids[1])
+
+
+def test_cancelled_arun_kills_process_group(runner):
+    pids = []
+
+    def on_output(name, chunk):
+        pids.extend(int(line) for line in chunk.split())
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(
+            runner.arun("echo $$; sleep 30 & wait", on_output=on_output)
+        )
+        while not pids:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_midway())
+    # the shell leads its own process group, so its pid is the group id
+    assert wait_for_group_exit(pids[0])
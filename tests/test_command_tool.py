@@ -0,0 +1,67 @@
+import asyncio
+import sys
+from pathlib import Path
+from typing import Any, List, Optional, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / "11_langgraph_checkpointing")
+)
+
+from graph.nodes import ahandle_tool_call, handle_tool_call
+from models.schemas import OutputSchema
+
+
+class State(TypedDict):
+    messages: List[Any]
+    llm_output: Optional[Any]
+
+
+def tool_graph(node):
+    graph = StateGraph(State)
+    graph.add_node("tools", node)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    return graph.compile()
+
+
+def command_call(command: str) -> State:
+    llm_output = OutputSchema(
+        step="action",
+        role="assistant",
+        content="",
+        tool_name="execute_command",
+        tool_input=command,
+        tool_call_id="1",
+    )
+    return {"messages": [], "llm_output": llm_output}
+
+
+EXPECTED = [
+    {"command_output": "hi\n", "stream": "stdout"},
+    {"command_output": "oops\n", "stream": "stderr"},
+]
+
+
+def test_command_output_is_streamed_to_the_caller():
+    graph = tool_graph(handle_tool_call)
+    state = command_call("echo hi; sleep 0.1; echo oops >&2")
+    assert list(graph.stream(state, stream_mode="custom")) == EXPECTED
+
+
+def test_command_output_is_streamed_to_the_async_caller():
+    graph = tool_graph(ahandle_tool_call)
+    state = command_call("echo hi; sleep 0.1; echo oops >&2")
+
+    async def collect():
+        return [event async for event in graph.astream(state, stream_mode="custom")]
+
+    assert asyncio.run(collect()) == EXPECTED
+
+
+def test_command_output_is_printed_outside_a_graph(capsys):
+    from tools.command import command_output_writer
+
+    command_output_writer()("stdout", "hi\n")
+    assert "🧰 stdout: hi" in capsys.readouterr().out
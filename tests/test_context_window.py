@@ -0,0 +1,60 @@
+import pytest
+
+from common.context_window import ContextWindow
+
+pytestmark = pytest.mark.usefixtures("byte_encoding")
+
+
+def conversation(tool_output: str) -> ContextWindow:
+    messages = ContextWindow(max_tokens=200)
+    messages.append({"role": "system", "content": "You are a weather agent."})
+    messages.append({"role": "user", "content": "Is it raining in Oslo?"})
+    messages.append({"role": "assistant", "content": "Let me check."})
+    messages.append({"role": "user", "content": "What is the weather in Paris?"})
+    messages.append({"role": "assistant", "content": "Calling get_weather."})
+    # the agent loop hands tool results back as assistant observe steps
+    messages.append({"role": "assistant", "content": tool_output})
+    return messages
+
+
+def test_window_keeps_everything_within_budget():
+    messages = conversation("Sunny +21C")
+    assert messages.window() == messages.messages
+    assert messages.last_saved_tokens == 0
+
+
+def test_long_tool_output_does_not_evict_current_question():
+    messages = conversation("x" * 150)
+    window = messages.window()
+    contents = [message["content"] for message in window]
+    assert contents == [
+        "You are a weather agent.",
+        "What is the weather in Paris?",
+        "x" * 150,
+    ]
+    assert messages.last_saved_tokens > 0
+
+
+def test_summary_keeps_current_question_pinned():
+    summaries = []
+
+    def summarizer(evicted, previous):
+        summaries.append([message["content"] for message in evicted])
+        return "The user asked about Oslo."
+
+    messages = conversation("x" * 140)
+    messages.summarizer = summarizer
+    contents = [message["content"] for message in messages.window()]
+    assert contents[0] == "You are a weather agent."
+    assert contents[1].startswith("Summary of the earlier conversation:")
+    assert contents[2:] == ["What is the weather in Paris?", "x" * 140]
+    assert summaries
+
+
+def test_token_counts_are_estimated_without_a_tokenizer(no_tokenizer):
+    messages = conversation("x" * 400)
+    # four characters a token, plus the framing of the message
+    assert messages.token_counts[-1] == 3 + 400 // 4 + 1 + len("assistant") // 4 + 1
+    window = messages.window()
+    assert window[0]["role"] == "system"
+    assert {"role": "user", "content": "What is the weather in Paris?"} in window
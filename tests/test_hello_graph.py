@@ -0,0 +1,69 @@
+import importlib
+import os
+import sys
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from common import request_scheduler
+from common.request_scheduler import request_context
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "10_intro_to_langgraph"))
+
+
+@pytest.fixture(scope="module")
+def hello_graph(tmp_path_factory):
+    # the module builds its OpenAI client and caches on import
+    environ = {
+        "OPENAI_API_KEY": "test",
+        "GRAPH_CACHE_DIR": str(tmp_path_factory.mktemp("hello_graph")),
+    }
+    saved = {key: os.environ.get(key) for key in environ}
+    os.environ.update(environ)
+    try:
+        yield importlib.import_module("hello_graph")
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+@pytest.fixture
+def stats(hello_graph, monkeypatch):
+    stats = {"started": 0, "used": 0, "cancelled": 0, "wasted": 0}
+    monkeypatch.setattr(hello_graph, "speculation_stats", stats)
+    return stats
+
+
+def test_speculative_solvers_keep_the_request_context(hello_graph, stats, monkeypatch):
+    def solve(user_message):
+        return request_scheduler._priority.get()
+
+    monkeypatch.setattr(
+        hello_graph,
+        "SOLVERS",
+        {"coding_question_solver": ("gpt-4o-mini", solve)},
+    )
+    with request_context(priority="batch"):
+        speculations = hello_graph.start_speculation("How do I sort a list?")
+    solution = hello_graph.finish_speculation(speculations, "coding_question_solver")
+    assert solution == "batch"
+    assert stats == {"started": 1, "used": 1, "cancelled": 0, "wasted": 0}
+
+
+def test_only_solvers_already_running_are_wasted(hello_graph, stats):
+    pending = Future()
+    running = Future()
+    running.set_running_or_notify_cancel()
+    winner = Future()
+    winner.set_result("42")
+
+    solution = hello_graph.finish_speculation(
+        {"winner": winner, "pending": pending, "running": running}, "winner"
+    )
+    assert solution == "42"
+    assert pending.cancelled()
+    assert stats == {"started": 0, "used": 1, "cancelled": 1, "wasted": 1}
@@ -0,0 +1,100 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / "7_knowledge_graphs_advance_rags")
+)
+
+from hybrid_retriever import HybridRetriever, IncrementalBM25, tokenize
+
+pytestmark = pytest.mark.usefixtures("byte_encoding")
+
+
+class FakeMemory:
+    def __init__(self, memories):
+        self.memories = memories
+        self.fail = False
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def get_all(self, user_id, limit):
+        self.started.set()
+        self.release.wait()
+        if self.fail:
+            raise ConnectionError("vector store unavailable")
+        return {"results": list(self.memories)}
+
+
+class FakeRetriever:
+    def __init__(self, memory):
+        self.memory = memory
+
+    def search(self, query, user_id, limit, use_vector=True):
+        return {"results": [], "relations": []}
+
+
+def memory(id: str, text: str):
+    return {"id": id, "memory": text}
+
+
+def test_add_many_matches_one_at_a_time():
+    documents = [
+        ("1", tokenize("likes green tea")),
+        ("2", tokenize("lives in Paris")),
+        ("3", tokenize("drinks black tea in the morning")),
+    ]
+    one_by_one = IncrementalBM25()
+    for id, tokens in documents:
+        one_by_one.add(id, tokens)
+    batched = IncrementalBM25()
+    batched.add_many(documents)
+    assert batched.idf == one_by_one.idf
+    assert batched.search(["tea"], 3) == one_by_one.search(["tea"], 3)
+
+
+def test_failed_seed_is_retried():
+    store = FakeMemory([memory("1", "likes green tea")])
+    store.fail = True
+    retriever = HybridRetriever(FakeRetriever(store))
+    with pytest.raises(ConnectionError):
+        retriever.context("tea", "alice")
+    assert "alice" not in retriever.indexes
+
+    store.fail = False
+    assert retriever.context("tea", "alice") == "likes green tea"
+
+
+def test_seeding_does_not_block_other_users_and_keeps_concurrent_writes():
+    store = FakeMemory([memory("1", "likes green tea")])
+    retriever = HybridRetriever(FakeRetriever(store))
+    retriever.context("tea", "bob")
+
+    store.release.clear()
+    store.started.clear()
+    seeding = threading.Thread(target=retriever.context, args=("tea", "alice"))
+    seeding.start()
+    store.started.wait()
+    # the seed of alice is waiting on the store, bob and writes are not held up
+    assert retriever.context("tea", "bob") == "likes green tea"
+    retriever.observe(
+        {"user_id": "alice"},
+        {"results": [{"id": "2", "memory": "drinks black tea", "event": "ADD"}]},
+    )
+    store.release.set()
+    seeding.join()
+
+    assert set(retriever.indexes["alice"].ids) == {"1", "2"}
+    assert not retriever._seeding
+
+
+def test_context_is_budgeted_without_a_tokenizer(no_tokenizer):
+    store = FakeMemory(
+        [memory("1", "likes green tea"), memory("2", "drinks black tea in the morning")]
+    )
+    # the first memory is estimated at 4 tokens, the second at 8
+    retriever = HybridRetriever(FakeRetriever(store), token_budget=8)
+    assert retriever.context("tea", "alice") == "likes green tea"
@@ -0,0 +1,55 @@
+import math
+import time
+
+from pydantic import BaseModel
+
+from common.llm_cache import LLMCache
+
+# the two Paris questions are each within 0.99 of "weather in paris?" but not
+# of each other, "weather in paris" being the closer one
+VECTORS = {
+    "weather in paris?": [1.0, 0.0, 0.0],
+    "weather in paris": [math.cos(0.1), math.sin(0.1), 0.0],
+    "paris weather": [math.cos(0.12), 0.0, math.sin(0.12)],
+    "capital of france": [0.0, 1.0, 0.0],
+}
+
+
+class Answer(BaseModel):
+    text: str
+
+
+def ask(cache: LLMCache, question: str, answer: str) -> Answer:
+    messages = [
+        {"role": "system", "content": "You answer questions."},
+        {"role": "user", "content": question},
+    ]
+    return cache.get_or_call(
+        "gpt-4o-mini", messages, Answer, lambda: Answer(text=answer)
+    )
+
+
+def test_semantic_hit_reuses_similar_question():
+    cache = LLMCache(embed=VECTORS.__getitem__, similarity_threshold=0.99)
+    ask(cache, "weather in paris", "sunny")
+    assert ask(cache, "weather in paris?", "fresh").text == "sunny"
+    assert ask(cache, "capital of france", "Paris").text == "Paris"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_expired_best_match_falls_back_to_next_candidate():
+    cache = LLMCache(embed=VECTORS.__getitem__, similarity_threshold=0.99)
+    ask(cache, "paris weather", "cloudy")
+    ask(cache, "weather in paris", "sunny")
+    # the closest match to the next question expires, the other one is still valid
+    for entry in cache.entries.values():
+        if entry.value == Answer(text="sunny").model_dump_json():
+            entry.expires_at = time.time() - 1
+    assert ask(cache, "weather in paris?", "fresh").text == "cloudy"
+    assert cache.stats() == {
+        "exact_hits": 0,
+        "semantic_hits": 1,
+        "misses": 2,
+        "hit_rate": 0.333,
+        "entries": 1,
+    }
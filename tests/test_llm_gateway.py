@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from common.llm_gateway import Backend, LLMGateway, NoBackendError
+
+
+class FakeBackend(Backend):
+    provider = "fake"
+
+    def __init__(self, model: str):
+        super().__init__(None, model)
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = 0
+
+    def chat(self, messages, json_mode=False):
+        self.calls += 1
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError(f"{self.model} is down")
+        return self.model, 1, 1
+
+
+MESSAGES = [{"role": "user", "content": "Why is the sky blue?"}]
+
+
+@pytest.fixture
+def gateway():
+    gateway = LLMGateway([FakeBackend("flaky")], hedge=False)
+    yield gateway
+    gateway.close()
+
+
+def open_circuit(gateway: LLMGateway) -> FakeBackend:
+    backend = gateway.backends[0]
+    backend.fail = True
+    for _ in range(gateway.stats[backend.name].failure_limit):
+        with pytest.raises(NoBackendError):
+            gateway.chat(MESSAGES)
+    return backend
+
+
+def test_open_circuit_keeps_the_backend_out_of_rotation(gateway):
+    backend = open_circuit(gateway)
+    assert gateway.stats[backend.name].state == "open"
+    assert gateway.ranked() == []
+
+
+def test_half_open_circuit_admits_a_single_probe(gateway):
+    backend = open_circuit(gateway)
+    stats = gateway.stats[backend.name]
+    stats.open_until = 0.0
+    assert stats.state == "half-open"
+
+    backend.fail = False
+    backend.release.clear()
+    probe = gateway.executor.submit(gateway.chat, MESSAGES)
+    while not stats.probing:
+        time.sleep(0.001)
+    # the probe is in flight, every other request is turned away
+    assert gateway.ranked() == []
+    with pytest.raises(NoBackendError):
+        gateway.chat(MESSAGES)
+
+    backend.release.set()
+    assert probe.result(5).content == "flaky"
+    assert stats.state == "closed"
+    assert backend.calls == stats.failure_limit + 1
+
+
+def test_failed_probe_opens_the_circuit_again(gateway):
+    backend = open_circuit(gateway)
+    stats = gateway.stats[backend.name]
+    stats.open_until = 0.0
+    with pytest.raises(NoBackendError):
+        gateway.chat(MESSAGES)
+    assert stats.state == "open"
+    assert not stats.probing
@@ -0,0 +1,71 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / "7_knowledge_graphs_advance_rags")
+)
+
+from memory_writer import MemoryWriter
+
+
+class FakeMemory:
+    """Records memory.add calls, the first one waits until it is released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def add(self, messages, **kwargs):
+        if not self.calls:
+            self.release.wait()
+        self.calls.append((messages, kwargs))
+        return {"results": []}
+
+
+def turn(i: int):
+    return [
+        {"role": "system", "content": f"system prompt {i}"},
+        {"role": "user", "content": f"question {i}"},
+        {"role": "assistant", "content": f"answer {i}"},
+    ]
+
+
+def test_merged_writes_keep_one_system_prompt():
+    memory = FakeMemory()
+    writer = MemoryWriter(memory, workers=1)
+    writer.add(turn(0), user_id="other")
+    # queued while the worker is busy with the first write, so applied as one batch
+    for i in range(1, 4):
+        writer.add(turn(i), user_id="alice")
+    memory.release.set()
+    writer.close()
+
+    assert len(memory.calls) == 2
+    messages, kwargs = memory.calls[1]
+    assert kwargs == {"user_id": "alice"}
+    assert [m["content"] for m in messages] == [
+        "system prompt 1",
+        "question 1",
+        "answer 1",
+        "question 2",
+        "answer 2",
+        "question 3",
+        "answer 3",
+    ]
+
+
+def test_failing_callback_does_not_count_as_failed_write():
+    memory = FakeMemory()
+    memory.release.set()
+
+    def on_write(kwargs, result):
+        raise ValueError("index update failed")
+
+    writer = MemoryWriter(memory, workers=1, on_write=on_write)
+    writer.add(turn(0), user_id="alice")
+    writer.close()
+
+    assert len(memory.calls) == 1
+    assert writer.stats["failed"] == 0
+    assert writer.stats["callback_failed"] == 1
@@ -0,0 +1,33 @@
+import numpy as np
+
+from common.quantized_store import QuantizedVectorStore, normalize
+
+
+def embeddings(count: int, dims: int = 32, seed: int = 0) -> np.ndarray:
+    return normalize(np.random.default_rng(seed).standard_normal((count, dims)))
+
+
+def test_added_vectors_are_searchable_before_flush(tmp_path):
+    vectors = embeddings(300)
+    store = QuantizedVectorStore(str(tmp_path), dims=32, dtype="int8", shard_size=128)
+    ids = [f"v{i}" for i in range(len(vectors))]
+    # two full shards are written, the last 44 vectors stay queued
+    store.add(ids[:200], vectors[:200])
+    store.add(ids[200:], vectors[200:])
+    assert len(store.shards) == 2
+    assert len(store) == 300
+
+    found, scores = store.search(vectors[[5, 150, 299]], k=1)
+    assert found == [["v5"], ["v150"], ["v299"]]
+    assert np.all(scores > 0.99)
+
+
+def test_flush_persists_queued_vectors(tmp_path):
+    vectors = embeddings(50)
+    store = QuantizedVectorStore(str(tmp_path), dims=32, dtype="float16")
+    store.add([f"v{i}" for i in range(50)], vectors)
+    store.flush()
+
+    reopened = QuantizedVectorStore(str(tmp_path))
+    assert len(reopened) == 50
+    assert reopened.search(vectors[42], k=1)[0] == [["v42"]]
@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "10_intro_to_langgraph"))
+
+from query_router import QueryRouter, classify_by_rules
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "How do I install numpy on Windows?",
+        "Write a python function that reverses a string",
+        "Why does this java loop never end?",
+        "```\nprint('hi')\n```",
+        'Traceback (most recent call last):\n  File "app.py", line 3',
+    ],
+)
+def test_coding_questions_take_the_fast_path(message):
+    assert classify_by_rules(message) is True
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Which python species are venomous?",
+        "Where can I buy good Java coffee beans?",
+        "Is Ruby a precious stone?",
+    ],
+)
+def test_bare_language_names_are_left_to_the_llm(message):
+    assert classify_by_rules(message) is None
+    router = QueryRouter()
+    assert router.classify(message) is None
+    assert router.counts["llm"] == 1
+
+
+def test_generic_questions_take_the_fast_path():
+    assert classify_by_rules("What is the weather in Paris?") is False
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common.request_scheduler import DeadlineExceeded, RequestScheduler
+
+
+def test_async_waiter_is_admitted_when_the_bucket_refills():
+    # one request every 0.1s
+    scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=10**6)
+    scheduler.requests.level = 0
+
+    async def main():
+        return await scheduler.aacquire(10)
+
+    threads = threading.active_count()
+    waited = asyncio.run(main())
+    assert 0.05 < waited < 1
+    assert threading.active_count() == threads
+    assert scheduler.stats["admitted"]["interactive"] == 1
+
+
+def test_cancelled_async_waiter_takes_no_budget():
+    scheduler = RequestScheduler(requests_per_minute=60, tokens_per_minute=10**6)
+    scheduler.requests.level = 0
+
+    async def main():
+        waiting = asyncio.create_task(scheduler.aacquire(1000))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(main())
+    assert scheduler._waiting == []
+    assert scheduler._async_waiters == set()
+    assert scheduler.tokens.level == 10**6
+    assert scheduler.stats["admitted"]["interactive"] == 0
+
+
+def test_async_waiter_is_woken_by_a_thread():
+    scheduler = RequestScheduler(requests_per_minute=1, tokens_per_minute=10**6)
+    scheduler.requests.level = 0
+
+    async def main():
+        waiting = asyncio.create_task(scheduler.aacquire(1))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        # as a rate limit response from another thread would
+        with scheduler._cond:
+            scheduler.requests.level = 1
+            scheduler._notify()
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(main()) < 1
+
+
+def test_async_waiter_past_its_deadline():
+    scheduler = RequestScheduler(requests_per_minute=1, tokens_per_minute=10**6)
+    scheduler.requests.level = 0
+
+    async def main():
+        await scheduler.aacquire(1, deadline=time.monotonic() + 0.05)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(main())
+    assert scheduler._waiting == []
+    assert scheduler.stats["deadline_exceeded"] == 1
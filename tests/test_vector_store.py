@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(
+    str(Path(__file__).resolve().parent.parent / "7_knowledge_graphs_advance_rags")
+)
+
+from vector_store import MmapVectorStore
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_quantized_partitions_find_the_same_neighbours(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((400, 64)).astype(np.float32)
+    ids = [f"m{i}" for i in range(len(vectors))]
+    payloads = [{"user_id": "alice", "data": f"memory {i}"} for i in range(400)]
+
+    store = MmapVectorStore(path=str(tmp_path), embedding_model_dims=64, dtype=dtype)
+    store.insert(vectors, payloads, ids)
+    for i in (0, 123, 399):
+        results = store.search("", vectors[i], limit=1, filters={"user_id": "alice"})
+        assert results[0].id == f"m{i}"
+        assert results[0].score > 0.99
+
+    # reopened with another default, the partition keeps the format it was written in
+    reopened = MmapVectorStore(path=str(tmp_path), embedding_model_dims=64)
+    assert reopened.partitions["alice"].dtype == dtype
+    reopened.update("m7", payload={"user_id": "alice", "data": "updated"})
+    results = reopened.search("", vectors[7], limit=1, filters={"user_id": "alice"})
+    assert results[0].id == "m7"
+    assert results[0].payload["data"] == "updated"
+
+
+def test_ivf_index_over_int8_partition(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((600, 32)).astype(np.float32)
+    store = MmapVectorStore(
+        path=str(tmp_path),
+        embedding_model_dims=32,
+        index_threshold=100,
+        n_probe=64,
+        dtype="int8",
+    )
+    store.insert(
+        vectors,
+        [{"user_id": "bob"} for _ in vectors],
+        [str(i) for i in range(len(vectors))],
+    )
+    results = store.search("", vectors[10], limit=3, filters={"user_id": "bob"})
+    assert results[0].id == "10"
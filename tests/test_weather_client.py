@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common.weather_client import WeatherClient
+
+
+class StubWeatherServer(ThreadingHTTPServer):
+    """wttr.in stand-in that counts requests and the connections they came on."""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.1):
+        super().__init__(("127.0.0.1", 0), StubWeatherHandler)
+        self.delay = delay
+        self.requests = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.connections.add(self.client_address)
+        time.sleep(self.server.delay)
+        body = b"Sunny +21C"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubWeatherServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_reuses_pooled_connection(server):
+    client = WeatherClient(base_url=server.url)
+    try:
+        assert client.fetch("Paris") == "Sunny +21C"
+        assert client.fetch("London") == "Sunny +21C"
+        assert client.fetch(" paris ") == "Sunny +21C"
+    finally:
+        client.close()
+    # the third lookup is a cache hit, the first two share one connection
+    assert server.requests == 2
+    assert len(server.connections) == 1
+
+
+def test_fetch_merges_concurrent_lookups(server):
+    client = WeatherClient(base_url=server.url)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(client.fetch, ["New York", "new  york"] * 4))
+    finally:
+        client.close()
+    assert results == ["Sunny +21C"] * 8
+    assert server.requests == 1
+
+
+def test_afetch_merges_concurrent_lookups(server):
+    client = WeatherClient(base_url=server.url)
+
+    async def lookups():
+        try:
+            return await asyncio.gather(*(client.afetch("Berlin") for _ in range(8)))
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(lookups()) == ["Sunny +21C"] * 8
+    assert server.requests == 1
+
+
+def test_afetch_on_new_loop_closes_previous_client(server):
+    client = WeatherClient(base_url=server.url)
+    asyncio.run(client.afetch("Rome"))
+    first = client._aclient
+    client.clear_cache()
+
+    async def second_loop():
+        try:
+            assert await client.afetch("Rome") == "Sunny +21C"
+            # let the close of the previous loop's client run
+            await asyncio.gather(*client._closing)
+            assert first.is_closed
+            assert client._aclient is not first
+        finally:
+            await client.aclose()
+
+    asyncio.run(second_loop())
+    assert not client._ainflight